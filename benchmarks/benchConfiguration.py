@@ -0,0 +1,54 @@
+"""
+Benchmark for reading configuration values: cached reads of
+get(), getint() and getboolean() of a CombinedConfiguration compared to
+the uncached computation (decoding the names, asking ConfigParser and
+converting the string) which was done on each call before values were
+cached.
+"""
+
+import benchSupport
+
+app = benchSupport.installBenchApp()
+
+from pwiki import Configuration
+
+
+READ_COUNT = 200000
+
+
+def main():
+    wikiConfig = Configuration.SingleConfiguration(
+            Configuration.WIKIDEFAULTS, Configuration.WIKIFALLTHROUGH)
+    wikiConfig.createEmptyConfig(None)
+    config = Configuration.CombinedConfiguration(app.getGlobalConfig(),
+            wikiConfig)
+
+    # Option read per node by the tree, option read from wiki config
+    # falling through to the global config and an integer option
+    reads = (
+            ("getboolean", "_getBooleanUncached", "tree_no_cycles"),
+            ("get", "_getUncached", "wikiPageFiles_asciiOnly"),
+            ("getint", "_getIntUncached", "size_x"),
+        )
+
+    print "%i reads each" % READ_COUNT
+    for cachedName, uncachedName, option in reads:
+        cached = getattr(config, cachedName)
+        uncached = getattr(config, uncachedName)
+
+        def runUncached():
+            for i in xrange(READ_COUNT):
+                uncached("main", option, None)
+
+        def runCached():
+            for i in xrange(READ_COUNT):
+                cached("main", option, None)
+
+        baseTime = benchSupport.bestOf(runUncached)
+        benchSupport.report("%s %s uncached" % (cachedName, option), baseTime)
+        benchSupport.report("%s %s cached" % (cachedName, option),
+                benchSupport.bestOf(runCached), baseTime)
+
+
+if __name__ == "__main__":
+    main()
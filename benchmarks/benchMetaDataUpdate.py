@@ -0,0 +1,145 @@
+"""
+Benchmark for writing the metadata of wiki pages (child relations,
+attributes, todos, match terms) to a sqlite database backend.
+
+The update functions of WikiData write only the difference to the stored
+rows with batched statements. They are compared with rewriting all rows of
+a page by single statements (how the update functions worked before).
+
+Usage: python benchmarks/benchMetaDataUpdate.py [<database type> [<pages>]]
+    database type -- "compact_sqlite" (default) or "original_sqlite"
+    pages -- number of pages (default 300)
+"""
+
+import sys, tempfile, shutil
+
+import benchSupport
+
+app = benchSupport.installBenchApp()
+
+import Consts
+
+
+RELATION_COUNT = 40
+ATTRIBUTE_COUNT = 10
+TODO_COUNT = 5
+
+
+def buildMetaData(word, variant=0):
+    """
+    Return tuple (childRelations, attrs, todos, matchTerms) for word.
+    variant changes one row of each kind.
+    """
+    relations = [(u"Target%iPage" % i, i * 10) for i in xrange(RELATION_COUNT)]
+    relations[0] = (u"Target0Variant%i" % variant, 0)
+
+    attrs = dict((u"key%i" % i, [u"value%i" % i]) for i in
+            xrange(ATTRIBUTE_COUNT))
+    attrs[u"key0"] = [u"variant%i" % variant]
+
+    todos = [(u"todo.%i" % i, u"Todo item %i" % i) for i in xrange(TODO_COUNT)]
+    todos[0] = (u"todo.0", u"Todo variant %i" % variant)
+
+    matchTerms = [(word, Consts.WIKIWORDMATCHTERMS_TYPE_ASLINK |
+            Consts.WIKIWORDMATCHTERMS_TYPE_FROM_WORD, word, -1, -1),
+            (u"Alias %s %i" % (word, variant),
+            Consts.WIKIWORDMATCHTERMS_TYPE_ASLINK |
+            Consts.WIKIWORDMATCHTERMS_TYPE_FROM_ATTRIBUTES, word, 0, 5)]
+
+    return relations, attrs, todos, matchTerms
+
+
+def writeByDelta(wikiData, word, metaData):
+    relations, attrs, todos, matchTerms = metaData
+    wikiData.updateChildRelations(word, relations)
+    wikiData.updateAttributes(word, attrs)
+    wikiData.updateTodos(word, todos)
+    wikiData.updateWikiWordMatchTerms(word, matchTerms)
+
+
+def writeByRewrite(wikiData, word, metaData):
+    """
+    Delete all metadata rows of word and insert each row with a single
+    statement
+    """
+    relations, attrs, todos, matchTerms = metaData
+    connWrap = wikiData.connWrap
+
+    connWrap.execSql("delete from wikirelations where word = ?", (word,))
+    for toWord, pos in relations:
+        connWrap.execSql("insert or replace into wikirelations(word, "
+                "relation, firstcharpos) values (?, ?, ?)", (word, toWord, pos))
+
+    connWrap.execSql("delete from wikiwordattrs where word = ?", (word,))
+    for key, values in attrs.iteritems():
+        for value in values:
+            connWrap.execSql("insert into wikiwordattrs(word, key, value) "
+                    "values (?, ?, ?)", (word, key, value))
+
+    connWrap.execSql("delete from todos where word = ?", (word,))
+    for key, value in todos:
+        connWrap.execSql("insert into todos(word, key, value) "
+                "values (?, ?, ?)", (word, key, value))
+
+    connWrap.execSql("delete from wikiwordmatchterms where word = ? and "
+            "(type & 16) == 0", (word,))
+    for matchterm, typ, word, firstcharpos, charlength in matchTerms:
+        connWrap.execSql("insert into wikiwordmatchterms(matchterm, type, "
+                "word, firstcharpos, charlength, matchtermnormcase) "
+                "values (?, ?, ?, ?, ?, ?)", (matchterm, typ, word,
+                firstcharpos, charlength, matchterm.lower()))
+
+
+def main():
+    dbtype = sys.argv[1] if len(sys.argv) > 1 else "compact_sqlite"
+    pageCount = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    dataDir = tempfile.mkdtemp(prefix="wikidpadbench")
+    try:
+        wikiData = benchSupport.createWikiData(dbtype, dataDir)
+        words = [u"BenchPage%i" % i for i in xrange(pageCount)]
+        for word in words:
+            wikiData.setContent(word, u"Content of " + word)
+            writeByDelta(wikiData, word, buildMetaData(word))
+        wikiData.commit()
+
+        def run(writeFct, variant):
+            def runAll():
+                for word in words:
+                    writeFct(wikiData, word, buildMetaData(word, variant))
+                wikiData.commit()
+            return runAll
+
+        print "%s, %i pages with %i relations, %i attributes, %i todos" % \
+                (dbtype, pageCount, RELATION_COUNT, ATTRIBUTE_COUNT,
+                TODO_COUNT)
+
+        # Always write the same metadata (e.g. page saved without changing
+        # links or attributes)
+        baseTime = benchSupport.bestOf(run(writeByRewrite, 0))
+        benchSupport.report("unchanged metadata, rewrite all rows", baseTime)
+        benchSupport.report("unchanged metadata, write delta",
+                benchSupport.bestOf(run(writeByDelta, 0)), baseTime)
+
+        # Alternate between two variants so one row of each kind changes
+        # on each run
+        variants = [0]
+        def alternating(writeFct):
+            def runAll():
+                variants[0] = 1 - variants[0]
+                run(writeFct, variants[0])()
+            return runAll
+
+        baseTime = benchSupport.bestOf(alternating(writeByRewrite))
+        benchSupport.report("one row changed, rewrite all rows", baseTime)
+        benchSupport.report("one row changed, write delta",
+                benchSupport.bestOf(alternating(writeByDelta)), baseTime)
+
+        wikiData.close()
+    finally:
+        shutil.rmtree(dataDir, ignore_errors=True)
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
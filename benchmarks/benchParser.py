@@ -0,0 +1,48 @@
+"""
+Benchmark for parsing wiki pages: all pages of the help wiki are parsed
+with the parser of the WikidPad wiki language.
+
+Usage: python benchmarks/benchParser.py [profile]
+    profile -- additionally parse once with cProfile and print the
+            functions with the highest own time
+"""
+
+import sys
+
+import benchSupport
+
+app = benchSupport.installBenchApp()
+
+
+PROFILE_LINES = 15
+
+
+def main():
+    parsePage = benchSupport.createPageParser(
+            benchSupport.importWikidPadParser())
+    pages = benchSupport.getHelpWikiPages()
+    texts = [text for word, text in pages]
+
+    def parseAll():
+        for text in texts:
+            parsePage(text)
+
+    print "%i pages of the help wiki, %i characters" % (len(texts),
+            sum(len(text) for text in texts))
+
+    benchSupport.report("parse all pages", benchSupport.bestOf(parseAll,
+            repeat=3))
+
+    if len(sys.argv) > 1 and sys.argv[1] == "profile":
+        import cProfile, pstats
+
+        profile = cProfile.Profile()
+        profile.runcall(parseAll)
+        stats = pstats.Stats(profile)
+        stats.sort_stats("time").print_stats(PROFILE_LINES)
+
+    app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for the two sqlite drivers selectable by global option
+"db_sqliteDriver": the ctypes binding SqliteThin3 (sqlite3api, "thin")
+and Python's built-in sqlite3 module (sqlite3stdapi, "stdlib").
+
+A compact_sqlite wiki is created with each driver and typical calls of
+WikiData are timed: reloading the dictionary of wiki link terms (as done
+after it was invalidated), reading all attributes and writing page
+contents.
+
+Usage: python benchmarks/benchSqliteDrivers.py [<pages>]
+    pages -- number of pages (default 2000)
+"""
+
+import sys, os.path, tempfile, shutil
+
+import benchSupport
+
+app = benchSupport.installBenchApp()
+
+import Consts
+
+
+ATTRIBUTE_COUNT = 5
+
+
+def fillWiki(wikiData, words):
+    for word in words:
+        wikiData.setContent(word, u"Content of " + word)
+        wikiData.updateAttributes(word, dict((u"key%i" % i, [u"value%i" % i])
+                for i in xrange(ATTRIBUTE_COUNT)))
+        wikiData.updateWikiWordMatchTerms(word, [(u"Alias" + word,
+                Consts.WIKIWORDMATCHTERMS_TYPE_ASLINK |
+                Consts.WIKIWORDMATCHTERMS_TYPE_FROM_ATTRIBUTES, word, 0, 5)])
+    wikiData.commit()
+
+
+def main():
+    pageCount = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    words = [u"BenchPage%i" % i for i in xrange(pageCount)]
+
+    dataDir = tempfile.mkdtemp(prefix="wikidpadbench")
+    try:
+        print "compact_sqlite, %i pages with %i attributes and an alias" % \
+                (pageCount, ATTRIBUTE_COUNT)
+
+        results = []
+        for driver in (u"thin", u"stdlib"):
+            app.getGlobalConfig().set("main", "db_sqliteDriver", driver)
+            driverDir = os.path.join(dataDir, driver)
+            os.mkdir(driverDir)
+            wikiData = benchSupport.createWikiData("compact_sqlite", driverDir)
+            fillWiki(wikiData, words)
+
+            def reloadLinkTerms():
+                wikiData.refreshWikiPageLinkTerms()
+                wikiData._getCachedWikiPageLinkTermDict().keys()
+
+            def readAttributes():
+                wikiData.getAttributeTriples(None, None, None)
+
+            def writeContents():
+                for word in words:
+                    wikiData.setContent(word, u"Changed content of " + word)
+                wikiData.commit()
+
+            results.append((driver, (
+                    ("reload link term dictionary",
+                        benchSupport.bestOf(reloadLinkTerms)),
+                    ("getAttributeTriples(None, None, None)",
+                        benchSupport.bestOf(readAttributes)),
+                    ("setContent() for all pages",
+                        benchSupport.bestOf(writeContents)))))
+
+            wikiData.close()
+
+        baseTimes = [seconds for label, seconds in results[0][1]]
+        for driver, timings in results:
+            for (label, seconds), baseSeconds in zip(timings, baseTimes):
+                benchSupport.report("%s: %s" % (driver, label), seconds,
+                        baseSeconds)
+    finally:
+        shutil.rmtree(dataDir, ignore_errors=True)
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Support for the benchmark scripts in this directory.
+
+The scripts measure single subsystems (database backends, configuration,
+parser) without starting the GUI. They must be run from the WikidPad
+directory, e.g.
+
+    python benchmarks/benchMetaDataUpdate.py
+
+installBenchApp() must be called before any module of pwiki is imported
+because some modules bind wx.GetApp at import time.
+"""
+
+import sys, os, os.path, time, tempfile, shutil, __builtin__
+
+
+WIKIDPAD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _setupPaths():
+    for path in (WIKIDPAD_DIR, os.path.join(WIKIDPAD_DIR, "lib")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    # Normally installed by the localization at startup
+    if not hasattr(__builtin__, "_"):
+        __builtin__._ = lambda s: s
+    if not hasattr(__builtin__, "N_"):
+        __builtin__.N_ = lambda s: s
+
+
+
+class BenchApp(object):
+    """
+    Provides the parts of the application object (pwiki.MainApp.App) which
+    are used by the database backends and the configuration, with default
+    settings for all global options.
+    """
+    def __init__(self):
+        from pwiki import Configuration
+        from pwiki.MiscEvent import MiscEvent
+
+        self.defaultGlobalConfigDict = dict(Configuration.GLOBALDEFAULTS)
+        self.globalConfig = Configuration.SingleConfiguration(
+                self.defaultGlobalConfigDict)
+        self.globalConfig.createEmptyConfig(None)
+        self.miscEvent = MiscEvent()
+        self.sqliteInitFlag = False
+        self.tempDir = tempfile.mkdtemp(prefix="wikidpadbench")
+
+    def getGlobalConfig(self):
+        return self.globalConfig
+
+    def getDefaultGlobalConfigDict(self):
+        return self.defaultGlobalConfigDict
+
+    def getMiscEvent(self):
+        return self.miscEvent
+
+    def isInPortableMode(self):
+        return False
+
+    def getGlobalConfigSubDir(self):
+        return self.tempDir
+
+    def close(self):
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+
+
+class BenchWikiDocument(object):
+    """
+    Provides the parts of a WikiDocument (WikiDataManager) which are needed
+    to create and connect a WikiData object of a database backend.
+    """
+    def __init__(self, wikiName=u"BenchWiki"):
+        from pwiki import Configuration
+
+        self.wikiName = wikiName
+        self.wikiConfig = Configuration.SingleConfiguration(
+                Configuration.WIKIDEFAULTS, Configuration.WIKIFALLTHROUGH)
+        self.wikiConfig.createEmptyConfig(None)
+
+    def getWikiConfig(self):
+        return self.wikiConfig
+
+    def getWikiName(self):
+        return self.wikiName
+
+    def getFileSignatureBlock(self, filename):
+        from pwiki.StringOps import getFileSignatureBlock
+
+        return getFileSignatureBlock(filename)
+
+
+
+def installBenchApp():
+    """
+    Set up sys.path and make wx.GetApp() return a new BenchApp which is
+    returned.
+    """
+    _setupPaths()
+
+    import wx
+
+    app = BenchApp()
+    wx.GetApp = lambda: app
+    return app
+
+
+def createWikiData(dbtype, dataDir):
+    """
+    Create a new, connected WikiData object of database backend dbtype
+    ("compact_sqlite" or "original_sqlite") in empty directory dataDir.
+    """
+    from pwiki.wikidata import DbBackendUtils
+
+    wikiDataFactory, createWikiDbFunc = DbBackendUtils.getHandler(dbtype)
+    wikiDocument = BenchWikiDocument()
+
+    createWikiDbFunc(wikiDocument.getWikiName(), dataDir, False)
+    wikiData = wikiDataFactory(wikiDocument, dataDir, dataDir)
+    wikiData.connect()
+    return wikiData
+
+HELP_WIKI_DATA_DIR = os.path.join(WIKIDPAD_DIR, "WikidPadHelp", "data")
+
+
+def getHelpWikiPages():
+    """
+    Return list of tuples (<wiki word>, <unistring text>) for all pages
+    of the help wiki, sorted by wiki word.
+    """
+    import codecs
+
+    result = []
+    for fileName in sorted(os.listdir(HELP_WIKI_DATA_DIR)):
+        if not fileName.endswith(".wiki"):
+            continue
+
+        f = codecs.open(os.path.join(HELP_WIKI_DATA_DIR, fileName), "r",
+                "utf-8")
+        try:
+            text = f.read()
+        finally:
+            f.close()
+
+        if text.startswith(u"\ufeff"):
+            text = text[1:]
+        result.append((fileName[:-5].decode("latin-1"), text))
+
+    return result
+
+
+
+class BenchParserWikiDocument(object):
+    """
+    Provides the parts of a WikiDocument which are used by the parser
+    of the WikidPad wiki language.
+    """
+    def getCcWordBlacklist(self):
+        return set()
+
+    def getNccWordBlacklist(self):
+        return set()
+
+
+
+def importWikidPadParser(name="WikidPadParser"):
+    """
+    Import the parser module of the WikidPad wiki language and return it.
+    If name isn't the module name, an independent second instance of
+    the module is loaded under this name (e.g. to build the grammar
+    with other optimization settings).
+    """
+    parserDir = os.path.join(WIKIDPAD_DIR, "extensions", "wikidPadParser")
+    if parserDir not in sys.path:
+        sys.path.insert(0, parserDir)
+
+    if name == "WikidPadParser":
+        import WikidPadParser
+        return WikidPadParser
+
+    import imp
+
+    return imp.load_source(name, os.path.join(parserDir, "WikidPadParser.py"))
+
+
+def createPageParser(parserModule):
+    """
+    Return function taking a unistring and returning the AST of it
+    built by parserModule (see importWikidPadParser()).
+    """
+    from pwiki.ParseUtilities import WikiPageFormatDetails
+    from pwiki.Utilities import DUMBTHREADSTOP
+
+    formatDetails = WikiPageFormatDetails(
+            wikiDocument=BenchParserWikiDocument(),
+            wikiLanguageDetails=parserModule.WikiLanguageDetails(None, None))
+
+    parser = parserModule.THE_PARSER
+    languageName = parserModule.WIKI_LANGUAGE_NAME
+
+    def parsePage(text):
+        return parser.parse(languageName, text, formatDetails, DUMBTHREADSTOP)
+
+    return parsePage
+
+
+
+def bestOf(fct, repeat=5):
+    """
+    Call fct repeat times and return the shortest duration in seconds
+    """
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        fct()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+
+    return best
+
+
+def report(label, seconds, baseSeconds=None):
+    """
+    Print one result line. If baseSeconds is given, the speedup relative
+    to it is printed too.
+    """
+    if baseSeconds is None or seconds == 0:
+        print "%-50s %10.2f ms" % (label, seconds * 1000)
+    else:
+        print "%-50s %10.2f ms  (x%.1f)" % (label, seconds * 1000,
+                baseSeconds / seconds)
@@ -0,0 +1,131 @@
+"""
+Correctness check for the version overview of the versioning: versions are
+added and deleted while compression of complete packets is switched on and
+off, and the overview is written and read again between the steps as it
+happens when the page is reopened. A packet which was compressed before
+must lose its encoding when it is stored uncompressed later. All versions
+must be retrievable with their original content afterwards. The data blocks
+are stored in a compact_sqlite database.
+
+Usage:
+    python benchmarks/checkVersionOverview.py
+
+The exit code is 1 if a check fails.
+"""
+
+import sys, traceback, tempfile, shutil
+
+import benchSupport
+
+app = benchSupport.installBenchApp()
+
+from pwiki.timeView import Versioning
+
+
+PAGE_NAME = u"wikipage/CheckPage"
+
+
+class CheckWikiDocument(benchSupport.BenchWikiDocument):
+    """
+    Provides the data block functions of WikiDataManager for wikiData.
+    """
+    def __init__(self, wikiData):
+        benchSupport.BenchWikiDocument.__init__(self)
+        self.wikiData = wikiData
+
+    def retrieveDataBlock(self, unifName, default=""):
+        return self.wikiData.retrieveDataBlock(unifName, default=default)
+
+    def retrieveDataBlocks(self, unifNames, default=""):
+        return self.wikiData.retrieveDataBlocks(unifNames, default=default)
+
+    def storeDataBlock(self, unifName, newdata, storeHint=None):
+        return self.wikiData.storeDataBlock(unifName, newdata, storeHint)
+
+    def deleteDataBlock(self, unifName):
+        self.wikiData.deleteDataBlock(unifName)
+
+
+
+def reopenOverview(wikiDocument, overview):
+    """
+    Write overview and return a new one read from the written data.
+    """
+    overview.writeOverview()
+    overview = Versioning.VersionOverview(wikiDocument,
+            unifiedBasePageName=PAGE_NAME)
+    overview.readOverview()
+    return overview
+
+
+def setCompression(wikiDocument, compress):
+    wikiDocument.getWikiConfig().set("main", "versioning_compressComplete",
+            unicode(compress))
+
+
+def check(wikiData, completeSteps):
+    wikiDocument = CheckWikiDocument(wikiData)
+    wikiDocument.getWikiConfig().set("main", "versioning_completeSteps",
+            unicode(completeSteps))
+
+    contents = []
+    overview = Versioning.VersionOverview(wikiDocument,
+            unifiedBasePageName=PAGE_NAME)
+    overview.readOverview()
+
+    for i in xrange(8):
+        setCompression(wikiDocument, i % 2 == 0)
+        content = u"Version %i\n%s" % (i, u"Some text line\n" * (20 + i))
+        overview.addVersion(content, Versioning.VersionEntry(PAGE_NAME))
+        contents.append(content)
+        overview = reopenOverview(wikiDocument, overview)
+
+    # Deleting the newest version stores the previous one as complete packet
+    for compress in (False, True, False):
+        setCompression(wikiDocument, compress)
+        overview.deleteVersion(-1)
+        del contents[-1]
+        overview = reopenOverview(wikiDocument, overview)
+
+    failed = 0
+    for entry, content in zip(overview.getVersionEntries(), contents):
+        try:
+            result = overview.getVersionContent(entry.versionNumber)
+        except Exception:
+            traceback.print_exc()
+            result = None
+
+        if result != content:
+            print "completeSteps %i: version %i differs (%s, %s)" % (
+                    completeSteps, entry.versionNumber,
+                    entry.contentDifferencing, entry.contentEncoding)
+            failed += 1
+
+    return failed
+
+
+def main():
+    dataDir = tempfile.mkdtemp(prefix="wikidpadbench")
+    try:
+        failed = 0
+        for completeSteps in (0, 3):
+            wikiData = benchSupport.createWikiData("compact_sqlite",
+                    tempfile.mkdtemp(dir=dataDir))
+            try:
+                failed += check(wikiData, completeSteps)
+            finally:
+                wikiData.close()
+    finally:
+        shutil.rmtree(dataDir, ignore_errors=True)
+        app.close()
+
+    if failed:
+        print "%i versions differ" % failed
+        return 1
+
+    print "All versions retrieved correctly"
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
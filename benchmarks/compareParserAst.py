@@ -0,0 +1,231 @@
+"""
+Correctness check for changes of the parser engine WikiPyparsing: the
+ASTs of all pages of the help wiki built by the parser of the WikidPad
+wiki language are compared. Additionally generated samples are parsed by
+a small grammar with elements the wiki language parser doesn't use (e.g.
+CaselessLiteral).
+
+Usage:
+    python benchmarks/compareParserAst.py
+        Compare the grammar optimized as shipped (e.g. option
+        "regexcombine") with the same grammar optimized without options,
+        the same for the sample grammar. Optimizations must not change
+        any AST.
+    python benchmarks/compareParserAst.py write <file>
+        Store the ASTs in file (before changing the engine)
+    python benchmarks/compareParserAst.py compare <file>
+        Compare the ASTs with the ones stored in file (after the change)
+
+The exit code is 1 if ASTs differ.
+"""
+
+import sys, re, random, cPickle
+
+import benchSupport
+
+app = benchSupport.installBenchApp()
+
+from pwiki import WikiPyparsing
+
+
+# Number of differing pages for which details are printed
+MAX_REPORTED_DIFFS = 10
+
+# Options of the sample grammar which are compared with no options
+SAMPLE_OPTIONS = ("regexcombine",)
+SAMPLE_COUNT = 3000
+SAMPLE_CHARS = u"*_[]+!~xyABCDcdabHttpfp:/ \n\xe9K\u0130Kk"
+
+
+def serializeNode(node):
+    """
+    Return a comparable representation of node built from tuples,
+    strings and numbers.
+    """
+    extra = node.getExtraAttributes()
+    if extra:
+        extra = tuple(sorted((key, serializeValue(value))
+                for key, value in extra.iteritems()))
+    else:
+        extra = ()
+
+    if node.isTerminal():
+        return (node.name, node.pos, node.strLength, extra, node.getText())
+
+    return (node.name, node.pos, node.strLength, extra,
+            tuple(serializeNode(sub) for sub in node.sub))
+
+
+def serializeValue(value):
+    if isinstance(value, WikiPyparsing.SyntaxNode):
+        return serializeNode(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(serializeValue(v) for v in value)
+    if isinstance(value, (basestring, int, long, float, bool)) or \
+            value is None:
+        return value
+
+    return repr(value)
+
+
+def buildAsts(parserModule, pages):
+    """
+    Return dictionary {<wiki word>: <serialized AST>}
+    """
+    parsePage = benchSupport.createPageParser(parserModule)
+    return dict((word, serializeNode(parsePage(text)))
+            for word, text in pages)
+
+
+def importUnoptimizedParser():
+    """
+    Load a second instance of the parser module whose grammar is optimized
+    without any options.
+    """
+    originalOptimize = WikiPyparsing.ParserElement.optimize
+
+    def optimizeWithoutOptions(self, options=None):
+        return originalOptimize(self, ())
+
+    WikiPyparsing.ParserElement.optimize = optimizeWithoutOptions
+    try:
+        return benchSupport.importWikidPadParser("WikidPadParserUnoptimized")
+    finally:
+        WikiPyparsing.ParserElement.optimize = originalOptimize
+
+
+def buildSampleGrammar(options):
+    from pwiki.WikiPyparsing import Literal, CaselessLiteral, Regex, \
+            Optional, NotAny, MatchFirst, ZeroOrMore
+
+    elements = [
+            (Literal("*") + Regex(r"[^*\n]+") + Literal("*"))
+                .setResultsName("bold"),
+            Regex(r"_[^_\n]+_").setResultsName("italics"),
+            Regex(r"(?:https?|ftp)://\S+", re.I).setResultsName("url"),
+            Regex(r"(?:[A-Z]+[a-z]+){2,}").setResultsName("wikiWord"),
+            (Literal("[") + Regex(r"[^\]\n]+") + Literal("]"))
+                .setResultsName("link"),
+            (Optional(Literal("!")) + Literal("~")).setResultsName("optional"),
+            (NotAny(Literal("x")) + Regex(r"y")).setResultsName("notAny"),
+            # All alternatives provide a regex, so "regexcombine" combines
+            # them. The results name keeps streamline() from merging this
+            # MatchFirst into the enclosing one.
+            MatchFirst([Literal("AB").setResultsName("literal"),
+                CaselessLiteral("cd").setResultsName("caselessLiteral"),
+                Regex(r"[a-z]+").setResultsName("word"),
+                Regex(r".", re.S).setResultsName("plain")])
+                .setResultsName("inline")]
+
+    grammar = ZeroOrMore(MatchFirst(elements))
+    grammar.leaveWhitespace()
+    return grammar.optimize(options)
+
+
+def compareSamples():
+    """
+    Parse generated samples with the sample grammar optimized with and
+    without SAMPLE_OPTIONS, print differences and return number of
+    differing samples
+    """
+    grammar = buildSampleGrammar(SAMPLE_OPTIONS)
+    refGrammar = buildSampleGrammar(())
+
+    rand = random.Random(3)
+    diffCount = 0
+    for i in xrange(SAMPLE_COUNT):
+        sample = u"".join(rand.choice(SAMPLE_CHARS)
+                for j in xrange(rand.randint(0, 60)))
+        if i % 3 == 0:
+            sample = u"http://x.y CamelCase *bold* " + sample
+
+        # Parse results are lists of nodes, put them into a root node
+        ast = ("root", 0, len(sample), (),
+                serializeValue(grammar.parseString(sample)))
+        refAst = ("root", 0, len(sample), (),
+                serializeValue(refGrammar.parseString(sample)))
+        if ast != refAst:
+            diffCount += 1
+            if diffCount <= MAX_REPORTED_DIFFS:
+                node, refNode = findFirstDifference(ast, refAst)
+                print "Sample %r:\n    %r\n    expected %r" % (sample, node,
+                        refNode)
+
+    print "%i of %i samples differ" % (diffCount, SAMPLE_COUNT)
+    return diffCount
+
+
+def summarizeNode(node):
+    if isinstance(node[4], tuple):
+        return node[:4] + ("%i children" % len(node[4]),)
+
+    return node
+
+
+def findFirstDifference(ast1, ast2):
+    """
+    Return tuple (<summary of node of ast1>, <summary of node of ast2>)
+    for the first differing serialized nodes.
+    """
+    while ast1[:4] == ast2[:4] and isinstance(ast1[4], tuple) and \
+            isinstance(ast2[4], tuple):
+        for sub1, sub2 in zip(ast1[4], ast2[4]):
+            if sub1 != sub2:
+                ast1, ast2 = sub1, sub2
+                break
+        else:
+            break
+
+    return summarizeNode(ast1), summarizeNode(ast2)
+
+
+def compareAsts(asts, refAsts):
+    """
+    Print differences and return number of differing pages
+    """
+    diffWords = sorted(word for word in set(asts) | set(refAsts)
+            if asts.get(word) != refAsts.get(word))
+
+    for word in diffWords[:MAX_REPORTED_DIFFS]:
+        if word not in asts or word not in refAsts:
+            print "%s: page missing" % word.encode("ascii", "replace")
+            continue
+
+        node, refNode = findFirstDifference(asts[word], refAsts[word])
+        print "%s:\n    %r\n    expected %r" % (
+                word.encode("ascii", "replace"), node, refNode)
+
+    print "%i of %i pages differ" % (len(diffWords), len(refAsts))
+    return len(diffWords)
+
+
+def main():
+    pages = benchSupport.getHelpWikiPages()
+    asts = buildAsts(benchSupport.importWikidPadParser(), pages)
+
+    if len(sys.argv) > 2 and sys.argv[1] == "write":
+        f = open(sys.argv[2], "wb")
+        try:
+            cPickle.dump(asts, f, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        print "ASTs of %i pages written" % len(asts)
+        diffCount = 0
+    elif len(sys.argv) > 2 and sys.argv[1] == "compare":
+        f = open(sys.argv[2], "rb")
+        try:
+            refAsts = cPickle.load(f)
+        finally:
+            f.close()
+        diffCount = compareAsts(asts, refAsts)
+    else:
+        refAsts = buildAsts(importUnoptimizedParser(), pages)
+        diffCount = compareAsts(asts, refAsts) + compareSamples()
+
+    app.close()
+    if diffCount > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
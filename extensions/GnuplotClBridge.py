@@ -153,9 +153,10 @@ class GptHandler:
     def getExtraFeatures(self):
         """
         Returns a list of bytestrings describing additional features supported
-        by the plugin. Currently not specified further.
+        by the plugin. "cacheable content" means that the result only depends
+        on the insertion itself so it can be cached by the exporter.
         """
-        return ()
+        return ("cacheable content",)
         
 
 def registerOptions(ver, app):
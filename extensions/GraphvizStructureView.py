@@ -108,9 +108,88 @@ def _buildGraphStyle(config):
 
 
 
+def _createLinkTermResolver(wikiDocument):
+    """
+    Return function resolving link terms to wiki page names (or None).
+    The same terms appear in many relations, so results are remembered.
+    """
+    resolved = {}
+
+    def resolve(term):
+        try:
+            return resolved[term]
+        except KeyError:
+            word = wikiDocument.getWikiPageNameForLinkTerm(term)
+            resolved[term] = word
+            return word
+
+    return resolve
+
+
+def _limitToNeighborhood(edges, currWord, hops):
+    """
+    Return list of those edges (tuples starting with source and target word)
+    which connect words reachable from currWord within hops steps
+    (regardless of edge direction).
+    """
+    neighbors = {}
+    for edge in edges:
+        neighbors.setdefault(edge[0], set()).add(edge[1])
+        neighbors.setdefault(edge[1], set()).add(edge[0])
+
+    wordSet = set((currWord,))
+    frontier = [currWord]
+    for i in xrange(hops):
+        nextFrontier = []
+        for word in frontier:
+            for neighbor in neighbors.get(word, ()):
+                if neighbor not in wordSet:
+                    wordSet.add(neighbor)
+                    nextFrontier.append(neighbor)
+
+        frontier = nextFrontier
+
+    return [edge for edge in edges if edge[0] in wordSet and
+            edge[1] in wordSet]
+
+
+def _getNeighborhoodHops(config, currWord):
+    """
+    Return number of steps around currWord the graph should be limited to
+    or 0 for the whole wiki.
+    """
+    if currWord is None:
+        return 0
+
+    return config.getint("main", "plugin_graphVizStructure_neighborhoodHops",
+            0)
+
+
+def _getGraphSourceCached(buildFunc, graphKind, wikiDocument, currWord,
+        config):
+    """
+    Return source built by buildFunc(wikiDocument, currWord, config) from
+    the insertion result cache of the wiki. It is valid until the next change
+    of a wiki page or of the options.
+    """
+    insCache = wikiDocument.getInsertionResultCache()
+    key = insCache.buildKey(u"graphVizStructure", graphKind, currWord)
+
+    source = insCache.getDependentResult(key)
+    if source is None:
+        source = buildFunc(wikiDocument, currWord, config)
+        insCache.putDependentResult(key, source)
+
+    return source
+
+
+
 def buildRelationGraphSource(wikiDocument, currWord, config):
-    wikiData = wikiDocument.getWikiData()
+    return _getGraphSourceCached(_buildRelationGraphSource, u"relation",
+            wikiDocument, currWord, config)
 
+
+def _buildRelationGraphSource(wikiDocument, currWord, config):
     global_excludeRe = None
     global_includeRe = None
 
@@ -147,17 +226,27 @@ def buildRelationGraphSource(wikiDocument, currWord, config):
     else:
         word_relations = word_attributes
 
-    wordSet = set()
+    resolve = _createLinkTermResolver(wikiDocument)
 
     # Unalias wikiwords/remove non-wikiwords in attribute values
+    edges = []
     for p in word_relations:
-        word = wikiDocument.getWikiPageNameForLinkTerm(p[2])
+        word = resolve(p[2])
         if word is None:
             continue
 
-        graph.append(u'"%s" -> "%s" [label="%s"];' % (p[0], word, p[1]))
-        wordSet.add(p[0])
+        edges.append((p[0], word, p[1]))
+
+    hops = _getNeighborhoodHops(config, currWord)
+    if hops > 0:
+        edges = _limitToNeighborhood(edges, resolve(currWord), hops)
+
+    wordSet = set()
+
+    for word, child, key in edges:
+        graph.append(u'"%s" -> "%s" [label="%s"];' % (word, child, key))
         wordSet.add(word)
+        wordSet.add(child)
 
     graph.append('}')
 
@@ -170,22 +259,27 @@ def buildRelationGraphSource(wikiDocument, currWord, config):
 
 
 def buildChildGraphSource(wikiDocument, currWord, config):
-    wikiData = wikiDocument.getWikiData()
+    return _getGraphSourceCached(_buildChildGraphSource, u"child",
+            wikiDocument, currWord, config)
 
-    graph = [u'', u'digraph {', _buildGraphStyle(config)]
 
-    graph += _buildNodeDefs(wikiDocument, currWord)
+def _buildChildGraphSource(wikiDocument, currWord, config):
+    graph = [u'', u'digraph {', _buildGraphStyle(config)]
 
-    conns = set()
+    resolve = _createLinkTermResolver(wikiDocument)
 
-    allWords = wikiData.getAllDefinedWikiPageNames()
+    conns = set((word, resolve(child)) for word, child in
+            wikiDocument.getAllChildRelationships(existingonly=True,
+            selfreference=False))
 
-    for word in allWords:
-        for child in wikiData.getChildRelationships(word, existingonly=True,
-                selfreference=False):
-            child = wikiDocument.getWikiPageNameForLinkTerm(child)
+    hops = _getNeighborhoodHops(config, currWord)
+    if hops > 0:
+        conns = _limitToNeighborhood(conns, resolve(currWord), hops)
+        wordSet = set(word for conn in conns for word in conn)
+    else:
+        wordSet = None
 
-            conns.add((word, child))
+    graph += _buildNodeDefs(wikiDocument, currWord, wordSet)
 
     for word, child in conns:
         graph.append(u'"%s" -> "%s";' % (word, child))
@@ -297,7 +391,8 @@ class GraphVizBaseHandler:
             return u""
 
         response, url = self.createImage(exporter.getTempFileSet(), exportType,
-                source, insToken.appendices)
+                source, insToken.appendices,
+                exporter.getWikiDocument().getInsertionResultCache())
 
         if response is not None:
             return u'<pre>' + (u'[%s]' % response)+ \
@@ -314,8 +409,13 @@ class GraphVizBaseHandler:
 
 
 
-    def createImage(self, tempFileSet, exportType, source, insParams):
+    def createImage(self, tempFileSet, exportType, source, insParams,
+            insCache=None):
         """
+        Create image file for graph source. If an InsertionResultCache is
+        given as insCache, an image created before for the same source is
+        restored from there instead of running the external application.
+        Returns tuple (<error response or None>, <url of image>).
         """
         # Retrieve quoted content of the insertion
         
@@ -329,6 +429,15 @@ class GraphVizBaseHandler:
         source = lineendToOs(utf8Enc(source, "replace")[0])
 
         pythonUrl = (exportType != "html_previewWX")
+
+        if insCache is not None:
+            cacheKey = insCache.buildKey(u"graphVizStructure", self.extAppExe,
+                    exportType, source, tfs.getPreferredPath(),
+                    tfs.getPreferredRelativeTo())
+            url = insCache.lookup(cacheKey, tfs)
+            if url is not None:
+                return None, url
+
         dstFullPath = tfs.createTempFile("", ".png", relativeTo="")
         url = tfs.getRelativeUrl(None, dstFullPath, pythonUrl=pythonUrl)
 
@@ -365,6 +474,9 @@ class GraphVizBaseHandler:
             errResponse = mbcsDec(errResponse, "replace")[0]
             return (_(u"%s Error: %s") % (appname, errResponse)), None
 
+        if insCache is not None:
+            insCache.store(cacheKey, url, [dstFullPath])
+
         return None, url
 
 
@@ -529,8 +641,10 @@ class GraphView(wx.html.HtmlWindow):
                         self.presenter.getMainControl().getConfig())
 
             if self.mode.endswith("/dot"):
+                insCache = self.presenter.getWikiDocument()\
+                        .getInsertionResultCache()
                 response, url = self.graphDotHandler.createImage(self.tempFileSet,
-                        "html_previewWX", source, [])
+                        "html_previewWX", source, [], insCache)
 
                 if response:
                     self.presenter.displayErrorMessage(response)
@@ -656,6 +770,7 @@ def registerOptions(ver, app):
     dgcd[("main", "plugin_graphVizStructure_nodeBorderColor")] = u""
     dgcd[("main", "plugin_graphVizStructure_nodeBgColor")] = u""
     dgcd[("main", "plugin_graphVizStructure_edgeColor")] = u""
+    dgcd[("main", "plugin_graphVizStructure_neighborhoodHops")] = u"0"
 
     # Register panel in options dialog
     app.addOptionsDlgPanel(GraphVizStructOptionsPanel, _(u"  GraphVizStructure"))
@@ -671,7 +786,7 @@ class GraphVizStructOptionsPanel(PluginOptionsPanel):
         """
         PluginOptionsPanel.__init__(self, parent, optionsDlg)
 
-        mainsizer = wx.FlexGridSizer(5, 3, 0, 0)
+        mainsizer = wx.FlexGridSizer(6, 3, 0, 0)
         mainsizer.AddGrowableCol(1, 1)
 
         self.tfFacename = wx.TextCtrl(self, -1)
@@ -736,6 +851,17 @@ class GraphVizStructOptionsPanel(PluginOptionsPanel):
         self.addOptionEntry("plugin_graphVizStructure_edgeColor", ctl,
                 "color0", colorButton)
 
+
+        ctl = wx.TextCtrl(self, -1)
+        mainsizer.Add(wx.StaticText(self, -1,
+                _(u"Steps around current page (0: whole wiki):")), 0,
+                wx.ALL | wx.EXPAND, 5)
+        mainsizer.Add(ctl, 1, wx.ALL | wx.EXPAND, 5)
+        mainsizer.Add((0, 0), 1)
+
+        self.addOptionEntry("plugin_graphVizStructure_neighborhoodHops", ctl,
+                "i0+")
+
         self.SetSizer(mainsizer)
         self.Fit()
         
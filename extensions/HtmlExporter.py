@@ -6,7 +6,7 @@ from __future__ import with_statement
 import sys, os, os.path, string, re, traceback, locale, time, urllib
 from os.path import join, exists
 from cStringIO import StringIO
-import shutil
+import shutil, hashlib
 
 import pwiki.urllib_red as urllib
 
@@ -133,6 +133,73 @@ class FilenameConverter(object):
 
 
 
+class BlockFragmentCache(object):
+    """
+    Cache of rendered HTML fragments for the top-level blocks of a page.
+    Used by the preview so that only changed blocks (or blocks whose
+    link targets changed) are rendered again on refresh.
+
+    Entries not used during the last formatting round are dropped at its end,
+    so the cache never holds more than the blocks of the last rendered page.
+    """
+    def __init__(self):
+        self.fragments = {}
+        self.usedKeys = set()
+        self.formatDetails = None
+        self.hits = 0
+        self.misses = 0
+
+
+    def clear(self):
+        self.fragments = {}
+        self.usedKeys = set()
+        self.formatDetails = None
+
+
+    def startRound(self, formatDetails):
+        """
+        Called before formatting a page. If the format details differ from
+        the ones used before, all cached fragments are invalid.
+        """
+        if self.formatDetails is None or \
+                not self.formatDetails.isEquivTo(formatDetails):
+            self.fragments = {}
+
+        self.formatDetails = formatDetails
+        self.usedKeys = set()
+        self.hits = 0
+        self.misses = 0
+
+
+    def endRound(self):
+        """
+        Called after formatting a page. Removes all fragments which were
+        not used in this round.
+        """
+        if len(self.usedKeys) < len(self.fragments):
+            self.fragments = dict((k, v) for k, v in self.fragments.iteritems()
+                    if k in self.usedKeys)
+
+        self.usedKeys = set()
+
+
+    def get(self, key):
+        self.usedKeys.add(key)
+        result = self.fragments.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return result
+
+
+    def put(self, key, fragment):
+        self.usedKeys.add(key)
+        self.fragments[key] = fragment
+
+
+
 class SizeValue(object):
     """
     Represents a single size value, either a pixel or percent size.
@@ -446,6 +513,12 @@ class HtmlExporter(AbstractExporter):
 #         self.convertFilename = removeBracketsFilename   # lambda s: mbcsEnc(s, "replace")[0]
 
         self.result = None
+        # BlockFragmentCache or None if blocks are always rendered
+        self.blockFragmentCache = None
+        # While a block is rendered after a block fragment cache miss:
+        # dictionary {<wiki word>: <link state>} with the link states
+        # already determined to build the cache key
+        self.blockLinkStates = None
         
         # Flag to control how to push output into self.result
         self.outFlagEatPostBreak = False
@@ -839,6 +912,28 @@ class HtmlExporter(AbstractExporter):
                     u"Trying to get internal jump prefix for non-preview export")
 
 
+    def enableBlockFragmentCache(self, enable=True):
+        """
+        Switch caching of rendered top-level blocks on or off. This should
+        only be used for previews as the cache is bound to this exporter
+        object.
+        """
+        if enable:
+            if self.blockFragmentCache is None:
+                self.blockFragmentCache = BlockFragmentCache()
+        else:
+            self.blockFragmentCache = None
+
+
+    def clearBlockFragmentCache(self):
+        """
+        Must be called if anything changed which influences the rendering
+        of blocks but is not part of the cache key (e.g. options).
+        """
+        if self.blockFragmentCache is not None:
+            self.blockFragmentCache.clear()
+
+
     def setLinkConverter(self, linkConverter):
         self.linkConverter = linkConverter
 
@@ -1464,7 +1559,14 @@ class HtmlExporter(AbstractExporter):
             self.optsStack["innermostFullPageAst"] = self.basePageAst
             self.optsStack["innermostPageUnifName"] = u"wikipage/" + word
             self.optsStack["innermostDocPage"] = wikiPage
-            self.processAst(content, self.basePageAst)
+            if self.blockFragmentCache is not None:
+                self.blockFragmentCache.startRound(formatDetails)
+                try:
+                    self._processAstWithBlockCache(content, self.basePageAst)
+                finally:
+                    self.blockFragmentCache.endRound()
+            else:
+                self.processAst(content, self.basePageAst)
 
         if self.asHtmlPreview and facename:
             self.outAppend('</font>')
@@ -2105,16 +2207,8 @@ class HtmlExporter(AbstractExporter):
                         exportType, key)
 
             if handler is not None:
-                try:
-                    htmlContent = handler.createContent(self, exportType,
-                            astNode)
-                except Exception, e:
-                    s = StringIO()
-                    traceback.print_exc(file=s)
-                    htmlContent = u'<pre class="wikidpad">' + mbcsDec(s.getvalue(), 'replace')[0] + u'</pre>'
-
-                if htmlContent is None:
-                    htmlContent = u""
+                htmlContent = self._createInsertionContentCached(handler,
+                        exportType, astNode)
             else:
                 # Try to find a generic handler for export type
                 # "wikidpad_language"
@@ -2132,7 +2226,17 @@ class HtmlExporter(AbstractExporter):
                         htmlContent = u'<pre class="wikidpad">' + mbcsDec(s.getvalue(), 'replace')[0] + u'</pre>'
 
         if searchOp is not None:
-            wordList = self.wikiDocument.searchWiki(searchOp)
+            # Search results are cached until the next change of a wiki page
+            insCache = self.wikiDocument.getInsertionResultCache()
+            searchKey = insCache.buildKey(u"search",
+                    searchOp.getPackedSettings())
+            wordList = insCache.getDependentResult(searchKey)
+            if wordList is None:
+                wordList = self.wikiDocument.searchWiki(searchOp)
+                insCache.putDependentResult(searchKey, wordList)
+
+            # The list is modified below
+            wordList = wordList[:]
             
             if ("removeself" in appendices) or ("removethis" in appendices):
                 # Because a simple search for "foo" includes the page containing
@@ -2200,6 +2304,48 @@ class HtmlExporter(AbstractExporter):
             self.outAppend(htmlContent)
 
 
+    def _createInsertionContentCached(self, handler, exportType, astNode):
+        """
+        Call createContent() of an insertion handler. If handler supports
+        caching (feature "cacheable content" in getExtraFeatures()) the
+        result and created temporary files are taken from or stored in
+        the insertion result cache of the wiki.
+        """
+        tfs = self.getTempFileSet()
+        cacheable = tfs is not None and \
+                "cacheable content" in handler.getExtraFeatures()
+
+        if cacheable:
+            insCache = self.wikiDocument.getInsertionResultCache()
+            # Temporary files are restored at their original path, so
+            # location of temp. files is part of the key
+            cacheKey = insCache.buildKey(exportType, astNode.key,
+                    astNode.value, astNode.appendices,
+                    tfs.getPreferredPath(), tfs.getPreferredRelativeTo())
+
+            htmlContent = insCache.lookup(cacheKey, tfs)
+            if htmlContent is not None:
+                return htmlContent
+
+            filesBefore = set(tfs.fileSet)
+
+        try:
+            htmlContent = handler.createContent(self, exportType, astNode)
+        except Exception, e:
+            s = StringIO()
+            traceback.print_exc(file=s)
+            return u'<pre class="wikidpad">' + mbcsDec(s.getvalue(), 'replace')[0] + u'</pre>'
+
+        if htmlContent is None:
+            htmlContent = u""
+
+        if cacheable:
+            insCache.store(cacheKey, htmlContent,
+                    [path for path in tfs.fileSet if path not in filesBefore])
+
+        return htmlContent
+
+
     def _processWikiWord(self, astNodeOrWord, fullContent=None):
         self.astNodeStack.append(astNodeOrWord)
 
@@ -2211,27 +2357,16 @@ class HtmlExporter(AbstractExporter):
             wikiWord = astNodeOrWord
             anchorLink = None
             titleNode = None
-            
-        if self.avoidDeadWikiLinks and not self.shouldExport(
-                self.wikiDocument.getWikiPageNameForLinkTerm(wikiWord)):
-            link = None
-        else:
-            self.linkConverter.wikiDocument = self.wikiDocument
-            link = self.linkConverter.getLinkForWikiWord(wikiWord)
-
-        selfLink = False
 
-        if link:
-            linkTo = self.wikiDocument.getWikiPageNameForLinkTerm(wikiWord)
+        linkState = None
+        if self.blockLinkStates is not None:
+            linkState = self.blockLinkStates.get(wikiWord)
+        if linkState is None:
+            linkState = self._getWikiWordLinkState(wikiWord)
 
-            # Test if link to same page itself (maybe with an anchor fragment)
-            if not self.exportType == u"html_multi":
-                linkFrom = self.wikiDocument.getWikiPageNameForLinkTerm(
-                        self.wikiWord)
-                if linkTo is not None and linkTo == linkFrom:
-                    # Page links to itself
-                    selfLink = True
+        link, selfLink, title = linkState
 
+        if link:
             # Add anchor fragment if present
             if anchorLink:
                 if selfLink:
@@ -2239,13 +2374,6 @@ class HtmlExporter(AbstractExporter):
                 else:
                     link += u"#" + anchorLink
 
-            title = None
-            if linkTo is not None:
-                propList = self.wikiDocument.getAttributeTriples(linkTo,
-                        u"short_hint", None)
-                if len(propList) > 0:
-                    title = propList[-1][2]
-
             if self.optsStack.get("suppressLinks", False):
                 self.outAppend(u'<span class="wikidpad wiki-link">')
             else:
@@ -2279,6 +2407,44 @@ class HtmlExporter(AbstractExporter):
         self.astNodeStack.pop()
 
 
+    def _getWikiWordLinkState(self, wikiWord):
+        """
+        Return tuple (link, selfLink, title) for wikiWord where link is the
+        link (without anchor fragment) or None if word shouldn't be linked,
+        selfLink is True if link points to currently exported page and
+        title is the short hint of the target or None.
+        """
+        if self.avoidDeadWikiLinks and not self.shouldExport(
+                self.wikiDocument.getWikiPageNameForLinkTerm(wikiWord)):
+            return (None, False, None)
+
+        self.linkConverter.wikiDocument = self.wikiDocument
+        link = self.linkConverter.getLinkForWikiWord(wikiWord)
+
+        if not link:
+            return (link, False, None)
+
+        selfLink = False
+        linkTo = self.wikiDocument.getWikiPageNameForLinkTerm(wikiWord)
+
+        # Test if link to same page itself (maybe with an anchor fragment)
+        if not self.exportType == u"html_multi":
+            linkFrom = self.wikiDocument.getWikiPageNameForLinkTerm(
+                    self.wikiWord)
+            if linkTo is not None and linkTo == linkFrom:
+                # Page links to itself
+                selfLink = True
+
+        title = None
+        if linkTo is not None:
+            propList = self.wikiDocument.getAttributeTriples(linkTo,
+                    u"short_hint", None)
+            if len(propList) > 0:
+                title = propList[-1][2]
+
+        return (link, selfLink, title)
+
+
     def _processUrlLink(self, fullContent, astNode):
         link = astNode.url
         pointRelative = False  # Should final link be relative?
@@ -2490,6 +2656,114 @@ class HtmlExporter(AbstractExporter):
             self.astNodeStack.pop()
 
 
+    # Blocks containing one of these nodes are never taken from the
+    # block fragment cache because their output depends on more than the
+    # block itself
+    _BLOCK_CACHE_UNCACHEABLE_NAMES = frozenset(("insertion", "footnote"))
+
+    # Output of these nodes depends on their position in the page
+    _BLOCK_CACHE_POSITIONAL_NAMES = frozenset(("heading",))
+
+
+    def _getBlockCacheKey(self, content, node, linkStateDict):
+        """
+        Return the key for the top-level block node in the block fragment
+        cache or None if node can't be cached.
+        The link states of the wiki words in the block are stored in
+        dictionary linkStateDict so rendering doesn't need to look them up
+        again.
+        """
+        positional = False
+        linkStates = []
+        for subNode in node.iterDeep():
+            subName = subNode.name
+            if subName in self._BLOCK_CACHE_UNCACHEABLE_NAMES:
+                return None
+            if subName in self._BLOCK_CACHE_POSITIONAL_NAMES:
+                positional = True
+            elif subName == "wikiWord":
+                wikiWord = subNode.wikiWord
+                linkState = linkStateDict.get(wikiWord)
+                if linkState is None:
+                    linkState = self._getWikiWordLinkState(wikiWord)
+                    linkStateDict[wikiWord] = linkState
+                linkStates.append(linkState)
+
+        if node.name in self._BLOCK_CACHE_POSITIONAL_NAMES:
+            positional = True
+
+        blockText = content[node.pos:node.pos + node.strLength]
+        contentHash = hashlib.md5(utf8Enc(blockText)[0]).digest()
+
+        # The state of the output flags and the last output item
+        # influence how the block is written
+        lastIsBreak = len(self.result) > 0 and \
+                self.result[-1].strip() == u'<br class="wikidpad" />'
+
+        return (node.name, contentHash, node.pos if positional else -1,
+                tuple(linkStates), self.outFlagEatPostBreak,
+                self.outFlagPostBreakEaten, lastIsBreak, self.wikiWord,
+                self.wordAnchor)
+
+
+    def _processAstWithBlockCache(self, content, pageAst):
+        """
+        Like processAst() but takes rendered HTML of top-level blocks from
+        self.blockFragmentCache if possible and stores newly rendered ones.
+        """
+        cache = self.blockFragmentCache
+        self.astNodeStack.append(pageAst)
+        try:
+            for node in pageAst.iterFlatNamed():
+                linkStateDict = {}
+                if node.isTerminal():
+                    # Rendering is cheaper than building the key
+                    key = None
+                else:
+                    key = self._getBlockCacheKey(content, node, linkStateDict)
+
+                if key is not None:
+                    fragment = cache.get(key)
+                    if fragment is not None:
+                        replacesLast, items, eatPostBreak, postBreakEaten = \
+                                fragment
+                        if replacesLast:
+                            self.result[-1:] = items
+                        else:
+                            self.result += items
+                        self.outFlagEatPostBreak = eatPostBreak
+                        self.outFlagPostBreakEaten = postBreakEaten
+                        continue
+
+                    startIdx = len(self.result)
+                    prevLast = self.result[-1] if startIdx > 0 else None
+
+                self.blockLinkStates = linkStateDict
+                try:
+                    if not self.processAstNode(node, content, pageAst):
+                        self.outAppend(u'<tt class="wikidpad">' + escapeHtmlNoBreaks(
+                            _(u'[Unknown parser node with name "%s" found]') % node.name) + \
+                            u'</tt>')
+                finally:
+                    self.blockLinkStates = None
+
+                if key is not None:
+                    # outAppend() may have replaced the last item before
+                    # the block
+                    replacesLast = startIdx > 0 and \
+                            self.result[startIdx - 1] is not prevLast
+                    if replacesLast:
+                        items = self.result[startIdx - 1:]
+                    else:
+                        items = self.result[startIdx:]
+
+                    cache.put(key, (replacesLast, items,
+                            self.outFlagEatPostBreak,
+                            self.outFlagPostBreakEaten))
+        finally:
+            self.astNodeStack.pop()
+
+
     def processAstNode(self, node, content, pageAst):
         tname = node.name
         
@@ -31,6 +31,11 @@ WIKIDPAD_PLUGIN = (("WikiParser", 1),)
 WIKI_LANGUAGE_NAME = "mediawiki_1"
 WIKI_HR_LANGUAGE_NAME = u"MediaWiki 1.0"
 
+# Increase if the page AST created for a given text changes, e.g. by
+# modifying the grammar or the parse actions (invalidates persistently
+# cached page ASTs)
+PARSER_CACHE_VERSION = u"1"
+
 
 
 
@@ -1678,6 +1683,25 @@ class WikiLanguageDetails(object):
                 self.footnotesAsWws == details.footnotesAsWws
 
 
+    def getCacheKeyParts(self):
+        """
+        Return list of unistrings describing the language specific state
+        the page AST depends on. See
+        ParseUtilities.WikiPageFormatDetails.getCacheKeyParts()
+        """
+        parts = [unicode(self.getWikiLanguageName()), PARSER_CACHE_VERSION,
+                unicode(self.footnotesAsWws)]
+
+        if self.wikiDocument is not None:
+            # Blacklisted words are parsed as plain text
+            parts.append(u"\n".join(sorted(
+                    self.wikiDocument.getCcWordBlacklist() or ())))
+            parts.append(u"\n".join(sorted(
+                    self.wikiDocument.getNccWordBlacklist() or ())))
+
+        return parts
+
+
 class _WikiLinkPath(object):
     __slots__ = ("upwardCount", "components")
     def __init__(self, link=None, pageName=None, upwardCount=-1,
@@ -27,10 +27,30 @@ from wikidata import DbBackendUtils
 
 from WikiExceptions import *
 
-import Serialization, PluginManager, SystemInfo
+import Serialization, PluginManager, SystemInfo, Profiling
 
 
 
+# Number of match terms appended to the list box of the wiki word dialogs
+# at once, the remaining ones are appended in idle time
+_WIKIWORD_LIST_BATCH_SIZE = 200
+
+
+def _appendWikiWordListBatch(listBox, listContent):
+    """
+    Append the next batch of match terms from listContent to listBox.
+    listContent is normally a LazySortedMatchTerms sequence, so only the
+    appended terms must be sorted. Returns True iff more terms remain.
+    """
+    start = listBox.GetCount()
+    end = min(start + _WIKIWORD_LIST_BATCH_SIZE, len(listContent))
+    if start >= end:
+        return False
+
+    listBox.AppendItems([term[0] for term in listContent[start:end]])
+
+    return end < len(listContent)
+
 
 
 class SelectWikiWordDialog(wx.Dialog, ModalDialogMixin):
@@ -70,6 +90,7 @@ class SelectWikiWordDialog(wx.Dialog, ModalDialogMixin):
         wx.EVT_CHAR(self.ctrls.lb, self.OnCharListBox)
         wx.EVT_LISTBOX(self, ID, self.OnListBox)
         wx.EVT_LISTBOX_DCLICK(self, GUI_ID.lb, self.OnOk)
+        wx.EVT_IDLE(self, self.OnIdle)
 
 
     def _fillListContent(self, searchTxt):
@@ -79,12 +100,12 @@ class SelectWikiWordDialog(wx.Dialog, ModalDialogMixin):
 
         if searchTxt == u"%":
             self.listContent = self.pWiki.getWikiData()\
-                    .getWikiWordMatchTermsWith(u"")
+                    .getWikiWordMatchTermsWith(u"", lazySort=True)
             return
         
         # Filter out anything else than real words and explicit aliases
         self.listContent = self.pWiki.getWikiData().getWikiWordMatchTermsWith(
-                searchTxt)
+                searchTxt, lazySort=True)
 
 
     def OnOk(self, evt):
@@ -132,12 +153,16 @@ class SelectWikiWordDialog(wx.Dialog, ModalDialogMixin):
             self.ctrls.lb.Clear()
             self._fillListContent(text)
 
-            for term in self.listContent:
-                self.ctrls.lb.Append(term[0])
+            _appendWikiWordListBatch(self.ctrls.lb, self.listContent)
         finally:
             self.ctrls.lb.Thaw()
 
 
+    def OnIdle(self, evt):
+        if _appendWikiWordListBatch(self.ctrls.lb, self.listContent):
+            evt.RequestMore()
+
+
     def OnListBox(self, evt):
         sel = self.ctrls.lb.GetSelection()
         if sel != wx.NOT_FOUND:
@@ -216,6 +241,7 @@ class OpenWikiWordDialog(wx.Dialog, ModalDialogMixin):
         wx.EVT_BUTTON(self, GUI_ID.btnDelete, self.OnDelete)
         wx.EVT_BUTTON(self, GUI_ID.btnNewTab, self.OnNewTab)
         wx.EVT_BUTTON(self, GUI_ID.btnNewTabBackground, self.OnNewTabBackground)
+        wx.EVT_IDLE(self, self.OnIdle)
 
     def OnOk(self, evt):
         if self.activateSelectedWikiWords(0):
@@ -249,11 +275,11 @@ class OpenWikiWordDialog(wx.Dialog, ModalDialogMixin):
         if searchTxt == u"%":
             self.listContent = self.pWiki.getWikiData()\
                     .getWikiWordMatchTermsWith(u"", orderBy=orderBy,
-                    descend=descend)
+                    descend=descend, lazySort=True)
             return
 
         self.listContent = self.pWiki.getWikiData().getWikiWordMatchTermsWith(
-                searchTxt, orderBy=orderBy, descend=descend)
+                searchTxt, orderBy=orderBy, descend=descend, lazySort=True)
 
 
     def activateSelectedWikiWords(self, tabMode):
@@ -340,7 +366,7 @@ class OpenWikiWordDialog(wx.Dialog, ModalDialogMixin):
             listBox.Clear()
             self._fillListContent(text)
 
-            listBox.AppendItems([term[0] for term in self.listContent])
+            _appendWikiWordListBatch(listBox, self.listContent)
 
 #             for term in self.listContent:
 #                 listBox.Append(term[0])
@@ -348,6 +374,11 @@ class OpenWikiWordDialog(wx.Dialog, ModalDialogMixin):
             listBox.Thaw()
 
 
+    def OnIdle(self, evt):
+        if _appendWikiWordListBatch(self.ctrls.lb, self.listContent):
+            evt.RequestMore()
+
+
     def OnChoiceSort(self, evt):
         self.pWiki.getConfig().set("main", "openWikiWordDialog_sortOrder",
                 self.ctrls.chSort.GetSelection())
@@ -2115,6 +2146,38 @@ class WikiPropertiesDialog(SimpleInfoDialog):
             self._addTextLine(label, value, multiLine=True)
 
 
+class TimingSummaryDialog(SimpleInfoDialog):
+    """
+    Show timing spans recorded by module Profiling
+    """
+    def __init__(self, parent, id, mainControl):
+        self.mainControl = mainControl
+        SimpleInfoDialog.__init__(self, parent, id, _(u'Timing Summary'),
+                          size=(470, 330),
+                          style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+
+    def fillInfoLines(self):
+        label = _(u"Start (s), duration (ms), name:")
+        ctl = self._addTextLine(label, Profiling.formatSummary(),
+                multiLine=True)
+        ctl.SetMinSize((500, 300))
+
+        wd = self.mainControl.getWikiDocument()
+        if wd is not None and wd.getWikiData().checkCapability(
+                "commit statistics") is not None:
+            stats = wd.getWikiData().getCommitStatistics()
+            if stats is not None:
+                label = _(u"Database commits:")
+                self._addTextLine(label, _(u"%.2f per second, "
+                        u"%.1f statements per commit") % stats)
+
+        profilePaths = Profiling.getProfilePaths()
+        if profilePaths:
+            label = _(u"Written profiles:")
+            self._addTextLine(label, u"\n".join(profilePaths), multiLine=True)
+
+
+
 class WikiJobDialog(SimpleInfoDialog):
     """
     Show information about currently open wiki
@@ -2132,6 +2195,7 @@ class WikiJobDialog(SimpleInfoDialog):
             if exe is not None:
                 exe.startDoneJobCount()
                 exe.resetDoneJobCount()
+                exe.resetQueueStatistics()
 
         # Start timer
         self.timer = wx.Timer(self, GUI_ID.TIMER_JOBDIALOG)
@@ -2149,6 +2213,8 @@ class WikiJobDialog(SimpleInfoDialog):
     def fillInfoLines(self):
         self.jobTxtCtrl = self._addTextLine(_(u"Number of Jobs:"), u"0")
         self.jobDoneTxtCtrl = self._addTextLine(_(u"Number of Done Jobs:"), u"0")
+        self.queueTxtCtrl = self._addTextLine(_(u"Jobs per Queue:"), u"",
+                multiLine=True)
 
     def OnTimer(self, evt):
         wd = self.mainControl.getWikiDocument()
@@ -2158,6 +2224,15 @@ class WikiJobDialog(SimpleInfoDialog):
                 self.jobTxtCtrl.SetValue(unicode(exe.getJobCount()))
                 self.jobDoneTxtCtrl.SetValue(unicode(exe.getDoneJobCount()))
 
+                lines = []
+                for idx, (pending, done, avgWait, maxWait) in \
+                        enumerate(exe.getQueueStatistics()):
+                    lines.append(_(u"%i: %i pending, %i done, waited "
+                            u"%.1f s avg., %.1f s max.") %
+                            (idx, pending, done, avgWait, maxWait))
+
+                self.queueTxtCtrl.SetValue(u"\n".join(lines))
+
     def close(self):
         self.timer.Stop()
         wd = self.mainControl.getWikiDocument()
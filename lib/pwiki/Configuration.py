@@ -25,6 +25,11 @@ Error = ConfigParser.Error
 class UnknownOptionException(Exception): pass
 
 
+# Increased on each change of any SingleConfiguration, used by
+# CombinedConfiguration to check cheaply if its cached values are still valid
+_changeCount = 0
+
+
 
 def _setValue(section, option, value, config):
     """
@@ -61,9 +66,57 @@ def _fillWithDefaults(config, defaults):
 
 class _AbstractConfiguration:
     def get(self, section, option, default=None):
+        """
+        Return a configuration value returned as string/unicode which
+        is entered in given section and has specified option key.
+        """
+        return self._getCached("_getUncached", section, option, default)
+
+    def _getUncached(self, section, option, default):
         raise NotImplementedError   # abstract
 
+    def _getCachedValues(self):
+        """
+        Return dictionary to cache decoded and type converted option values
+        in. A new dictionary must be returned after each change of the
+        configuration, so a value computed from the old configuration
+        can never end up in the new dictionary.
+        """
+        raise NotImplementedError   # abstract
+
+    def getVersion(self):
+        """
+        Return a number which is increased each time the configuration
+        (may have) changed. Caches of values derived from the configuration
+        can store it to check cheaply if they are still valid.
+        """
+        raise NotImplementedError   # abstract
+
+    def _getCached(self, computeName, section, option, default):
+        """
+        Return result of the method named computeName called with
+        (section, option, default) from the value cache or call it
+        and cache the result.
+        """
+        cachedValues = self._getCachedValues()
+        key = (computeName, section, option, default)
+        try:
+            return cachedValues[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # default is not hashable
+            return getattr(self, computeName)(section, option, default)
+
+        result = getattr(self, computeName)(section, option, default)
+        cachedValues[key] = result
+        return result
+
+
     def getint(self, section, option, default=None):
+        return self._getCached("_getIntUncached", section, option, default)
+
+    def _getIntUncached(self, section, option, default):
         result = self.get(section, option)
         if result is None:
             return default
@@ -76,6 +129,10 @@ class _AbstractConfiguration:
 
 
     def getfloat(self, section, option, default=None):
+        return self._getCached("_getFloatUncached", section, option,
+                default)
+
+    def _getFloatUncached(self, section, option, default):
         result = self.get(section, option)
         if result is None:
             return default
@@ -88,6 +145,10 @@ class _AbstractConfiguration:
 
 
     def getboolean(self, section, option, default=None):
+        return self._getCached("_getBooleanUncached", section, option,
+                default)
+
+    def _getBooleanUncached(self, section, option, default):
         result = self.get(section, option)
         if result is None:
             return default
@@ -127,8 +188,27 @@ class SingleConfiguration(_AbstractConfiguration, MiscEventSourceMixin):
             self.fallthroughDict = fallthroughDict
         self.writeAccessDenied = False
 
+        # Dictionary of option values already read, replaced by a new one
+        # on each change (see _AbstractConfiguration._getCachedValues())
+        self.cachedValues = {}
+        self.version = 0
 
-    def get(self, section, option, default=None):
+
+    def _invalidateCachedValues(self):
+        global _changeCount
+
+        self.cachedValues = {}
+        self.version += 1
+        _changeCount += 1
+
+    def _getCachedValues(self):
+        return self.cachedValues
+
+    def getVersion(self):
+        return self.version
+
+
+    def _getUncached(self, section, option, default):
         """
         Return a configuration value returned as string/unicode which
         is entered in given section and has specified option key.
@@ -218,17 +298,20 @@ class SingleConfiguration(_AbstractConfiguration, MiscEventSourceMixin):
             
         if self.isOptionAllowed(section, option):
             _setValue(section, option, value, self.configParserObject)
+            self._invalidateCachedValues()
         else:
             raise UnknownOptionException, _(u"Unknown option %s:%s") % (section, option)
 
 
     def fillWithDefaults(self):
         _fillWithDefaults(self.configParserObject, self.configDefaults)
+        self._invalidateCachedValues()
 
 
     def setConfigParserObject(self, config, fn):
         self.configParserObject = config
         self.configPath = fn
+        self._invalidateCachedValues()
 
     def getConfigParserObject(self):
         return self.configParserObject
@@ -281,6 +364,7 @@ class SingleConfiguration(_AbstractConfiguration, MiscEventSourceMixin):
         the creation of many events (one per each set call) instead
         of one at the end of changes
         """
+        self._invalidateCachedValues()
         self.fireMiscEventProps({"changed configuration": True,
                 "old config settings": oldSettings})
 
@@ -300,7 +384,27 @@ class CombinedConfiguration(_AbstractConfiguration):
         self.globalConfig = globalconfig
         self.wikiConfig = wikiconfig
 
-    def get(self, section, option, default=None):
+        # Cached values are valid as long as _changeCount doesn't change
+        # and no other configuration is set
+        self.cachedValues = {}
+        self.cacheChangeCount = None
+        self.version = 0
+
+
+    def _getCachedValues(self):
+        if self.cacheChangeCount != _changeCount:
+            self.cachedValues = {}
+            self.cacheChangeCount = _changeCount
+            self.version += 1
+
+        return self.cachedValues
+
+    def getVersion(self):
+        self._getCachedValues()
+        return self.version
+
+
+    def _getUncached(self, section, option, default):
         """
         Return a configuration value returned as string/unicode which
         is entered in given section and has specified option key.
@@ -478,6 +582,7 @@ class CombinedConfiguration(_AbstractConfiguration):
 
     def setWikiConfig(self, config):
         self.wikiConfig = config
+        self.cacheChangeCount = None
 
 
     def loadGlobalConfig(self, fn):
@@ -491,6 +596,7 @@ class CombinedConfiguration(_AbstractConfiguration):
 
     def setGlobalConfig(self, config):
         self.globalConfig = config
+        self.cacheChangeCount = None
 
     def saveGlobalConfig(self):
         if self.globalConfig is not None:
@@ -678,11 +784,17 @@ GLOBALDEFAULTS = {
     ("main", "html_body_bgcolor"): u"",  # for HTML preview/export, color for background or "" for default
     ("main", "html_body_background"): u"",  # for HTML preview/export, URL for background image or "" for none
     ("main", "html_header_doctype"): u'DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0 Transitional//EN"',
+    ("main", "insertionCache_maxEntries"): u"500",  # Maximum number of cached results of insertions
+            # handled by external applications (e.g. [:dot:...])
+    ("main", "insertionCache_maxSizeMb"): u"50",  # Maximum overall size of cached insertion results in MB
+    ("main", "pageAstCache_maxSizeMb"): u"20",  # Maximum overall size of persistently cached page ASTs in MB
 
 
     # Editor options
     ("main", "sync_highlight_byte_limit"): "400",  # Size limit when to start asyn. highlighting in editor
     ("main", "async_highlight_delay"): "0.2",  # Delay after keypress before starting async. highlighting
+    ("main", "async_highlight_chunkSize"): "30000",  # Size in characters of the chunks in which async. highlighting
+            # of large pages is done (visible chunk first)
     ("main", "editor_shortHint_delay"): "500",  # Delay in milliseconds until the short hint defined for a wikiword is displayed
             # 0 deactivates short hints
     ("main", "editor_autoUnbullets"): "True",  # When pressing return on line with lonely bullet, remove bullet?
@@ -849,6 +961,19 @@ GLOBALDEFAULTS = {
             # use "system" otherwise ))
     ("main", "tempHandling_tempDir"): u"", # Path to directory for temporary files. Only valid if
             # "tempHandling_tempMode" is set to "given".
+    ("main", "db_sqliteDriver"): u"thin", # Driver for the sqlite database backends, used when a wiki is opened.
+            # thin: ctypes binding SqliteThin3; stdlib: Python's built-in sqlite3 module
+    ("main", "db_asyncCommit"): "False", # Collect commits of the sqlite database backends into batches
+    ("main", "db_asyncCommit_maxDelay"): u"0.6", # Maximum seconds between first uncommitted write and commit
+    ("main", "db_asyncCommit_maxStatements"): u"500", # Commit after this number of uncommitted write statements
+    ("main", "wikiOpen_deferCacheLoading"): "True", # When opening a wiki, show the last page first and
+            # fill caches (link terms, global attributes, search index) and trees in background
+    ("main", "plugin_lazyLoading"): "True", # Import plugins only when one of their functions is called first.
+            # Needs cached meta data, so each new or changed plugin is still imported at startup once
+    ("main", "profiling_startup"): "False", # Write cProfile statistics of startup to the temp. directory
+    ("main", "profiling_userActions"): "False", # Write cProfile statistics of each user action (see UserActionCoord)
+            # to the temp. directory
+    ("main", "profiling_logTimingSpans"): "False", # Print each timing span (startup phases etc.) to the log file
     ("main", "wikiPathes_relative"): "False", # If True, pathes to last recently used wikis
             # are stored relative to application dir.
     ("main", "openWikiWordDialog_sortOrder"): "0", # Sort order in "Open Wiki Word" dialog
@@ -939,6 +1064,8 @@ WIKIDEFAULTS = {
 
     ("main", "versioning_completeSteps"): u"10",  # How many versions before next version is saved complete
             # instead of reverse differential? 0: Always revdiff, 1: Always complete, 2: Every second v. is complete ...
+    ("main", "versioning_compressComplete"): u"False",  # Compress complete version packets with zlib?
+            # Reverse differential packets are always stored uncompressed
 
     ("main", "tabHistory_maxEntries"): u"25",  # Maximum number of entries in the history for each tab
     ("main", "wikiWideHistory_maxEntries"): u"100",  # Maximum number of entries in the wiki-wide history
@@ -313,7 +313,7 @@ class InlineDiffControl(SearchableScintillaControl):
 
     def _calcViewStylebytes(self, text):
         stylebytes = StyleCollector(wx.stc.STC_STYLE_DEFAULT, text,
-                self.bytelenSct)
+                self.bytelenSct, byteMap=self.getCharToByteMap(text))
                 
         _NODENAME_TO_STYLEBYTE = self._NODENAME_TO_STYLEBYTE
         
@@ -504,6 +504,9 @@ class AbstractWikiPage(DataCarryingPage):
 
         # liveTextPlaceHold object on which the liveSpellCheckerUnknownWords is based.
         self.liveSpellCheckerUnknownWordsBasePlaceHold = None
+        # Text on which the liveSpellCheckerUnknownWords is based. Used to
+        # find changed lines when the list must be updated.
+        self.liveSpellCheckerUnknownWordsBaseText = None
 
         self.__sinkWikiDocumentSpellSession = KeyFunctionSinkAR((
                 ("modified spell checker session", self.onModifiedSpellCheckerSession),
@@ -921,6 +924,7 @@ class AbstractWikiPage(DataCarryingPage):
                 text = self.getLiveText()
                 liveTextPlaceHold = self.liveTextPlaceHold
                 formatDetails = self.getFormatDetails()
+                saveDirty = self.getDirty()[0]
 
                 pageAst = self.getLivePageAstIfAvailable()
 
@@ -940,8 +944,22 @@ class AbstractWikiPage(DataCarryingPage):
             if len(text) == 0:
                 pageAst = buildSyntaxNode([], 0)
             else:
-                pageAst = self.parseTextInContext(text, formatDetails=formatDetails,
-                        threadstop=threadstop)
+                pageAst = None
+                astCache = self.wikiDocument.getPageAstCache()
+                if astCache is not None:
+                    cacheKey = astCache.buildKey(text, formatDetails)
+                    if cacheKey is not None:
+                        pageAst = astCache.getAst(cacheKey, text)
+
+                if pageAst is None:
+                    pageAst = self.parseTextInContext(text,
+                            formatDetails=formatDetails, threadstop=threadstop)
+
+                    # Text in editor changes often before it is saved,
+                    # so store only ASTs of saved text
+                    if astCache is not None and cacheKey is not None and \
+                            not saveDirty:
+                        astCache.putAst(cacheKey, text, pageAst)
 
             with self.textOperationLock:
                 threadstop.testValidThread()
@@ -974,6 +992,7 @@ class AbstractWikiPage(DataCarryingPage):
 
             self.liveSpellCheckerUnknownWords = None
             self.liveSpellCheckerUnknownWordsBasePlaceHold = None
+            self.liveSpellCheckerUnknownWordsBaseText = None
 
         self.fireMiscEventKeys(("modified spell checker session",))
 
@@ -1011,6 +1030,10 @@ class AbstractWikiPage(DataCarryingPage):
 
             unknownWords = self.getSpellCheckerUnknownWordsIfAvailable()
 
+            # Outdated result (if any) to update only changed lines
+            prevText = self.liveSpellCheckerUnknownWordsBaseText
+            prevUnknownWords = self.liveSpellCheckerUnknownWords
+
         if unknownWords is not None:
             return unknownWords
 
@@ -1034,7 +1057,8 @@ class AbstractWikiPage(DataCarryingPage):
             unknownWords = []
         else:
             unknownWords = spellSession.buildUnknownWordList(text,
-                    threadstop=threadstop)
+                    threadstop=threadstop, prevText=prevText,
+                    prevUnknownWords=prevUnknownWords)
 
         spellSession.close()
 
@@ -1043,6 +1067,7 @@ class AbstractWikiPage(DataCarryingPage):
 
             self.liveSpellCheckerUnknownWords = unknownWords
             self.liveSpellCheckerUnknownWordsBasePlaceHold = liveTextPlaceHold
+            self.liveSpellCheckerUnknownWordsBaseText = text
             
             self.__sinkWikiDocumentSpellSession.setEventSource(
                     self.getWikiDocument().getOnlineSpellCheckerSession())
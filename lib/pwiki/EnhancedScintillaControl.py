@@ -3,7 +3,8 @@ from __future__ import with_statement
 ## import hotshot
 ## _prof = hotshot.Profile("hotshot.prf")
 
-import traceback, codecs
+import traceback, codecs, re
+from bisect import bisect_right
 
 import wx, wx.stc
 
@@ -31,45 +32,163 @@ def bytelenSct_mbcs(us):
 
 
 
-class StyleCollector(StringOps.SnippetCollector):
+class CharToByteMap(object):
+    """
+    Converts character positions of a unistring to byte positions of
+    the text in Scintilla's encoding. Only the runs of non-ASCII characters
+    (which may need more than one byte) are stored, so for mostly
+    ASCII text the map is small and fast to create.
+    """
+    _NON_ASCII_RE = re.compile(u"[^\x00-\x7f]+")
+
+    def __init__(self, text, bytelenSct):
+        self.text = text
+        self.bytelenSct = bytelenSct
+
+        # Start and end char positions of non-ASCII runs
+        self.runStarts = []
+        self.runEnds = []
+        # Sum of (byte length - char length) of all runs before and
+        # including the run with the same index
+        self.deltasBefore = []
+        self.deltasAfter = []
+
+        delta = 0
+        for match in self._NON_ASCII_RE.finditer(text):
+            start, end = match.span()
+            self.runStarts.append(start)
+            self.runEnds.append(end)
+            self.deltasBefore.append(delta)
+            delta += bytelenSct(text[start:end]) - (end - start)
+            self.deltasAfter.append(delta)
+
+        self.byteLength = len(text) + delta
+
+
+    def getBytePos(self, charPos):
+        """
+        Return byte position for charPos (0 <= charPos <= len(text)).
+        """
+        idx = bisect_right(self.runStarts, charPos) - 1
+        if idx == -1:
+            return charPos
+
+        if charPos >= self.runEnds[idx]:
+            return charPos + self.deltasAfter[idx]
+
+        # charPos is inside of the run
+        runStart = self.runStarts[idx]
+        return runStart + self.deltasBefore[idx] + \
+                self.bytelenSct(self.text[runStart:charPos])
+
+
+
+class StyleCollector(object):
     """
     Helps to collect the style bytes needed to set the syntax coloring in
-    Scintilla editor component
+    Scintilla editor component. The style bytes are held in a bytearray
+    which is filled with the default style initially, styles are set by
+    slice assignment.
+    Only the styles for the range startCharPos to endCharPos of the text
+    are collected, styles outside of it are clipped.
     """
-    def __init__(self, defaultStyleNo, text, bytelenSct, startCharPos=0):   
-        super(StyleCollector, self).__init__()
+    def __init__(self, defaultStyleNo, text, bytelenSct, startCharPos=0,
+            endCharPos=None, byteMap=None, initialBytes=None):
+        """
+        byteMap -- CharToByteMap of text or None to create one
+        initialBytes -- bytestring with style bytes to start with instead
+                of default style (must cover the range)
+        """
         self.defaultStyleNo = defaultStyleNo
         self.text = text
-        self.bytelenSct = bytelenSct
+        if byteMap is None:
+            byteMap = CharToByteMap(text, bytelenSct)
+        if endCharPos is None:
+            endCharPos = len(text)
+
+        self.byteMap = byteMap
+        self.startCharPos = startCharPos
+        self.endCharPos = endCharPos
         self.charPos = startCharPos
+        self.byteOffset = byteMap.getBytePos(startCharPos)
+
+        if initialBytes is None:
+            self.styleBytes = bytearray(chr(defaultStyleNo) *
+                    (byteMap.getBytePos(endCharPos) - self.byteOffset))
+        else:
+            self.styleBytes = bytearray(initialBytes)
+
+
+    def _getByteRange(self, startCharPos, endCharPos):
+        """
+        Return byte range in self.styleBytes for given char range clipped
+        to the range of the collector or None if outside of it.
+        """
+        startCharPos = max(startCharPos, self.startCharPos)
+        endCharPos = min(endCharPos, self.endCharPos)
+        if endCharPos <= startCharPos:
+            return None
+
+        getBytePos = self.byteMap.getBytePos
+        return (getBytePos(startCharPos) - self.byteOffset,
+                getBytePos(endCharPos) - self.byteOffset)
+
+
+    def _fill(self, startCharPos, endCharPos, styleNo):
+        byteRange = self._getByteRange(startCharPos, endCharPos)
+        if byteRange is not None:
+            bs, be = byteRange
+            self.styleBytes[bs:be] = chr(styleNo) * (be - bs)
 
 
     def bindStyle(self, targetCharPos, targetLength, styleNo):
         if targetCharPos < 0:
             return
-        
+
+        targetEnd = targetCharPos + targetLength
+
         if targetCharPos < self.charPos:
-            # Due to some unknown reason we had overlapping styles and
-            # must remove some bytes
-            bytestylelen = self.bytelenSct(self.text[targetCharPos:self.charPos])
-            self.drop(bytestylelen)
-        else:
-            # There is possibly a gap between end of last style and current one
-            # -> fill it with default style
-            bytestylelen = self.bytelenSct(self.text[self.charPos:targetCharPos])
-            self.append(chr(self.defaultStyleNo) * bytestylelen)
+            # Due to some unknown reason we had overlapping styles,
+            # the rest of the previous style is reset to default
+            self._fill(targetEnd, self.charPos, self.defaultStyleNo)
+
+        self.charPos = targetEnd
+        self._fill(targetCharPos, targetEnd, styleNo)
+
+
+    def addStyleBits(self, targetCharPos, targetLength, mask):
+        """
+        Set bits of mask in the style bytes of the given range without
+        changing the other bits (e.g. to add an indicator).
+        """
+        if targetCharPos < 0:
+            return
+
+        byteRange = self._getByteRange(targetCharPos,
+                targetCharPos + targetLength)
+        if byteRange is not None:
+            bs, be = byteRange
+            self.styleBytes[bs:be] = self.styleBytes[bs:be].translate(
+                    _getOrTable(mask))
 
-        self.charPos = targetCharPos + targetLength
-            
-        bytestylelen = self.bytelenSct(self.text[targetCharPos:self.charPos])
-        self.append(chr(styleNo) * bytestylelen)
 
     def value(self):
-        if self.charPos < len(self.text):
-            bytestylelen = self.bytelenSct(self.text[self.charPos:len(self.text)])
-            self.append(chr(self.defaultStyleNo) * bytestylelen)
+        return str(self.styleBytes)
+
+
+
+_OR_TABLES = {}
+
+def _getOrTable(mask):
+    """
+    Return translation table which sets bits of mask in each byte
+    """
+    table = _OR_TABLES.get(mask)
+    if table is None:
+        table = "".join([chr(b | mask) for b in xrange(256)])
+        _OR_TABLES[mask] = table
 
-        return super(StyleCollector, self).value()
+    return table
 
 
 
@@ -91,6 +210,8 @@ class EnhancedScintillaControl(wx.stc.StyledTextCtrl):
             self.ReplaceSelection = self.ReplaceSelection_unicode
             self.AddText = self.AddText_unicode
 
+        self._charToByteMapCache = None
+
         self._resetKeyBindings()
 
 
@@ -233,6 +354,19 @@ class EnhancedScintillaControl(wx.stc.StyledTextCtrl):
             self.SetSelection(bs, be)
 
 
+    def getCharToByteMap(self, text):
+        """
+        Return CharToByteMap for text. The map for the last text is cached.
+        """
+        cached = self._charToByteMapCache
+        if cached is not None and (cached.text is text or cached.text == text):
+            return cached
+
+        cached = CharToByteMap(text, self.bytelenSct)
+        self._charToByteMapCache = cached
+        return cached
+
+
     def getCharPosBySciPos(self, sciPos):
         """
         Get character position by the byte position returned by Scintilla's
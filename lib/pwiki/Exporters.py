@@ -422,30 +422,41 @@ class MultiPageTextAddOptPanel(wx.Panel):
 class _SeparatorFoundException(Exception): pass
 
 class _SeparatorWatchUtf8Writer(utf8Writer):
+    """
+    Raises _SeparatorFoundException as soon as the text written since the
+    last separator contains the separator line. Only the end of this text
+    is held to detect separators spread over multiple write() calls, so
+    memory usage doesn't depend on the size of the written items.
+    """
     def __init__(self, stream, separator, errors="strict"):
         utf8Writer.__init__(self, stream, errors)
         self.separator = separator
-#         self.separatorRe = re.compile(u"^" + re.escape(separator) + u"$",
-#                 re.MULTILINE | re.UNICODE)
-        self.buffer = []
+        self.separatorLine = u"\n%s\n" % separator
+        # Last characters written since last separator (always shorter
+        # than separatorLine)
+        self.tail = u""
         self.firstSeparatorCallDone = False
 
+    def _checkText(self, text):
+        text = self.tail + text
+        if text.find(self.separatorLine) > -1:
+            raise _SeparatorFoundException()
+
+        self.tail = text[-(len(self.separatorLine) - 1):]
+
     def write(self, object):
-        self.buffer.append(object)
+        self._checkText(object)
         utf8Writer.write(self, object)
 
     def writelines(self, list):
-        self.buffer += list
-        utf8Writer.writelines(self, list)
+        for object in list:
+            self.write(object)
 
     def clearBuffer(self):
-        self.buffer = []
+        self.tail = u""
     
     def checkAndClearBuffer(self):
-#         if self.separatorRe.search(u"".join(self.buffer)):
-        if u"".join(self.buffer).find(u"\n%s\n" % self.separator) > -1:
-            raise _SeparatorFoundException()
-
+        # Separators were already checked while writing
         self.clearBuffer()
 
 
@@ -485,7 +496,7 @@ class MultiPageTextWikiPageWriter(object):
 
             self.exportFile.write(u"important/encoding/base64  storeHint/%s\n" %
                     shText)
-            self.exportFile.write(base64BlockEncode(datablock))
+            self.exportFile.writelines(iterBase64BlockEncode(datablock))
         else:
             content = self.wikiDocument.retrieveDataBlockAsText(unifName)
 
@@ -821,9 +832,19 @@ class MultiPageTextExporter(AbstractExporter):
                             self._writeHintedDatablock(un, False)
 
                     locale.setlocale(locale.LC_ALL, '')
+
+                    if progressHandler is not None:
+                        progressHandler.open(len(self.wordList))
+                        startTime = time.time()
     
                     # Write actual wiki words
-                    for word in self.wordList:
+                    for step, word in enumerate(self.wordList):
+                        if progressHandler is not None:
+                            progressHandler.update(step,
+                                    _(u"Exporting %s (%s)") % (word,
+                                    formatThroughput(self.rawExportFile.tell(),
+                                    time.time() - startTime)))
+
                         self.wikiPageWriter.exportWikiWord(word)
                         self.exportFile.checkAndClearBuffer()
                     break
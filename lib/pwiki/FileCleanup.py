@@ -1,6 +1,6 @@
 """
 """
-import os, os.path, traceback, sqlite3
+import os, os.path, traceback, sqlite3, marshal
 
 import wx, wx.xrc
 
@@ -18,10 +18,17 @@ from . import EnhancedGrid
 
 from .ConnectWrapPysqlite import ConnectWrapSyncCommit
 from .DocPages import AliasWikiPage
+from .PageAstCache import PageAstCache
 
 
 
 class InfoDatabase:
+    # Increase if format of link cache file changes
+    LINK_CACHE_FORMAT_VERSION = 1
+
+    # Number of link rows to collect before writing them to the database
+    LINK_BATCH_SIZE = 1000
+
     def __init__(self, mainControl):
         self.tempDb = None
         self.mainControl = mainControl
@@ -95,7 +102,7 @@ class InfoDatabase:
         return self.tempDb
 
 
-    def _scanFileStore(self):
+    def _scanFileStore(self, progresshandler):
         assert self.tempDb
 
         if not os.path.isdir(self.fileStorDir):
@@ -108,11 +115,21 @@ class InfoDatabase:
                         (self.fileStorDir, self.normFileStorDir))
         procCounter = 1
 
+        # If the index of the file storage is already loaded, names of files
+        # directly in the file storage are known from it, so they don't have
+        # to be tested one by one
+        topFileNames = self.wikiDocument.getFileStorage().getIndex()\
+                .getLoadedFileNames()
+        if topFileNames is None:
+            topFileNames = frozenset()
+
         # Using a stack instead of recursion to avoid hitting rec. limit
         dirStack = [(self.fileStorDir, self.tempDb.lastrowid, u"", 0)]
 
         while dirStack:
             procDir, procDirId, relPath, dirDeepness = dirStack.pop()
+            progresshandler.update(0,
+                    _(u"Scan file storage, %i items found") % procCounter)
 
             items = os.listdir(procDir)
 #             fpItems = (os.path.join(procDir, n) for n in items)
@@ -121,7 +138,8 @@ class InfoDatabase:
                 fpi = os.path.join(procDir, fn)
                 relFpi = os.path.join(relPath, fn)
 
-                if os.path.isfile(StringOps.longPathEnc(fpi)):
+                if (dirDeepness == 0 and fn in topFileNames) or \
+                        os.path.isfile(StringOps.longPathEnc(fpi)):
                     self.tempDb.execSql("insert into fStorItems(procCounter, "
                             "fullpath, normpath, relpath, type, containerId, "
                             "deepness) values(?, ?, ?, ?, 0, ?, ?)",
@@ -140,15 +158,75 @@ class InfoDatabase:
                             dirDeepness + 1))
 
 
-    def updateWikiPage(self, wikiPage):
+    def _extractLinks(self, wikiPage):
+        """
+        Return list of tuples (url, presentationUrl, tokenPos, tokenLength,
+        corePos, coreLength) for all "file:" and "rel://" URLs on wikiPage.
+        """
         pageAst = wikiPage.getLivePageAst()
-
-        self.tempDb.execSql("delete from unifNameToItem where "
-                "unifName == ?", (wikiPage.getUnifiedPageName(),))
+        result = []
 
         for urlNode in pageAst.iterDeepByName("urlLink"):
             url = urlNode.url
 
+            if not url.startswith(u"rel://") and not url.startswith(u"file:"):
+                continue
+
+            result.append((url, urlNode.coreNode.getString(), urlNode.pos,
+                    urlNode.strLength, urlNode.coreNode.pos,
+                    urlNode.coreNode.strLength))
+
+        return result
+
+
+    def _getRefedItemId(self, path, refedItemIds=None):
+        """
+        Return id of refedItems row for path, create row if necessary.
+        refedItemIds -- dictionary {<normpath>: <id>} to cache ids in or None
+        """
+        npath = normalizePath(path)
+        if refedItemIds is not None:
+            pathId = refedItemIds.get(npath)
+            if pathId is not None:
+                return pathId
+
+        pathId = self.tempDb.execSqlQuerySingleItem(
+                "select id from refedItems where normpath=?",
+                (npath,))
+        if pathId is None:
+            # Create new item
+            lpe = StringOps.longPathEnc(path)
+            pathEx = os.path.isfile(lpe) \
+                    or (os.path.isdir(lpe)
+                    and not os.path.islink(lpe))
+            pathEx = 1 if pathEx else 0
+
+            inFileStor = self.normFileStorDir == npath or \
+                    StringOps.testContainedInDir(self.normFileStorDir,
+                    npath)
+            inFileStor = 1 if inFileStor else 0
+
+            self.tempDb.execSql("insert into refedItems("
+                    "fullpath, normpath, infstore, present) "
+                    "values(?, ?, ?, ?)",
+                    (path, npath, inFileStor, pathEx))
+
+            pathId = self.tempDb.lastrowid
+
+        if refedItemIds is not None:
+            refedItemIds[npath] = pathId
+
+        return pathId
+
+
+    def _buildLinkRows(self, unifName, links, refedItemIds=None):
+        """
+        Return list of rows for table unifNameToItem for links as returned
+        by _extractLinks().
+        """
+        rows = []
+        for url, presentationUrl, tokenPos, tokenLength, corePos, \
+                coreLength in links:
             if url.startswith(u"rel://"):
                 url = self.wikiDocument.makeRelUrlAbsolute(url)
                 isRel = 1
@@ -157,59 +235,119 @@ class InfoDatabase:
 
             if url.startswith(u"file:"):
                 path = StringOps.pathnameFromUrl(url)
-                npath = normalizePath(path)
-                pathId = self.tempDb.execSqlQuerySingleItem(
-                        "select id from refedItems where normpath=?",
-                        (npath,))
-                if pathId is None:
-                    # Create new item
-                    lpe = StringOps.longPathEnc(path)
-                    pathEx = os.path.isfile(lpe) \
-                            or (os.path.isdir(lpe)
-                            and not os.path.islink(lpe))
-                    pathEx = 1 if pathEx else 0
-
-                    inFileStor = self.normFileStorDir == npath or \
-                            StringOps.testContainedInDir(self.normFileStorDir,
-                            npath)
-                    inFileStor = 1 if inFileStor else 0
-
-                    self.tempDb.execSql("insert into refedItems("
-                            "fullpath, normpath, infstore, present) "
-                            "values(?, ?, ?, ?)",
-                            (path, npath, inFileStor, pathEx))
-
-                    pathId = self.tempDb.lastrowid
-
-                self.tempDb.execSql("insert or replace into unifNameToItem("
-                        "unifName, presentationUrl, refedItemId, relative,"
-                        "tokenPos, tokenLength, corePos, coreLength) "
-                        "values (?, ?, ?, ?, ?, ?, ?, ?)",
-                        (wikiPage.getUnifiedPageName(),
-                        urlNode.coreNode.getString(), pathId, isRel,
-                        urlNode.pos, urlNode.strLength,
-                        urlNode.coreNode.pos,
-                        urlNode.coreNode.strLength))
-
-
-    def _scanLinks(self, progresshandler):
-        wikiWords = self.wikiDocument.getWikiData().getAllDefinedWikiPageNames()
+                pathId = self._getRefedItemId(path, refedItemIds)
+
+                rows.append((unifName, presentationUrl, pathId, isRel,
+                        tokenPos, tokenLength, corePos, coreLength))
+
+        return rows
+
+
+    def _insertLinkRows(self, rows):
+        self.tempDb.executemany("insert or replace into unifNameToItem("
+                "unifName, presentationUrl, refedItemId, relative,"
+                "tokenPos, tokenLength, corePos, coreLength) "
+                "values (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+    def updateWikiPage(self, wikiPage):
+        unifName = wikiPage.getUnifiedPageName()
+
+        self.tempDb.execSql("delete from unifNameToItem where "
+                "unifName == ?", (unifName,))
+
+        self._insertLinkRows(self._buildLinkRows(unifName,
+                self._extractLinks(wikiPage)))
+
+
+    def _getLinkCachePath(self):
+        if self.wikiDocument.isReadOnlyEffect():
+            return None
+
+        return os.path.join(self.wikiDocument.getDataDir(),
+                u"filecleanuplinks")
+
+
+    def _readLinkCache(self):
+        """
+        Return dictionary {<unified name>: (<key>, <links>)} of links found
+        during last run. key is built by PageAstCache.buildKey() for the page
+        text, links is a list as returned by _extractLinks().
+        """
+        path = self._getLinkCachePath()
+        if path is None or not os.path.exists(StringOps.pathEnc(path)):
+            return {}
 
-        progresshandler.open(len(wikiWords) + 1)
         try:
-            step = 1
+            f = open(StringOps.pathEnc(path), "rb")
+            try:
+                version, linkCache = marshal.loads(f.read())
+            finally:
+                f.close()
+
+            if version == self.LINK_CACHE_FORMAT_VERSION:
+                return linkCache
+        except (IOError, OSError, ValueError, EOFError, TypeError):
+            traceback.print_exc()
+
+        return {}
+
+
+    def _writeLinkCache(self, linkCache):
+        path = self._getLinkCachePath()
+        if path is None:
+            return
+
+        try:
+            data = marshal.dumps((self.LINK_CACHE_FORMAT_VERSION, linkCache),
+                    2)
+            f = open(StringOps.pathEnc(path), "wb")
+            try:
+                f.write(data)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            traceback.print_exc()
+
 
-            for wikiWord in wikiWords:
-                progresshandler.update(step, _(u"Scan links in %s") % wikiWord)
+    def _scanLinks(self, progresshandler, wikiWords):
+        # Pages whose text didn't change since the last run aren't parsed
+        # again, their links are taken from the link cache
+        oldLinkCache = self._readLinkCache()
+        linkCache = {}
+        refedItemIds = {}
+        rows = []
 
-                wikiPage = self.wikiDocument._getWikiPageNoErrorNoCache(wikiWord)
-                if isinstance(wikiPage, AliasWikiPage):
-                    # This should never be an alias page
-                    # This can only happen if there is a real page with
-                    # the same name as an alias
-                    continue  # TODO: Better solution
+        step = 1
+
+        for wikiWord in wikiWords:
+            progresshandler.update(step, _(u"Scan links in %s") % wikiWord)
+
+            wikiPage = self.wikiDocument._getWikiPageNoErrorNoCache(wikiWord)
+            if isinstance(wikiPage, AliasWikiPage):
+                # This should never be an alias page
+                # This can only happen if there is a real page with
+                # the same name as an alias
+                continue  # TODO: Better solution
+
+            unifName = wikiPage.getUnifiedPageName()
+            key = PageAstCache.buildKey(wikiPage.getLiveText(),
+                    wikiPage.getFormatDetails())
+
+            entry = oldLinkCache.get(unifName)
+            if key is not None and entry is not None and entry[0] == key:
+                links = entry[1]
+            else:
+                links = self._extractLinks(wikiPage)
+
+            if key is not None:
+                linkCache[unifName] = (key, links)
+
+            rows += self._buildLinkRows(unifName, links, refedItemIds)
+            if len(rows) >= self.LINK_BATCH_SIZE:
+                self._insertLinkRows(rows)
+                rows = []
 
-                self.updateWikiPage(wikiPage)
 #                 pageAst = wikiPage.getLivePageAst()
 # 
 #                 for urlNode in pageAst.iterDeepByName("urlLink"):
@@ -257,10 +395,11 @@ class InfoDatabase:
 #                                 urlNode.coreNode.pos,
 #                                 urlNode.coreNode.strLength))
 
-                step += 1
+            step += 1
 
-        finally:
-            progresshandler.close()
+        self._insertLinkRows(rows)
+
+        self._writeLinkCache(linkCache)
 
 
     def _markDirectlyReferencedInFileStorage(self):
@@ -318,16 +457,31 @@ class InfoDatabase:
 
 
     def buildDatabaseBeforeDialog(self, progresshandler, options):
-        self._createDatabase()
-        self._scanFileStore()
-        self._scanLinks(progresshandler)
-        self._markDirectlyReferencedInFileStorage()
-        self._inferUpwardRefInFileStorage()
-        if options["downwardRef"]:
-            self._inferDownwardRefInFileStorage()
-        self.deleteUninteresting()
+        wikiWords = self.wikiDocument.getWikiData().getAllDefinedWikiPageNames()
 
-        self.tempDb.commit()
+        # Steps are the file storage scan, one for each page and the
+        # inference of references at the end.
+        # The dialog is only shown after the scan finished. Whether a file
+        # is orphaned is only known after all pages were scanned, so partial
+        # results would show referenced files as orphaned.
+        progresshandler.open(len(wikiWords) + 2)
+        try:
+            progresshandler.update(0, _(u"Scan file storage"))
+            self._createDatabase()
+            self._scanFileStore(progresshandler)
+            self._scanLinks(progresshandler, wikiWords)
+
+            progresshandler.update(len(wikiWords) + 1,
+                    _(u"Find unreferenced files"))
+            self._markDirectlyReferencedInFileStorage()
+            self._inferUpwardRefInFileStorage()
+            if options["downwardRef"]:
+                self._inferDownwardRefInFileStorage()
+            self.deleteUninteresting()
+
+            self.tempDb.commit()
+        finally:
+            progresshandler.close()
 
 
     def calcActionAndErrorsDuringDialog(self, orphanedActionDefault,
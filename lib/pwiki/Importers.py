@@ -8,7 +8,7 @@ import urllib_red as urllib
 
 import wx, wx.xrc
 
-from .wxHelper import XrcControls
+from .wxHelper import XrcControls, ProgressHandler
 
 
 import Consts
@@ -26,6 +26,27 @@ from .timeView import Versioning
 
 
 
+class _LineDecodingReader(object):
+    """
+    Reads lines from a raw file and decodes each line separately. Unlike
+    a codecs reader it doesn't read ahead, so the position of the raw file
+    is the position of the next line and can be used with seek().
+    """
+    def __init__(self, rawFile, decode):
+        self.rawFile = rawFile
+        self.decode = decode
+
+    def readline(self):
+        return self.decode(self.rawFile.readline(), "replace")[0]
+
+    def tell(self):
+        return self.rawFile.tell()
+
+    def seek(self, pos):
+        self.rawFile.seek(pos)
+
+
+
 class MultiPageTextImporter:
     def __init__(self, mainControl):
         """
@@ -171,11 +192,15 @@ class MultiPageTextImporter:
         """
         if importData is not None:
             self.rawImportFile = StringIO(importData)
+            self.progressHandler = None
         else:
             try:
                 self.rawImportFile = open(pathEnc(importSrc), "rU")
             except IOError:
                 raise ImportException(_(u"Opening import file failed"))
+
+            self.progressHandler = ProgressHandler(_(u"Importing"), u"", 0,
+                    self.mainControl)
             
         self.wikiDocument = wikiDocument
         self.tempDb = None
@@ -193,10 +218,8 @@ class MultiPageTextImporter:
                 bom = self.rawImportFile.read(len(BOM_UTF8))
                 if bom != BOM_UTF8:
                     self.rawImportFile.seek(0)
-                    decodingReader = mbcsReader
                     decode = mbcsDec
                 else:
-                    decodingReader = utf8Reader
                     decode = utf8Dec
 
                 line = decode(self.rawImportFile.readline())[0]
@@ -225,8 +248,8 @@ class MultiPageTextImporter:
 
                 self.separator = line[11:]
                 
-                startPos = self.rawImportFile.tell()
-                self.importFile = decodingReader(self.rawImportFile, "replace")
+                self.importFile = _LineDecodingReader(self.rawImportFile,
+                        decode)
 
                 if self.formatVer == 0:
                     self._doImportVer0()
@@ -249,7 +272,8 @@ class MultiPageTextImporter:
 
                                 "collisionWithPresent text not null default '',"  # Unif. name of present entry which collides with imported one (if any)
                                 "renameImportTo text not null default ''," # Rename imported element to (if at all)
-                                "renamePresentTo text not null default ''"  # Rename present element in  database to (if at all)
+                                "renamePresentTo text not null default '',"  # Rename present element in  database to (if at all)
+                                "fileOffset integer not null default -1"  # Position of the entry's tag line in import file
                                 ");"
                                 )
     
@@ -291,10 +315,7 @@ class MultiPageTextImporter:
                         self._propagateRenames()
                         # TODO: Remove version data without ver. overview or main data
 
-                        # Back to start of import file and import according to settings 
-                        # in temp db
-                        self.rawImportFile.seek(startPos)
-                        self.importFile = decodingReader(self.rawImportFile, "replace")
+                        # Import according to settings in temp db
                         self._doImportVer1Pass2()
                         
                         return True
@@ -491,6 +512,7 @@ class MultiPageTextImporter:
 
     def _doImportVer1Pass1(self):
         while True:
+            fileOffset = self.importFile.tell()
             tag = self.importFile.readline()
             if tag == u"":
                 # End of file
@@ -513,8 +535,8 @@ class MultiPageTextImporter:
                 self._skipContent()
                 continue
 
-            self.tempDb.execSql("insert or replace into entries(unifName, seen) "
-                    "values (?, 1)", (tag,))
+            self.tempDb.execSql("insert or replace into entries(unifName, seen, "
+                    "fileOffset) values (?, 1, ?)", (tag, fileOffset))
 
 
     def _readHintedDatablockVer1(self):
@@ -655,44 +677,46 @@ class MultiPageTextImporter:
                 versionOverview.delete()
 
 
-        while True:
-            tag = self.importFile.readline()
-            if tag == u"":
-                # End of file
-                break
-            tag = tag[:-1]  # Remove line end
-            
-            try:
-                dontImport, renameImportTo = \
-                        self.tempDb.execSqlQuery(
-                        "select dontImport, renameImportTo from "
-                        "entries where unifName = ?", (tag,))[0]
-            except IndexError:
-                # Maybe dangerous
-                traceback.print_exc()
-                self._skipContent()
-                continue
-
-            if dontImport:
-                self._skipContent()
-                continue
-            
-            if renameImportTo == u"":
-                renameImportTo = tag
+        # Only the entries to import are read again, found by their position
+        # in the import file recorded in pass 1
+        entries = self.tempDb.execSqlQuery(
+                "select unifName, renameImportTo, fileOffset from entries "
+                "where seen and not dontImport and fileOffset >= 0 "
+                "order by fileOffset")
 
-            if tag.startswith(u"wikipage/"):
-                self._importItemWikiPageVer1Pass2(renameImportTo[9:])
-            elif tag.startswith(u"funcpage/"):
-                self._importItemFuncPageVer1Pass2(tag[9:])
-            elif tag.startswith(u"savedsearch/"):
-                self._importB64DatablockVer1Pass2(renameImportTo)
-            elif tag.startswith(u"savedpagesearch/"):
-                self._importHintedDatablockVer1Pass2(renameImportTo)
-            elif tag.startswith(u"versioning/"):
-                self._importHintedDatablockVer1Pass2(renameImportTo)
-            else:
-                # Unknown tag -> Ignore until separator
-                self._skipContent()
+        if self.progressHandler is not None:
+            self.progressHandler.open(len(entries))
+        try:
+            startTime = time.time()
+
+            for step, (tag, renameImportTo, fileOffset) in enumerate(entries):
+                if self.progressHandler is not None:
+                    self.progressHandler.update(step, _(u"Importing %s (%s)") %
+                            (tag, formatThroughput(fileOffset,
+                            time.time() - startTime)))
+
+                self.importFile.seek(fileOffset)
+                if self.importFile.readline()[:-1] != tag:
+                    # Should not happen
+                    continue  # TODO Report error
+                
+                if renameImportTo == u"":
+                    renameImportTo = tag
+    
+                if tag.startswith(u"wikipage/"):
+                    self._importItemWikiPageVer1Pass2(renameImportTo[9:])
+                elif tag.startswith(u"funcpage/"):
+                    self._importItemFuncPageVer1Pass2(tag[9:])
+                elif tag.startswith(u"savedsearch/"):
+                    self._importB64DatablockVer1Pass2(renameImportTo)
+                elif tag.startswith(u"savedpagesearch/"):
+                    self._importHintedDatablockVer1Pass2(renameImportTo)
+                elif tag.startswith(u"versioning/"):
+                    self._importHintedDatablockVer1Pass2(renameImportTo)
+                # Unknown tags are ignored
+        finally:
+            if self.progressHandler is not None:
+                self.progressHandler.close()
 
         
         for wikiWord in self.tempDb.execSqlQuerySingleColumn(
@@ -0,0 +1,424 @@
+"""
+Cache for results of insertions (e.g. [:dot:...], [:search:...]).
+
+Results of insertion handlers calling external applications are stored
+persistently together with the files they created. Results which depend
+on the content of other wiki pages (like search results) are only held in
+memory and are invalidated by the page update events of the wiki document.
+"""
+
+import os, os.path, time, traceback, hashlib
+
+import wx
+
+from .MiscEvent import KeyFunctionSink
+
+from .StringOps import utf8Enc, pathEnc
+from .Serialization import SerializeStream
+from . import OsAbstract
+from .Configuration import GLOBALDEFAULTS
+
+
+
+class InsertionResultCache(object):
+    """
+    Content-addressed cache for insertion results. Persistent entries
+    consist of the generated HTML and a list of files, each as tuple
+    (<original full path>, <file name in cache directory>). When an entry is
+    used again the files are restored at their original path so that the
+    HTML doesn't need to be modified.
+    """
+
+    INDEX_FILENAME = "index"
+    INDEX_FORMAT_VERSION = 2
+
+    def __init__(self, wikiDocument, cacheDir):
+        """
+        wikiDocument -- WikiDataManager to listen for page update events
+        cacheDir -- directory to store persistent entries in or None
+                if nothing should be stored persistently
+        """
+        self.wikiDocument = wikiDocument
+        self.cacheDir = cacheDir
+
+        # Dictionary {<key>: [<html>, <files>, <size in bytes>, <last access>]}
+        self.entries = {}
+        self.entriesModified = False
+        # See _getOptionsFingerprint()
+        self.optionsFingerprint = self._getOptionsFingerprint()
+
+        # Dictionary {<key>: (<value>, <set of page names or None>)}
+        # If set of page names is None, the value depends on all pages
+        self.dependentResults = {}
+
+        self.__sinkWikiDoc = KeyFunctionSink((
+                ("updated wiki page", self.onChangedWikiPage),
+                ("deleted wiki page", self.onChangedWikiPage),
+                ("pseudo-deleted wiki page", self.onChangedWikiPage),
+                ("renamed wiki page", self.onChangedWikiPage)
+        ))
+
+        self.__sinkApp = KeyFunctionSink((
+                ("options changed", self.onOptionsChanged),
+        ))
+
+        self.wikiDocument.getMiscEvent().addListener(self.__sinkWikiDoc)
+        wx.GetApp().getMiscEvent().addListener(self.__sinkApp)
+
+
+    def close(self):
+        self.wikiDocument.getMiscEvent().removeListener(self.__sinkWikiDoc)
+        wx.GetApp().getMiscEvent().removeListener(self.__sinkApp)
+        self.writeIndex()
+
+
+    @staticmethod
+    def buildKey(*parts):
+        """
+        Build a key from a sequence of unistrings, bytestrings or
+        sequences thereof.
+        """
+        h = hashlib.md5()
+        for part in parts:
+            if isinstance(part, (list, tuple)):
+                h.update(InsertionResultCache.buildKey(*part))
+            else:
+                if isinstance(part, unicode):
+                    part = utf8Enc(part)[0]
+                elif part is None:
+                    part = ""
+
+                h.update(str(len(part)) + ":" + part)
+
+        return h.hexdigest()
+
+
+    def _getMaxEntries(self):
+        return wx.GetApp().getGlobalConfig().getint("main",
+                "insertionCache_maxEntries", 500)
+
+    def _getMaxBytes(self):
+        return wx.GetApp().getGlobalConfig().getint("main",
+                "insertionCache_maxSizeMb", 50) * 1024 * 1024
+
+
+    def _getCachePath(self, cacheName):
+        return os.path.join(self.cacheDir, cacheName)
+
+
+    def _getOptionsFingerprint(self):
+        """
+        Return hash over the values of all global options registered by
+        plugins. Insertion handlers are plugins, so only a change of these
+        options (e.g. the path to an executable) can change the results of
+        persistent entries.
+        """
+        app = wx.GetApp()
+        globalConfig = app.getGlobalConfig()
+
+        parts = []
+        for section, option in sorted(app.getDefaultGlobalConfigDict()):
+            if (section, option) in GLOBALDEFAULTS:
+                continue
+            parts.append((section, option,
+                    globalConfig.get(section, option, u"")))
+
+        return self.buildKey(*parts)
+
+
+    def _removeOrphanedFiles(self):
+        """
+        Remove files in the cache directory which don't belong to an entry
+        of the index, e.g. left over because the application crashed
+        before the index was written.
+        """
+        def fsName(name):
+            if isinstance(name, unicode):
+                return pathEnc(name)
+            return name
+
+        usedNames = set([fsName(self.INDEX_FILENAME)])
+        for entry in self.entries.itervalues():
+            for origPath, cacheName in entry[1]:
+                usedNames.add(fsName(cacheName))
+
+        try:
+            for name in os.listdir(pathEnc(self.cacheDir)):
+                if fsName(name) in usedNames:
+                    continue
+                try:
+                    os.remove(os.path.join(pathEnc(self.cacheDir), name))
+                except OSError:
+                    traceback.print_exc()
+        except OSError:
+            traceback.print_exc()
+
+
+    def readIndex(self):
+        """
+        Read index of persistent entries from cache directory and remove
+        files which don't belong to any of them.
+        """
+        self.entries = {}
+        self.entriesModified = False
+
+        if self.cacheDir is None:
+            return
+
+        if not os.path.isdir(pathEnc(self.cacheDir)):
+            return
+
+        indexPath = self._getCachePath(self.INDEX_FILENAME)
+        if os.path.exists(pathEnc(indexPath)):
+            self._readIndexFile(indexPath)
+
+        self._removeOrphanedFiles()
+
+
+    def _readIndexFile(self, indexPath):
+        """
+        Fill self.entries from index file at indexPath
+        """
+        try:
+            f = open(pathEnc(indexPath), "rb")
+            try:
+                stm = SerializeStream(fileObj=f, readMode=True)
+                if stm.serUint32(0) != self.INDEX_FORMAT_VERSION:
+                    self.entriesModified = True
+                    return
+
+                if stm.serString("") != self.optionsFingerprint:
+                    # Plugin options changed while the wiki wasn't open,
+                    # the files of all entries are removed as orphans
+                    self.entriesModified = True
+                    return
+
+                for i in xrange(stm.serUint32(0)):
+                    key = stm.serString("")
+                    html = stm.serUniUtf8(u"")
+                    size = stm.serUint32(0)
+                    lastAccess = stm.serUint32(0)
+                    files = []
+                    for j in xrange(stm.serUint32(0)):
+                        origPath = stm.serUniUtf8(u"")
+                        cacheName = stm.serString("")
+                        files.append((origPath, cacheName))
+
+                    self.entries[key] = [html, files, size, lastAccess]
+            finally:
+                f.close()
+        except:
+            traceback.print_exc()
+            self.entries = {}
+
+
+    def writeIndex(self):
+        """
+        Write index of persistent entries to cache directory if it was
+        modified.
+        """
+        if self.cacheDir is None or not self.entriesModified:
+            return
+
+        try:
+            if not os.path.exists(pathEnc(self.cacheDir)):
+                os.makedirs(pathEnc(self.cacheDir))
+
+            f = open(pathEnc(self._getCachePath(self.INDEX_FILENAME)), "wb")
+            try:
+                stm = SerializeStream(fileObj=f, readMode=False)
+                stm.serUint32(self.INDEX_FORMAT_VERSION)
+                stm.serString(self.optionsFingerprint)
+                stm.serUint32(len(self.entries))
+                for key, (html, files, size, lastAccess) in \
+                        self.entries.iteritems():
+                    stm.serString(key)
+                    stm.serUniUtf8(html)
+                    stm.serUint32(size)
+                    stm.serUint32(lastAccess)
+                    stm.serUint32(len(files))
+                    for origPath, cacheName in files:
+                        stm.serUniUtf8(origPath)
+                        stm.serString(cacheName)
+            finally:
+                f.close()
+
+            self.entriesModified = False
+        except:
+            traceback.print_exc()
+
+
+    def lookup(self, key, tempFileSet):
+        """
+        Return HTML of a cached result or None if not found. Files belonging
+        to the result are restored at their original pathes and added
+        to tempFileSet.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        html, files = entry[:2]
+        restored = []
+        try:
+            for origPath, cacheName in files:
+                if os.path.exists(pathEnc(origPath)):
+                    if origPath in tempFileSet.fileSet:
+                        # Same result was already used in this task
+                        continue
+                    # Some unrelated file took the place
+                    return None
+
+                if not os.path.isdir(pathEnc(os.path.dirname(origPath))):
+                    return None
+
+                OsAbstract.copyFile(self._getCachePath(cacheName), origPath)
+                restored.append(origPath)
+        except (IOError, OSError):
+            traceback.print_exc()
+            for path in restored:
+                try:
+                    os.remove(pathEnc(path))
+                except OSError:
+                    pass
+
+            self.removeEntry(key)
+            return None
+
+        for path in restored:
+            tempFileSet.addFile(path)
+
+        entry[3] = int(time.time())
+        self.entriesModified = True
+
+        return html
+
+
+    def store(self, key, html, filePathes):
+        """
+        Store a result. filePathes is a sequence of full pathes of files
+        created for the result, they are copied into the cache.
+        """
+        if self.cacheDir is None:
+            return
+
+        files = []
+        size = len(html)
+        try:
+            if not os.path.exists(pathEnc(self.cacheDir)):
+                os.makedirs(pathEnc(self.cacheDir))
+
+            for i, origPath in enumerate(filePathes):
+                cacheName = "%s_%i%s" % (key, i,
+                        pathEnc(os.path.splitext(origPath)[1]))
+                OsAbstract.copyFile(origPath, self._getCachePath(cacheName))
+                size += os.path.getsize(pathEnc(origPath))
+                files.append((origPath, cacheName))
+        except (IOError, OSError):
+            traceback.print_exc()
+            self._removeCacheFiles(files)
+            return
+
+        self.removeEntry(key)
+        self.entries[key] = [html, files, size, int(time.time())]
+        self.entriesModified = True
+
+        self._evict()
+        # Results are expensive to create, so don't lose them if the
+        # application crashes
+        self.writeIndex()
+
+
+    def _removeCacheFiles(self, files):
+        for origPath, cacheName in files:
+            try:
+                os.remove(pathEnc(self._getCachePath(cacheName)))
+            except OSError:
+                pass
+
+
+    def removeEntry(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._removeCacheFiles(entry[1])
+            self.entriesModified = True
+
+
+    def _evict(self):
+        """
+        Remove least recently used entries until limits of entry count
+        and overall size are met.
+        """
+        maxEntries = self._getMaxEntries()
+        maxBytes = self._getMaxBytes()
+
+        overallSize = sum(entry[2] for entry in self.entries.itervalues())
+        if len(self.entries) <= maxEntries and overallSize <= maxBytes:
+            return
+
+        byAccess = sorted(self.entries.iteritems(), key=lambda item: item[1][3])
+
+        for key, entry in byAccess:
+            if len(self.entries) <= maxEntries and overallSize <= maxBytes:
+                break
+
+            overallSize -= entry[2]
+            self.removeEntry(key)
+
+
+    def clear(self):
+        """
+        Remove all persistent and dependent entries.
+        """
+        for key in self.entries.keys():
+            self.removeEntry(key)
+
+        self.dependentResults = {}
+
+
+    def getDependentResult(self, key, default=None):
+        """
+        Return value of a result depending on wiki pages or default if not
+        present.
+        """
+        return self.dependentResults.get(key, (default,))[0]
+
+
+    def putDependentResult(self, key, value, dependsOnPages=None):
+        """
+        Store a result which is invalidated when one of the pages in
+        dependsOnPages (sequence of wiki page names) changes. If
+        dependsOnPages is None, it is invalidated on each page change.
+        """
+        if dependsOnPages is not None:
+            dependsOnPages = frozenset(dependsOnPages)
+
+        self.dependentResults[key] = (value, dependsOnPages)
+
+
+    def onChangedWikiPage(self, miscevt):
+        wikiPage = miscevt.get("wikiPage")
+        if wikiPage is None:
+            self.dependentResults = {}
+            return
+
+        word = wikiPage.getWikiWord()
+        newWord = miscevt.get("newWord")
+
+        self.dependentResults = dict((k, v) for k, v in
+                self.dependentResults.iteritems()
+                if v[1] is not None and word not in v[1] and
+                newWord not in v[1])
+
+
+    def onOptionsChanged(self, miscevt):
+        self.dependentResults = {}
+
+        # Results of external applications may depend on plugin options
+        # (e.g. the path to an executable)
+        optionsFingerprint = self._getOptionsFingerprint()
+        if optionsFingerprint != self.optionsFingerprint:
+            self.clear()
+            self.optionsFingerprint = optionsFingerprint
+            self.writeIndex()
+
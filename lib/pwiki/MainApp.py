@@ -1,5 +1,4 @@
-## import hotshot
-## _prof = hotshot.Profile("hotshot.prf")
+from __future__ import with_statement
 
 import sys, os, traceback, os.path, socket
 
@@ -20,6 +19,7 @@ from MiscEvent import KeyFunctionSink, MiscEventSourceMixin
 
 from WikiExceptions import *
 import Configuration
+import Profiling
 from StringOps import mbcsDec, createRandomString, pathEnc, \
         writeEntireFile, loadEntireFile
 
@@ -113,7 +113,6 @@ class App(wx.App, MiscEventSourceMixin):
 
 
     def OnInit(self):
-        ## _prof.start()
 #         global PREVIEW_CSS
 
         self.SetAppName("WikidPad")
@@ -123,6 +122,7 @@ class App(wx.App, MiscEventSourceMixin):
 #                     lambda event: event.callable(*event.args, **event.kw) )
 # 
         self.sqliteInitFlag = False   # Read and modified only by WikiData classes
+        self.pluginMetaDataCache = None
         
         WindowLayout.initiateAfterWxApp()
         self.removeAppLockOnExit = False
@@ -170,33 +170,36 @@ class App(wx.App, MiscEventSourceMixin):
         self.pageSearchHistory = []
         self.wikiSearchHistory = []
 
-        # load or create global configuration
-        self.globalConfig = self.createGlobalConfiguration()
+        with Profiling.timingSpan(u"Load global configuration"):
+            # load or create global configuration
+            self.globalConfig = self.createGlobalConfiguration()
 
-        # Find/create global config file "WikidPad.config"
-        if SystemInfo.isWindows():
-            defaultGlobalConfigLoc = os.path.join(self.globalConfigDir,
-                    CONFIG_FILENAME)
-        else:
-            defaultGlobalConfigLoc = os.path.join(self.globalConfigDir,
-                    "." + CONFIG_FILENAME)
+            # Find/create global config file "WikidPad.config"
+            if SystemInfo.isWindows():
+                defaultGlobalConfigLoc = os.path.join(self.globalConfigDir,
+                        CONFIG_FILENAME)
+            else:
+                defaultGlobalConfigLoc = os.path.join(self.globalConfigDir,
+                        "." + CONFIG_FILENAME)
 
-        globalConfigLoc = os.path.join(self.globalConfigDir, CONFIG_FILENAME)
-        if os.path.exists(pathEnc(globalConfigLoc)):
-            try:
-                self.globalConfig.loadConfig(globalConfigLoc)
-            except Configuration.Error, MissingConfigurationFileException:
-                self.createDefaultGlobalConfig(globalConfigLoc)
-        else:
             globalConfigLoc = os.path.join(self.globalConfigDir,
-                    "." + CONFIG_FILENAME)
+                    CONFIG_FILENAME)
             if os.path.exists(pathEnc(globalConfigLoc)):
                 try:
                     self.globalConfig.loadConfig(globalConfigLoc)
                 except Configuration.Error, MissingConfigurationFileException:
                     self.createDefaultGlobalConfig(globalConfigLoc)
             else:
-                self.createDefaultGlobalConfig(defaultGlobalConfigLoc)
+                globalConfigLoc = os.path.join(self.globalConfigDir,
+                        "." + CONFIG_FILENAME)
+                if os.path.exists(pathEnc(globalConfigLoc)):
+                    try:
+                        self.globalConfig.loadConfig(globalConfigLoc)
+                    except Configuration.Error, \
+                            MissingConfigurationFileException:
+                        self.createDefaultGlobalConfig(globalConfigLoc)
+                else:
+                    self.createDefaultGlobalConfig(defaultGlobalConfigLoc)
 
         splash = None
         
@@ -211,8 +214,15 @@ class App(wx.App, MiscEventSourceMixin):
                 wx.Yield()
 
         try:
-            return self.initStep2(cmdLine)
+            if self.globalConfig.getboolean("main", "profiling_startup",
+                    False):
+                return Profiling.runProfiled(Profiling.buildProfilePath(
+                        Profiling.getProfileDir(), u"startup"),
+                        self.initStep2, cmdLine)
+            else:
+                return self.initStep2(cmdLine)
         finally:
+            Profiling.addStartupSpan()
             if splash:
                 splash.Destroy()
 
@@ -387,7 +397,6 @@ class App(wx.App, MiscEventSourceMixin):
 
         rd = Localization.getI18nXrcData(self.wikiAppDir,
                 self.globalConfigSubDir, "WikidPad")
-        ## _prof.stop()
 
         res = wx.xrc.XmlResource.Get()
         res.SetFlags(0)
@@ -411,13 +420,23 @@ class App(wx.App, MiscEventSourceMixin):
         development as they can have unwanted side effects!
         """
         from PluginManager import PluginManager, InsertionPluginManager, \
-                KeyInParamLearningDispatcher
+                KeyInParamLearningDispatcher, PluginMetaDataCache
 
         dirs = ( os.path.join(self.wikiAppDir, u'extensions'),
                 os.path.join(self.wikiAppDir, u'user_extensions'),
                 os.path.join(self.globalConfigSubDir, u'user_extensions') )
 
-        self.pluginManager = PluginManager(dirs, systemDirIdx=0)
+        if self.getGlobalConfig().getboolean("main", "plugin_lazyLoading",
+                True):
+            if self.pluginMetaDataCache is None:
+                self.pluginMetaDataCache = PluginMetaDataCache(
+                        os.path.join(self.globalConfigSubDir,
+                        u"PluginMetaData.cache"))
+        else:
+            self.pluginMetaDataCache = None
+
+        self.pluginManager = PluginManager(dirs, systemDirIdx=0,
+                metaDataCache=self.pluginMetaDataCache)
 
         # Register app-wide plugin APIs
         describeInsertionApi = self.pluginManager.registerSimplePluginAPI(
@@ -445,8 +464,9 @@ class App(wx.App, MiscEventSourceMixin):
 #         dirs = ( os.path.join(self.wikiAppDir, u'user_extensions'),
 #                 os.path.join(self.wikiAppDir, u'extensions') )
 
-        self.pluginManager.loadPlugins([ u'KeyBindings.py',
-                u'EvalLibrary.py'] )
+        with Profiling.timingSpan(u"Load application plugins"):
+            self.pluginManager.loadPlugins([ u'KeyBindings.py',
+                    u'EvalLibrary.py'] )
 
         # Register options
         registerOptionsApi.registerOptions(1, self)
@@ -465,12 +485,17 @@ class App(wx.App, MiscEventSourceMixin):
         self.insertionPluginManager = InsertionPluginManager(
                 insertionDescriptions)
 
-        wikiLanguageDescriptions = reduce(lambda a, b: a+list(b),
-                describeWikiLanguageApi.describeWikiLanguage(1, self), [])
+        with Profiling.timingSpan(u"Build wiki language descriptions"):
+            wikiLanguageDescriptions = reduce(lambda a, b: a+list(b),
+                    describeWikiLanguageApi.describeWikiLanguage(1, self), [])
 
         self.wikiLanguageDescDict = dict(( (item[0], item)
                 for item in wikiLanguageDescriptions ))
 
+        # Store results of the calls above for next startup
+        if self.pluginMetaDataCache is not None:
+            self.pluginMetaDataCache.save()
+
         # Parameters to .dispatch(): contextName, contextDict, menu;
         # contextName is key for LearningDispatcher
         self.modifyMenuDispatcher = KeyInParamLearningDispatcher(
@@ -676,8 +701,10 @@ class App(wx.App, MiscEventSourceMixin):
     def startPersonalWikiFrame(self, clAction):
         from PersonalWikiFrame import PersonalWikiFrame
 
-        wikiFrame = PersonalWikiFrame(None, -1, "WikidPad", self.wikiAppDir,
-                self.globalConfigDir, self.globalConfigSubDir, clAction)
+        with Profiling.timingSpan(u"Create main frame"):
+            wikiFrame = PersonalWikiFrame(None, -1, "WikidPad",
+                    self.wikiAppDir, self.globalConfigDir,
+                    self.globalConfigSubDir, clAction)
 
         self.fireMiscEventProps({"adding wiki frame": True,
                 "wiki frame": wikiFrame})
@@ -686,7 +713,6 @@ class App(wx.App, MiscEventSourceMixin):
         self.fireMiscEventProps({"added wiki frame": True,
                 "wiki frame": wikiFrame})
 
-        ## _prof.stop()
 
         # set the icon of the app
         try:
@@ -772,6 +798,13 @@ class App(wx.App, MiscEventSourceMixin):
 
     def getInsertionPluginManager(self):
         return self.insertionPluginManager
+
+    def getPluginMetaDataCache(self):
+        """
+        Return PluginMetaDataCache object or None if plugins should
+        be imported at startup.
+        """
+        return self.pluginMetaDataCache
         
     def getPageSearchHistory(self):
         return self.pageSearchHistory
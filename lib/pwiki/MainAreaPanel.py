@@ -176,6 +176,30 @@ class MainAreaPanel(aui.AuiNotebook, MiscEventSourceMixin, StorablePerspective):
         return wikiWords, subCtrls, activeNo
 
 
+    def prioritizeOpenPageUpdates(self):
+        """
+        Let background updates of the page in the current tab run first,
+        followed by those of the pages in the other tabs.
+        """
+        wikiDocument = self.mainControl.getWikiDocument()
+        if wikiDocument is None:
+            return
+
+        currentPresenter = self.getCurrentPresenter()
+        words = []
+        for pres in self.getDocPagePresenters():
+            docPage = pres.getDocPage()
+            if isinstance(docPage, (DocPages.AliasWikiPage,
+                    DocPages.WikiPage)):
+                word = docPage.getNonAliasPage().getWikiWord()
+                if pres is currentPresenter:
+                    words.insert(0, word)
+                else:
+                    words.append(word)
+
+        wikiDocument.prioritizeUpdates(words)
+
+
     def getDocPagePresenters(self):
         """
         Return a list of the real document page presenters in the presenter list.
@@ -376,6 +400,7 @@ class MainAreaPanel(aui.AuiNotebook, MiscEventSourceMixin, StorablePerspective):
             proxyEvent.setWatchedEvents(
                     (self.currentPresenter.getMiscEvent(),))
             self.mainControl.refreshPageStatus()
+            self.prioritizeOpenPageUpdates()
             self.fireMiscEventKeys(("changed current presenter",))
 
             # Make the current notebook tab active
@@ -759,6 +784,8 @@ class MainAreaPanel(aui.AuiNotebook, MiscEventSourceMixin, StorablePerspective):
 
                 if presenter is self.getCurrentPresenter():
                     self.mainControl.refreshPageStatus()
+            elif miscevt.has_key("loaded current wiki page"):
+                self.prioritizeOpenPageUpdates()
 
         elif miscevt.getSource() is self.mainControl:
             if miscevt.has_key("closed current wiki"):
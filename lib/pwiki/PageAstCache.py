@@ -0,0 +1,314 @@
+"""
+Persistent cache for page ASTs.
+
+Each entry is a file in the cache directory named by a hash of the page
+text and of all settings which influence parsing (see
+ParseUtilities.WikiPageFormatDetails.getCacheKeyParts()). Entries therefore
+never become invalid, outdated ones are removed by size based eviction.
+"""
+
+import os, os.path, marshal, threading, traceback, types
+from itertools import izip
+
+import wx
+
+from . import StringOps
+from .StringOps import pathEnc
+from .WikiPyparsing import SyntaxNode, NonTerminalNode, TerminalNode, \
+        buildSourceTerminalNode
+from .InsertionCache import InsertionResultCache
+
+
+
+# Increase if the flattened format of the AST changes
+FORMAT_VERSION = 2
+
+FILE_MAGIC = "WPAST"
+
+
+class _NotCacheable(Exception):
+    """
+    Raised internally if AST contains attribute values which can't be stored
+    """
+    pass
+
+
+# Classes of the HTML items (e.g. in "htmlEquivalent" nodes) which can be
+# stored, they are restored from their instance dictionary
+_HTML_ITEM_CLASSES = dict((cls.__name__, cls) for cls in (
+        StringOps.HtmlStartTag, StringOps.HtmlEmptyTag, StringOps.HtmlEndTag,
+        StringOps.HtmlEntity))
+
+
+def _flattenAst(pageAst, text):
+    """
+    Convert pageAst to a structure consisting only of types supported
+    by marshal. Returns list of node records, first one is the root.
+
+    Records have the forms
+        (0, <pos>, <name>, <attributes>, <list of child indices>)
+        (1, <pos>, <name>, <attributes>, <start in text>, <length>)
+        (2, <pos>, <name>, <attributes>, <own text>)
+    """
+    records = []
+    nodeIndices = {}
+
+    def encodeValue(value):
+        if value is None or isinstance(value, (bool, int, long, float,
+                basestring)):
+            return value
+        elif isinstance(value, SyntaxNode):
+            return ("n", flattenNode(value))
+        elif isinstance(value, tuple):
+            return ("t", [encodeValue(v) for v in value])
+        elif isinstance(value, list):
+            return ("l", [encodeValue(v) for v in value])
+        elif isinstance(value, dict):
+            return ("d", dict((k, encodeValue(v))
+                    for k, v in value.iteritems()))
+        elif isinstance(value, StringOps.AbstractHtmlItem) and \
+                _HTML_ITEM_CLASSES.get(value.__class__.__name__) is \
+                value.__class__:
+            return ("h", (value.__class__.__name__,
+                    encodeValue(value.__dict__)))
+        else:
+            raise _NotCacheable()
+
+    def flattenNode(node):
+        idx = nodeIndices.get(id(node))
+        if idx is not None:
+            return idx
+
+        idx = len(records)
+        nodeIndices[id(node)] = idx
+        records.append(None)
+
+        attrs = node.getExtraAttributes()
+        if attrs is not None:
+            attrs = dict((k, encodeValue(v)) for k, v in attrs.iteritems())
+
+        if isinstance(node, NonTerminalNode):
+            records[idx] = (0, node.pos, node.name, attrs,
+                    [flattenNode(n) for n in node.sub])
+        else:
+            source, start, end = node.getSourceRange()
+            if source is text:
+                records[idx] = (1, node.pos, node.name, attrs, start,
+                        end - start)
+            else:
+                records[idx] = (2, node.pos, node.name, attrs,
+                        node.getText())
+
+        return idx
+
+    flattenNode(pageAst)
+    return records
+
+
+def _restoreAst(records, text):
+    """
+    Inverse of _flattenAst()
+    """
+    nodes = []
+    for rec in records:
+        if rec[0] == 0:
+            nodes.append(NonTerminalNode(None, rec[1], rec[2]))
+        elif rec[0] == 1:
+            nodes.append(buildSourceTerminalNode(text, rec[4],
+                    rec[4] + rec[5], rec[1], rec[2]))
+        else:
+            nodes.append(TerminalNode(rec[4], rec[1], rec[2]))
+
+    def decodeValue(value):
+        if isinstance(value, tuple):
+            tag, content = value
+            if tag == "n":
+                return nodes[content]
+            elif tag == "t":
+                return tuple([decodeValue(v) for v in content])
+            elif tag == "d":
+                return dict((k, decodeValue(v))
+                        for k, v in content.iteritems())
+            elif tag == "h":
+                return types.InstanceType(_HTML_ITEM_CLASSES[content[0]],
+                        decodeValue(content[1]))
+            else:
+                return [decodeValue(v) for v in content]
+
+        return value
+
+    for node, rec in izip(nodes, records):
+        if rec[0] == 0:
+            node.sub = [nodes[i] for i in rec[4]]
+
+        if rec[3] is not None:
+            for k, v in rec[3].iteritems():
+                setattr(node, k, decodeValue(v))
+
+    return nodes[0]
+
+
+
+class PageAstCache(object):
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+        self.lock = threading.RLock()
+
+        # Dictionary {<file name>: [<size in bytes>, <last access time>]},
+        # read from cache directory on first use
+        self.entries = None
+        self.overallSize = 0
+
+
+    def _getMaxBytes(self):
+        return wx.GetApp().getGlobalConfig().getint("main",
+                "pageAstCache_maxSizeMb", 20) * 1024 * 1024
+
+
+    def _getCachePath(self, fileName):
+        return os.path.join(self.cacheDir, fileName)
+
+
+    @staticmethod
+    def buildKey(text, formatDetails):
+        """
+        Return key for AST of text parsed with formatDetails or None if
+        it can't be cached.
+        """
+        parts = formatDetails.getCacheKeyParts()
+        if parts is None:
+            return None
+
+        return InsertionResultCache.buildKey(str(FORMAT_VERSION),
+                str(marshal.version), parts, text)
+
+
+    def _readEntries(self):
+        self.entries = {}
+        self.overallSize = 0
+
+        if not os.path.isdir(pathEnc(self.cacheDir)):
+            return
+
+        for fileName in os.listdir(pathEnc(self.cacheDir)):
+            path = pathEnc(self._getCachePath(fileName))
+            try:
+                size = os.path.getsize(path)
+                self.entries[fileName] = [size, os.path.getmtime(path)]
+                self.overallSize += size
+            except OSError:
+                pass
+
+
+    def _getEntries(self):
+        if self.entries is None:
+            self._readEntries()
+
+        return self.entries
+
+
+    def getAst(self, key, text):
+        """
+        Return AST stored for key or None. text is the page text for
+        which the AST was built.
+        """
+        with self.lock:
+            entry = self._getEntries().get(key)
+            if entry is None:
+                return None
+
+            path = self._getCachePath(key)
+            try:
+                f = open(pathEnc(path), "rb")
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+
+                if not data.startswith(FILE_MAGIC):
+                    raise ValueError("Invalid AST cache file")
+
+                pageAst = _restoreAst(marshal.loads(data[len(FILE_MAGIC):]),
+                        text)
+
+                os.utime(pathEnc(path), None)
+                entry[1] = os.path.getmtime(pathEnc(path))
+
+                return pageAst
+            except (IOError, OSError, ValueError, EOFError, TypeError,
+                    IndexError):
+                traceback.print_exc()
+                self._removeEntry(key)
+                return None
+
+
+    def putAst(self, key, text, pageAst):
+        """
+        Store pageAst built for text under key. Nothing is stored if the
+        AST contains values which can't be stored.
+        """
+        try:
+            data = FILE_MAGIC + marshal.dumps(_flattenAst(pageAst, text), 2)
+        except (_NotCacheable, ValueError):
+            return
+
+        with self.lock:
+            entries = self._getEntries()
+            maxBytes = self._getMaxBytes()
+            if len(data) > maxBytes:
+                return
+
+            self._removeEntry(key)
+            path = self._getCachePath(key)
+            try:
+                if not os.path.exists(pathEnc(self.cacheDir)):
+                    os.makedirs(pathEnc(self.cacheDir))
+
+                f = open(pathEnc(path), "wb")
+                try:
+                    f.write(data)
+                finally:
+                    f.close()
+
+                entries[key] = [len(data), os.path.getmtime(pathEnc(path))]
+                self.overallSize += len(data)
+            except (IOError, OSError):
+                traceback.print_exc()
+                self._removeEntry(key)
+                return
+
+            self._evict(maxBytes)
+
+
+    def _removeEntry(self, key):
+        entry = self._getEntries().pop(key, None)
+        if entry is not None:
+            self.overallSize -= entry[0]
+
+        try:
+            os.remove(pathEnc(self._getCachePath(key)))
+        except OSError:
+            pass
+
+
+    def _evict(self, maxBytes):
+        """
+        Remove least recently used entries until overall size is below
+        maxBytes.
+        """
+        if self.overallSize <= maxBytes:
+            return
+
+        byAccess = sorted(self.entries.iteritems(), key=lambda item: item[1][1])
+
+        for key, entry in byAccess:
+            if self.overallSize <= maxBytes:
+                break
+
+            self._removeEntry(key)
+
+
+    def clear(self):
+        with self.lock:
+            for key in self._getEntries().keys():
+                self._removeEntry(key)
@@ -67,6 +67,39 @@ class WikiPageFormatDetails(object):
                 self.wikiLanguageDetails.isEquivTo(details.wikiLanguageDetails)
 
 
+    def getCacheKeyParts(self):
+        """
+        Return list of unistrings describing all settings which influence
+        the page AST or None if the AST must not be cached persistently.
+        Details which are equivalent according to isEquivTo() give equal
+        lists.
+        """
+        if self.noFormat:
+            return [u"noFormat"]
+
+        if self.autoLinkMode == u"relax":
+            # AST depends on the links of all pages in the wiki
+            return None
+
+        getLangParts = getattr(self.wikiLanguageDetails, "getCacheKeyParts",
+                None)
+        if getLangParts is None:
+            return None
+
+        langParts = getLangParts()
+        if langParts is None:
+            return None
+
+        # Relative links are resolved against the base page
+        if self.basePage is None:
+            basePageName = u""
+        else:
+            basePageName = self.basePage.getWikiWord()
+
+        return [unicode(self.withCamelCase), self.autoLinkMode,
+                unicode(self.paragraphMode), basePageName] + list(langParts)
+
+
 
 def getFootnoteAnchorDict(pageAst):
     """
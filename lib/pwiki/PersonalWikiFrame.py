@@ -32,7 +32,7 @@ from . import SystemInfo
 from .WindowLayout import WindowSashLayouter, setWindowPos, setWindowSize
 from . import WindowLayout
 
-from .wikidata import DbBackendUtils, WikiDataManager
+from .wikidata import DbBackendUtils, WikiDataManager, DbMigration
 
 # To generate py2exe dependency
 from . import WikiDocument
@@ -54,7 +54,7 @@ from .DocPagePresenter import DocPagePresenter
 
 from .Ipc import EVT_REMOTE_COMMAND
 
-from . import AttributeHandling, SpellChecker
+from . import AttributeHandling, SpellChecker, Profiling
 
 
 from . import AdditionalDialogs
@@ -249,7 +249,8 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
         dirs = ( os.path.join(self.wikiAppDir, u'extensions'),
                 os.path.join(self.wikiAppDir, u'user_extensions'),
                 os.path.join(self.globalConfigSubDir, u'user_extensions') )
-        self.pluginManager = PluginManager.PluginManager(dirs, systemDirIdx=0)
+        self.pluginManager = PluginManager.PluginManager(dirs, systemDirIdx=0,
+                metaDataCache=wx.GetApp().getPluginMetaDataCache())
 
 #         wx.GetApp().pauseBackgroundThreads()
 
@@ -293,8 +294,9 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
 
         del plm
 
-        self.pluginManager.loadPlugins([ u'KeyBindings.py',
-                u'EvalLibrary.py' ] )
+        with Profiling.timingSpan(u"Load frame plugins"):
+            self.pluginManager.loadPlugins([ u'KeyBindings.py',
+                    u'EvalLibrary.py' ] )
 
 
         self.attributeChecker = AttributeHandling.AttributeChecker(self)
@@ -358,7 +360,8 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
             self.translateMenuAccelerator = lambda x: x
 
         # initialize the GUI
-        self.initializeGui()
+        with Profiling.timingSpan(u"Create frame GUI"):
+            self.initializeGui()
         
         # Minimize on tray?
         self.tbIcon = None
@@ -915,6 +918,11 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
             self.addMenuItem(maintenanceMenu, _(u'Show job count...'),
                     _(u'Show how many update jobs are waiting in background'),
                     self.OnCmdShowWikiJobDialog)
+
+            self.addMenuItem(maintenanceMenu, _(u'Show timing summary...'),
+                    _(u'Show time needed for startup phases and other '
+                    u'measured operations'),
+                    self.OnCmdShowTimingSummaryDialog)
                     
             maintenanceMenu.AppendSeparator()
 
@@ -927,6 +935,11 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
             self.addMenuItem(maintenanceMenu, _(u'Reconnect...'),
                     _(u'Reconnect to database after connection failure'),
                     self.OnCmdReconnectDatabase)
+
+            self.addMenuItem(maintenanceMenu, _(u'Convert to Database &Type...'),
+                    _(u'Copy wiki into a new database of another type'),
+                    lambda evt: self.migrateWikiDatabase(),
+                    updatefct=(self.OnUpdateDisReadOnlyWiki,))
                     
             maintenanceMenu.AppendSeparator()
     
@@ -3182,7 +3195,8 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
                     if answer == wx.CANCEL:
                         return False
 
-                wikiDataManager.connect()
+                with Profiling.timingSpan(u"Connect wiki"):
+                    wikiDataManager.connect()
                 break
             except (UnknownDbHandlerException, DbHandlerNotAvailableException), e:
                 # Could not get a handler name from wiki config file
@@ -3360,22 +3374,11 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
     
                 self.tree.SetScrollPos(wx.VERTICAL, 0)
                 
-                lastRoot = self.getConfig().get("main", "tree_last_root_wiki_word",
-                        None)
-                if not (lastRoot and
-                        self.getWikiDocument().isDefinedWikiLinkTerm(lastRoot)):
-                    lastRoot = self.wikiName
-                    
-                self.tree.setRootByWord(lastRoot)
-                self.tree.readExpandedNodesFromConfig()
-                self.tree.expandRoot()
-                self.getConfig().set("main", "tree_last_root_wiki_word", lastRoot)
-    
-                viewsTree = self.windowLayouter.getWindowByName("viewstree")
-                if viewsTree is not None:
-                    viewsTree.setViewsAsRoot()
-                    viewsTree.readExpandedNodesFromConfig()
-                    viewsTree.expandRoot()
+                if self.getWikiDocument().areCachesWarm():
+                    self._buildTrees()
+                else:
+                    # Trees are built on "warmed caches" event
+                    self._setTreesPending()
     
                 # Normalize lastTabsSubCtrls
                 if not lastTabsSubCtrls:
@@ -3936,21 +3939,17 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
 
             self.saveAllDocPages()
 
-            # TODO Don't recycle variable names!
-            for wikiWord, toWikiWord in renameSeq:
-
-                if wikiWord == wikiDoc.getWikiName():
-                    # Renaming of root word = renaming of wiki config file
-                    wikiConfigFilename = wikiDoc.getWikiConfigPath()
-                    self.removeFromWikiHistory(wikiConfigFilename)
-    #                 self.wikiHistory.remove(wikiConfigFilename)
-                    wikiDoc.renameWikiWord(wikiWord, toWikiWord,
-                            modifyText)
-                    # Store some additional information
-                    self.lastAccessedWiki(wikiDoc.getWikiConfigPath())
-                else:
-                    wikiDoc.renameWikiWord(wikiWord, toWikiWord,
-                            modifyText)
+            renamesRoot = wikiDoc.getWikiName() in dict(renameSeq)
+            if renamesRoot:
+                # Renaming of root word = renaming of wiki config file
+                wikiConfigFilename = wikiDoc.getWikiConfigPath()
+                self.removeFromWikiHistory(wikiConfigFilename)
+
+            wikiDoc.renameWikiWords(renameSeq, modifyText)
+
+            if renamesRoot:
+                # Store some additional information
+                self.lastAccessedWiki(wikiDoc.getWikiConfigPath())
 
             return True
         except (IOError, OSError, DbAccessError), e:
@@ -3962,6 +3961,48 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
             return False
 
 
+    def _buildTrees(self):
+        """
+        Set roots of main and views tree and restore expanded nodes
+        """
+        with Profiling.timingSpan(u"Build trees"):
+            lastRoot = self.getConfig().get("main",
+                    "tree_last_root_wiki_word", None)
+            if not (lastRoot and self.getWikiDocument()\
+                    .isDefinedWikiLinkTerm(lastRoot)):
+                lastRoot = self.wikiName
+
+            self.tree.setRootByWord(lastRoot)
+            self.tree.readExpandedNodesFromConfig()
+            self.tree.expandRoot()
+            self.getConfig().set("main", "tree_last_root_wiki_word",
+                    lastRoot)
+
+            viewsTree = self.windowLayouter.getWindowByName("viewstree")
+            if viewsTree is not None:
+                viewsTree.setViewsAsRoot()
+                viewsTree.readExpandedNodesFromConfig()
+                viewsTree.expandRoot()
+
+
+    def _setTreesPending(self):
+        """
+        Show "Loading..." in the trees while the caches of the wiki document
+        are filled in background. The expanded nodes are read nevertheless
+        so they are stored unchanged if the wiki is closed before.
+        """
+        self.tree.setPendingAsRoot()
+        self.tree.readExpandedNodesFromConfig()
+
+        viewsTree = self.windowLayouter.getWindowByName("viewstree")
+        if viewsTree is not None:
+            viewsTree.setPendingAsRoot()
+            viewsTree.readExpandedNodesFromConfig()
+
+        self.updateStatusMessage(_(u"Loading wiki caches..."),
+                key="cacheInfo", duration=300000)
+
+
     def findCurrentWordInTree(self):
         try:
             self.tree.buildTreeForWord(self.getCurrentWikiWord(), selectNode=True)
@@ -5107,6 +5148,62 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
         self.updateExternallyModFiles()
 
 
+    def migrateWikiDatabase(self):
+        """
+        Ask for a database type, copy the wiki into a new database of
+        that type and reopen the wiki with it.
+        """
+        if self.isReadOnlyWiki():
+            return
+
+        wikiDoc = self.getWikiDocument()
+        if wikiDoc.getRefCount() > 1:
+            self.displayErrorMessage(_(u"Wiki is open in another window. "
+                    u"Close it there before converting the database"))
+            return
+
+        wdhandlers = [wdh for wdh in DbBackendUtils.listHandlers()
+                if wdh[0] != wikiDoc.getDbtype()]
+
+        index = wx.GetSingleChoiceIndex(_(u"Choose database type"),
+                _(u"Choose database type"), [wdh[1] for wdh in wdhandlers],
+                self)
+        if index == -1:
+            return
+
+        dbtype = wdhandlers[index][0]
+        dstDataDir = os.path.join(wikiDoc.getWikiPath(), u"data_" + dbtype)
+
+        answer = wx.MessageBox(_(u"The wiki will be copied into a new "
+                u"database in directory\n%s\nThe old database is kept. "
+                u"Continue?") % dstDataDir, _(u'Convert database'),
+                wx.YES_NO | wx.YES_DEFAULT | wx.ICON_QUESTION, self)
+        if answer != wx.YES:
+            return
+
+        wikiConfigPath = wikiDoc.getWikiConfigPath()
+        try:
+            self.saveAllDocPages()
+            progresshandler = ProgressHandler(
+                    _(u"     Converting database     "),
+                    _(u"     Converting database     "), 0, self)
+            summary = DbMigration.migrateWikiData(wikiDoc, dbtype,
+                    dstDataDir, progresshandler)
+        except (IOError, OSError, DbAccessError), e:
+            self.lostAccess(e)
+            raise
+        except Exception, e:
+            self.displayErrorMessage(_(u"Error converting database"), e)
+            traceback.print_exc()
+            return
+
+        self.closeWiki()
+        self.openWiki(wikiConfigPath)
+
+        self.displayMessage(_(u"Convert database"),
+                _(u"Database converted (%s)") % summary)
+
+
     def vacuumWiki(self):
         if self.isReadOnlyWiki():
             return
@@ -5445,6 +5542,12 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
         dlg.Destroy()
 
 
+    def OnCmdShowTimingSummaryDialog(self, evt):
+        dlg = AdditionalDialogs.TimingSummaryDialog(self, -1, self)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+
     # ----------------------------------------------------------------------------------------
     # Event handlers from here on out.
     # ----------------------------------------------------------------------------------------
@@ -5472,6 +5575,12 @@ camelCaseWordsEnabled: false;a=[camelCaseWordsEnabled: false]\\n
                     # trigger hooks
                     self.hooks.renamedWikiWord(self, oldWord, newWord)
 
+                elif miscEvt.has_key("warmed caches"):
+                    self.dropStatusMessageByKey("cacheInfo")
+                    if self.tree.isPendingRoot():
+                        self._buildTrees()
+                        self.findCurrentWordInTree()
+
 #                 elif miscEvt.has_key("updated wiki page"):
 #                     # This was send from a WikiDocument(=WikiDataManager) object,
 #                     # send it again to listening components
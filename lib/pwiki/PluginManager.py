@@ -1,7 +1,8 @@
 from __future__ import with_statement
 
 from zipimport import zipimporter
-import os, sys, traceback, os.path, imp, new, collections
+import os, sys, traceback, os.path, imp, new, collections, marshal, \
+        hashlib, time, threading
 
 # sys.path.append(ur"C:\Daten\Projekte\Wikidpad\Next20\extensions")
 
@@ -9,6 +10,7 @@ import wx
 
 import Utilities
 
+from . import Profiling
 from .StringOps import mbcsEnc, pathEnc
 
 
@@ -214,14 +216,407 @@ class PluginAPIAggregation(object):
 
 
 
+# Increase if the format of the plugin meta data cache file changes
+PLUGIN_CACHE_FORMAT_VERSION = 2
+
+
+# Plugin API functions called for all plugins at startup with parameters
+# (<API version>, <app>). Their results and the options and option panels
+# they register are stored in the plugin meta data cache, so the plugin
+# doesn't have to be imported for them at next startup.
+STARTUP_FUNCTIONS = frozenset(("registerOptions", "describeInsertionKeys",
+        "describeWikiLanguage"))
+
+
+class _NotCacheable(Exception):
+    pass
+
+
+def _encodeStartupValue(value, module):
+    """
+    Encode value returned or registered by a startup function of plugin
+    module so that it can be stored by marshal. Functions and classes
+    of the module are stored by name. Raises _NotCacheable for other objects.
+    """
+    if value is None or isinstance(value, (bool, int, long, float,
+            basestring)):
+        return ("v", value)
+    if isinstance(value, tuple):
+        return ("t", tuple(_encodeStartupValue(v, module) for v in value))
+    if isinstance(value, list):
+        return ("l", tuple(_encodeStartupValue(v, module) for v in value))
+
+    name = getattr(value, "__name__", None)
+    if isinstance(name, basestring) and getattr(module, name, None) is value:
+        return ("a", name)
+
+    raise _NotCacheable()
+
+
+def _decodeStartupValue(encValue, lazyModule):
+    kind, value = encValue
+    if kind == "v":
+        return value
+    if kind == "t":
+        return tuple(_decodeStartupValue(v, lazyModule) for v in value)
+    if kind == "l":
+        return [_decodeStartupValue(v, lazyModule) for v in value]
+    if kind == "a":
+        return _LazyAttribute(lazyModule, value)
+
+    raise ValueError("Unknown kind %r of startup value" % kind)
+
+
+class _LazyAttribute(object):
+    """
+    Stands in for a function or class of a plugin module (e.g. a factory
+    returned by describeInsertionKeys()). The module is imported on first call.
+    """
+    def __init__(self, lazyModule, name):
+        self.lazyModule = lazyModule
+        self.__name__ = name
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self.lazyModule.getModule(), self.__name__)(*args,
+                **kwargs)
+
+
+class _RecordingDict(object):
+    """
+    Wraps one of the configuration dictionaries of the app object and
+    records the items set by a plugin. Other access makes the startup
+    call uncacheable.
+    """
+    def __init__(self, recorder, getterName, dictionary):
+        self._recorder = recorder
+        self._getterName = getterName
+        self._dict = dictionary
+
+    def __setitem__(self, key, value):
+        self._recorder.record(("dict", self._getterName, key, value))
+        self._dict[key] = value
+
+    def _uncacheable(self):
+        self._recorder.cacheable = False
+        return self._dict
+
+    def __getitem__(self, key):
+        return self._uncacheable()[key]
+
+    def __contains__(self, key):
+        return key in self._uncacheable()
+
+    def __iter__(self):
+        return iter(self._uncacheable())
+
+    def __len__(self):
+        return len(self._uncacheable())
+
+    def __getattr__(self, attr):
+        return getattr(self._uncacheable(), attr)
+
+
+class _AppRecorder(object):
+    """
+    Passed instead of the app object to a startup function of a plugin.
+    Records the option defaults and option panels it registers, any other
+    use of the app object makes the call uncacheable.
+    """
+    DICT_GETTERS = frozenset(("getDefaultGlobalConfigDict",
+            "getDefaultWikiConfigDict", "getWikiConfigFallthroughDict"))
+
+    PANEL_ADDERS = frozenset(("addOptionsDlgPanel",
+            "addGlobalPluginOptionsDlgPanel", "addWikiWikiLangOptionsDlgPanel",
+            "addWikiPluginOptionsDlgPanel"))
+
+    def __init__(self, app, module):
+        self._app = app
+        self._module = module
+        # List of encoded operations as taken by replayOperations()
+        self.operations = []
+        self.cacheable = True
+
+    def record(self, operation):
+        if not self.cacheable:
+            return
+        try:
+            self.operations.append(_encodeStartupValue(operation,
+                    self._module))
+        except _NotCacheable:
+            self.cacheable = False
+
+    def __getattr__(self, attr):
+        if attr in self.DICT_GETTERS:
+            return lambda: _RecordingDict(self, attr,
+                    getattr(self._app, attr)())
+
+        if attr in self.PANEL_ADDERS:
+            def addPanel(factory, title):
+                self.record(("panel", attr, factory, title))
+                getattr(self._app, attr)(factory, title)
+
+            return addPanel
+
+        self.cacheable = False
+        return getattr(self._app, attr)
+
+    @staticmethod
+    def replayOperations(encOperations, app, lazyModule):
+        """
+        Apply recorded operations to app, functions and classes of the
+        plugin are replaced by _LazyAttribute objects.
+        """
+        for encOperation in encOperations:
+            operation = _decodeStartupValue(encOperation, lazyModule)
+            if operation[0] == "dict":
+                getterName, key, value = operation[1:]
+                getattr(app, getterName)()[key] = value
+            elif operation[0] == "panel":
+                adderName, factory, title = operation[1:]
+                getattr(app, adderName)(factory, title)
+
+
+class PluginMetaDataCache(object):
+    """
+    Stores for each plugin file the WIKIDPAD_PLUGIN descriptors, the
+    names of its module attributes and the results of its startup functions
+    (see STARTUP_FUNCTIONS) so that the plugin can be registered and asked
+    for them without importing it (see LazyPluginModule). An entry is only
+    valid if modification time, size and MD5 hash of the file are unchanged.
+    The same cache can be used by multiple plugin managers.
+    """
+    def __init__(self, cachePath):
+        self.cachePath = cachePath
+        # Dictionary {<path>: (<file state>, <descriptors>,
+        #     <attribute names>, <function names>, <startup results>)}
+        # where file state is tuple (<mtime>, <size>, <md5 digest>) and
+        # startup results is dictionary {(<function name>, <API version>):
+        #     (<encoded operations>, <encoded return value>)}
+        self.entries = None
+        self.modified = False
+
+
+    def _getEntries(self):
+        if self.entries is None:
+            self.entries = {}
+            try:
+                f = open(pathEnc(self.cachePath), "rb")
+                try:
+                    version, entries = marshal.load(f)
+                finally:
+                    f.close()
+
+                if version == PLUGIN_CACHE_FORMAT_VERSION:
+                    self.entries = entries
+            except (IOError, OSError, ValueError, EOFError, TypeError):
+                pass
+
+        return self.entries
+
+
+    @staticmethod
+    def getFileState(path):
+        f = open(pathEnc(path), "rb")
+        try:
+            digest = hashlib.md5(f.read()).digest()
+        finally:
+            f.close()
+
+        st = os.stat(pathEnc(path))
+        return (st.st_mtime, st.st_size, digest)
+
+
+    def get(self, path, fileState):
+        """
+        Return tuple (<descriptors>, <attribute names>, <function names>,
+        <startup results>) for plugin file path or None if unknown or
+        outdated.
+        """
+        entry = self._getEntries().get(path)
+        if entry is None or entry[0] != fileState:
+            return None
+
+        return entry[1:]
+
+
+    def putModule(self, path, fileState, module):
+        """
+        Store meta data of plugin module loaded from file path
+        """
+        attrNames = tuple(name for name in dir(module)
+                if not name.startswith("__"))
+        functionNames = tuple(name for name in attrNames
+                if callable(getattr(module, name)))
+
+        # Startup results stay valid if only the module was imported
+        oldEntry = self._getEntries().get(path)
+        if oldEntry is not None and oldEntry[0] == fileState:
+            startupResults = oldEntry[4]
+        else:
+            startupResults = {}
+
+        entry = (fileState, module.WIKIDPAD_PLUGIN, attrNames, functionNames,
+                startupResults)
+
+        try:
+            # Descriptors may contain objects which can't be stored
+            marshal.dumps(entry)
+        except ValueError:
+            return
+
+        self._getEntries()[path] = entry
+        self.modified = True
+
+
+    def putStartupResult(self, path, fileState, key, result):
+        """
+        Store result of a startup function call of the plugin loaded from
+        file path.
+        key -- tuple (<function name>, <API version>)
+        result -- tuple (<encoded operations>, <encoded return value>)
+        """
+        entry = self._getEntries().get(path)
+        if entry is None or entry[0] != fileState:
+            return
+
+        try:
+            marshal.dumps(result)
+        except ValueError:
+            return
+
+        entry[4][key] = result
+        self.modified = True
+
+
+    def save(self):
+        if not self.modified:
+            return
+
+        # Throw away entries of deleted plugins
+        entries = dict((path, entry)
+                for path, entry in self._getEntries().iteritems()
+                if os.path.isfile(pathEnc(path)))
+
+        try:
+            f = open(pathEnc(self.cachePath), "wb")
+            try:
+                marshal.dump((PLUGIN_CACHE_FORMAT_VERSION, entries), f)
+            finally:
+                f.close()
+
+            self.modified = False
+        except (IOError, OSError):
+            traceback.print_exc()
+
+
+
+class LazyPluginModule(object):
+    """
+    Stands in for a plugin module which wasn't imported yet. The module
+    is imported when one of its functions is called for the first time
+    or another of its attributes is accessed. Until then functions are
+    returned as stubs which import the module on call.
+    Startup functions (see STARTUP_FUNCTIONS) are answered from the cached
+    startup results if possible, otherwise their results are stored
+    in the cache, even if the module is already imported.
+    """
+    def __init__(self, name, loadFct, descriptors, attrNames, functionNames,
+            startupResults, storeStartupResultFct, module=None):
+        """
+        startupResults -- dictionary of cached startup results as stored
+            by PluginMetaDataCache
+        storeStartupResultFct -- function taking key and result to store
+            a startup result in the cache
+        module -- real module if already imported
+        """
+        self.__name__ = name
+        self.WIKIDPAD_PLUGIN = descriptors
+        self._loadFct = loadFct
+        self._attrNames = frozenset(attrNames)
+        self._functionNames = frozenset(functionNames)
+        self._startupResults = startupResults
+        self._storeStartupResultFct = storeStartupResultFct
+        self._module = module
+        self._loadLock = threading.RLock()
+
+
+    def getModule(self):
+        """
+        Return real module, import it if necessary
+        """
+        with self._loadLock:
+            if self._module is None:
+                self._module = self._loadFct()
+
+        return self._module
+
+
+    def _createStub(self, fctName):
+        def stub(*args, **kwargs):
+            return getattr(self.getModule(), fctName)(*args, **kwargs)
+
+        stub.__name__ = fctName
+        return stub
+
+
+    def _createStartupStub(self, fctName):
+        def stub(*args, **kwargs):
+            if len(args) != 2 or kwargs:
+                return getattr(self.getModule(), fctName)(*args, **kwargs)
+
+            ver, app = args
+            key = (fctName, ver)
+            result = self._startupResults.get(key)
+            if result is not None:
+                encOperations, encReturnValue = result
+                _AppRecorder.replayOperations(encOperations, app, self)
+                return _decodeStartupValue(encReturnValue, self)
+
+            module = self.getModule()
+            recorder = _AppRecorder(app, module)
+            returnValue = getattr(module, fctName)(ver, recorder)
+            if recorder.cacheable:
+                try:
+                    self._storeStartupResultFct(key,
+                            (tuple(recorder.operations),
+                            _encodeStartupValue(returnValue, module)))
+                except _NotCacheable:
+                    pass
+
+            return returnValue
+
+        stub.__name__ = fctName
+        return stub
+
+
+    def __getattr__(self, attr):
+        if attr in STARTUP_FUNCTIONS and attr in self._functionNames:
+            return self._createStartupStub(attr)
+
+        if self._module is None:
+            if attr not in self._attrNames:
+                raise AttributeError(attr)
+
+            if attr in self._functionNames:
+                return self._createStub(attr)
+
+        return getattr(self.getModule(), attr)
+
+
+
 class PluginManager(object):
     """manages all PluginAPIs and plugins."""
-    def __init__(self, directories, systemDirIdx=-1):
+    def __init__(self, directories, systemDirIdx=-1, metaDataCache=None):
+        """
+        metaDataCache -- PluginMetaDataCache object or None. If present,
+            plugins found in the cache are imported lazily
+        """
         self.pluginAPIs = {}  # Dictionary {<type name>:<verReg dict>}
                 # where verReg dict is list of tuples (<version No>:<PluginAPI instance>)
         self.plugins = {}  
         self.directories = directories
         self.systemDirIdx = systemDirIdx
+        self.metaDataCache = metaDataCache
         
     def registerSimplePluginAPI(self, descriptor, functions):
         api = SimplePluginAPI(descriptor, functions)
@@ -310,7 +705,10 @@ class PluginManager(object):
            appearing in earlier directories are not loaded from later ones."""
         import imp
         exclusions = excludeFiles[:]
-        
+        startTime = time.time()
+        importedCount = 0
+        deferredCount = 0
+
         for dirNum, directory in enumerate(self.directories):
             sys.path.append(os.path.dirname(directory))
             if not os.access(mbcsEnc(directory, "replace")[0], os.F_OK):
@@ -336,9 +734,22 @@ class PluginManager(object):
                         continue
                     if os.path.isfile(fullname):
                         if ext == '.py':
-                            with open(fullname) as f:
-                                module = imp.load_module(packageName + "." + moduleName, f,
-                                        mbcsEnc(fullname)[0], (".py", "r", imp.PY_SOURCE))
+                            if self.metaDataCache is not None:
+                                module = self._getLazyModule(package,
+                                        moduleName, directory, fullname)
+
+                            if module is not None:
+                                deferredCount += 1
+                            else:
+                                module = self._loadSourceModule(package,
+                                        moduleName, fullname)
+                                importedCount += 1
+
+                                if self.metaDataCache is not None:
+                                    # Record results of startup functions
+                                    module = self._getLazyModule(package,
+                                            moduleName, directory, fullname,
+                                            module) or module
                         elif ext == '.zip':
                             module = imp.new_module(
                                     packageName + "." + moduleName)
@@ -348,6 +759,7 @@ class PluginManager(object):
                             zi = zipimporter(fullname)
                             co = zi.get_code("__init__")
                             exec co in module.__dict__
+                            importedCount += 1
 
                     if module:
                         setattr(package, moduleName, module)
@@ -356,7 +768,68 @@ class PluginManager(object):
                 except:
                     traceback.print_exc()
             del sys.path[-1]
-          
+
+        if self.metaDataCache is not None:
+            self.metaDataCache.save()
+
+        Profiling.addSpan(u"Plugins: %i imported, %i deferred" %
+                (importedCount, deferredCount), startTime,
+                time.time() - startTime)
+
+
+    def _loadSourceModule(self, package, moduleName, fullname):
+        """
+        Import plugin module from .py file fullname and store its meta data
+        in the cache.
+        """
+        with open(fullname) as f:
+            module = imp.load_module(package.__name__ + "." + moduleName, f,
+                    mbcsEnc(fullname)[0], (".py", "r", imp.PY_SOURCE))
+
+        if self.metaDataCache is not None and \
+                hasattr(module, "WIKIDPAD_PLUGIN"):
+            self.metaDataCache.putModule(fullname,
+                    PluginMetaDataCache.getFileState(fullname), module)
+
+        return module
+
+
+    def _getLazyModule(self, package, moduleName, directory, fullname,
+            module=None):
+        """
+        Return LazyPluginModule for the .py file fullname or None
+        if the cache doesn't contain valid meta data for it.
+        module -- real module if already imported
+        """
+        fileState = PluginMetaDataCache.getFileState(fullname)
+        metaData = self.metaDataCache.get(fullname, fileState)
+        if metaData is None:
+            return None
+
+        def loadModule():
+            module = sys.modules.get(package.__name__ + "." + moduleName)
+            if module is None or getattr(module, "__file__", None) != \
+                    mbcsEnc(fullname)[0]:
+                sys.path.append(os.path.dirname(directory))
+                try:
+                    module = self._loadSourceModule(package, moduleName,
+                            fullname)
+                finally:
+                    sys.path.remove(os.path.dirname(directory))
+
+            setattr(package, moduleName, module)
+            return module
+
+        def storeStartupResult(key, result):
+            self.metaDataCache.putStartupResult(fullname, fileState, key,
+                    result)
+
+        descriptors, attrNames, functionNames, startupResults = metaData
+        return LazyPluginModule(package.__name__ + "." + moduleName,
+                loadModule, descriptors, attrNames, functionNames,
+                startupResults, storeStartupResult, module)
+
+
     def importDirectory(self, name, add_to_sys_modules = False): 
         name = mbcsEnc(name, "replace")[0]
         try:
@@ -0,0 +1,197 @@
+"""
+Instrumentation to find out where time is spent, especially during startup.
+
+Phases are measured by named timing spans:
+
+    with Profiling.timingSpan(u"Load plugins"):
+        ...
+
+Finished spans are collected process-wide and can be shown by
+AdditionalDialogs.TimingSummaryDialog ("Maintenance"->"Show timing
+summary..."). Additionally a cProfile capture of a function call can be
+written to a file with runProfiled().
+"""
+
+from __future__ import with_statement
+
+import os, os.path, threading, tempfile, time, traceback, re
+from contextlib import contextmanager
+
+try:
+    import cProfile
+except ImportError:
+    cProfile = None
+
+import wx
+
+from .StringOps import pathEnc
+
+
+# Maximum number of spans kept, older ones are thrown away
+MAX_SPAN_COUNT = 1000
+
+# Time when this module was imported (early at startup)
+_startTime = time.time()
+
+_lock = threading.Lock()
+
+# List of tuples (<name>, <start in seconds after _startTime>,
+#     <duration in seconds>, <nesting depth>)
+_spans = []
+
+# List of paths of written profile files
+_profilePaths = []
+
+# Nesting depth of currently open spans and flag if runProfiled() is
+# active, per thread
+_threadState = threading.local()
+
+# Number of profile paths built, makes file names unique
+_profilePathCount = 0
+
+
+def _isLoggingEnabled():
+    # Global configuration may not be loaded yet
+    globalConfig = getattr(wx.GetApp(), "globalConfig", None)
+    if globalConfig is None:
+        return False
+
+    return globalConfig.getboolean("main", "profiling_logTimingSpans", False)
+
+
+def addSpan(name, start, duration, depth=None):
+    """
+    Record a finished span. start is an absolute time as returned by
+    time.time(). If depth is None, the span is nested in the currently
+    open spans of the calling thread.
+    """
+    if depth is None:
+        depth = getattr(_threadState, "depth", 0)
+
+    with _lock:
+        _spans.append((name, start - _startTime, duration, depth))
+        if len(_spans) > MAX_SPAN_COUNT:
+            del _spans[:len(_spans) - MAX_SPAN_COUNT]
+
+    try:
+        if _isLoggingEnabled():
+            print "Timing: %s %.3f s" % (name, duration)
+    except:
+        traceback.print_exc()
+
+
+@contextmanager
+def timingSpan(name):
+    """
+    Context manager measuring the time spent in its body as span name.
+    Spans can be nested.
+    """
+    depth = getattr(_threadState, "depth", 0)
+    _threadState.depth = depth + 1
+    start = time.time()
+    try:
+        yield
+    finally:
+        _threadState.depth = depth
+        addSpan(name, start, time.time() - start, depth)
+
+
+def getSpans():
+    """
+    Return list of tuples (<name>, <start in seconds after startup>,
+    <duration in seconds>, <nesting depth>) in order of their end.
+    """
+    with _lock:
+        return _spans[:]
+
+
+def getProfilePaths():
+    with _lock:
+        return _profilePaths[:]
+
+
+def addStartupSpan():
+    """
+    Record span "Startup" from import of this module until now
+    """
+    addSpan(u"Startup", _startTime, time.time() - _startTime)
+
+
+def formatSummary():
+    """
+    Return unistring with one line per span, nested spans are indented
+    and appear before their enclosing span.
+    """
+    lines = []
+    for name, start, duration, depth in getSpans():
+        lines.append(u"%8.3f s %8.1f ms  %s%s" % (start, duration * 1000,
+                u"    " * depth, name))
+
+    return u"\n".join(lines)
+
+
+def getProfileDir(wikiDocument=None):
+    """
+    Return directory for profile files: the temp. directory of wikiDocument
+    if present, the default temporary directory otherwise.
+    """
+    if wikiDocument is not None:
+        tempDir = wikiDocument.getWikiTempDir()
+        if tempDir is not None:
+            return tempDir
+
+    from .TempFileSet import getDefaultTempFilePath
+
+    tempDir = getDefaultTempFilePath()
+    if tempDir:
+        return tempDir
+
+    return tempfile.gettempdir()
+
+
+def buildProfilePath(profileDir, name):
+    """
+    Return path of a profile file in profileDir with a file name made
+    from name (e.g. an action unified name), the current time (with
+    milliseconds) and a counter so that each call returns another path.
+    """
+    global _profilePathCount
+
+    with _lock:
+        _profilePathCount += 1
+        count = _profilePathCount
+
+    now = time.time()
+    name = re.sub(ur"[^A-Za-z0-9_]+", u"_", name).strip(u"_")
+    return os.path.join(profileDir, u"WikidPad_%s_%s_%03i_%i.prof" %
+            (name, time.strftime("%Y%m%d_%H%M%S", time.localtime(now)),
+            int((now % 1) * 1000), count))
+
+
+def runProfiled(path, fct, *args, **kwargs):
+    """
+    Call fct(*args, **kwargs) with cProfile and write the statistics
+    (readable by module pstats) to path. Returns result of fct.
+    If cProfile isn't available or runProfiled() is already active in
+    the current thread (a nested profiler would stop the outer one),
+    fct is just called.
+    """
+    if cProfile is None or getattr(_threadState, "profiling", False):
+        return fct(*args, **kwargs)
+
+    profile = cProfile.Profile()
+    _threadState.profiling = True
+    try:
+        return profile.runcall(fct, *args, **kwargs)
+    finally:
+        _threadState.profiling = False
+        try:
+            profileDir = os.path.dirname(path)
+            if not os.path.exists(pathEnc(profileDir)):
+                os.makedirs(pathEnc(profileDir))
+
+            profile.dump_stats(pathEnc(path))
+            with _lock:
+                _profilePaths.append(path)
+        except (IOError, OSError):
+            traceback.print_exc()
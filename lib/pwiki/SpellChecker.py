@@ -12,7 +12,7 @@ from .Utilities import DUMBTHREADSTOP
 
 from .wxHelper import GUI_ID, XrcControls, autosizeColumn, wxKeyFunctionSink
 
-from .WikiPyparsing import buildSyntaxNode
+from .WikiPyparsing import buildSyntaxNode, TerminalNode
 
 
 try:
@@ -36,6 +36,42 @@ from StringOps import uniToGui, guiToUni
 
 
 
+def _commonPrefixLength(a, b):
+    """
+    Return length of common prefix of strings a and b. Uses binary search
+    with slice comparisons to avoid a character loop in Python.
+    """
+    lo = 0
+    hi = min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def _commonSuffixLength(a, b, maxLength):
+    """
+    Return length of common suffix of strings a and b, but at most maxLength.
+    """
+    lenA = len(a)
+    lenB = len(b)
+    lo = 0
+    hi = maxLength
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lenA - mid:lenA - lo] == b[lenB - mid:lenB - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+
 class SpellCheckerDialog(wx.Dialog):
     def __init__(self, parent, ID, mainControl, title=None,
                  pos=wx.DefaultPosition, size=wx.DefaultSize,
@@ -335,6 +371,9 @@ class SpellCheckerDialog(wx.Dialog):
 
 
 class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
+    # Maximum number of words in verdict cache for a language
+    VERDICT_CACHE_SIZE = 50000
+
     def __init__(self, wikiDocument):
         MiscEvent.MiscEventSourceMixin.__init__(self)
 
@@ -348,6 +387,10 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
         self.autoReplaceWords = {}
         self.spellChkIgnore = set()  # set of words to ignore during spell checking
 
+        # Dictionary {<language>: {<word>: <True iff known>}}, shared with
+        # clones, cleared when the session is modified
+        self.verdictCaches = {}
+
         # For currently open dict file (if any)
         self.spellChkAddedGlobal = None
         self.globalPwlPage = None
@@ -398,6 +441,7 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
         # For current session
         result.autoReplaceWords = self.autoReplaceWords
         result.spellChkIgnore = self.spellChkIgnore
+        result.verdictCaches = self.verdictCaches
 
         result.dictLanguage = self.dictLanguage
         result.enchantDict = self.enchantDict  # Thread safety???  Dict(self.dictLanguage)
@@ -454,6 +498,7 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
         self.fireMiscEventKeys(("modified spell checker session",))
 
     def rereadPersonalWordLists(self):
+        self.verdictCaches.clear()
         self.globalPwlPage = self.wikiDocument.getFuncPage("global/PWL")
         self.spellChkAddedGlobal = \
                 set(self.globalPwlPage.getLiveText().split("\n"))
@@ -492,12 +537,27 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
 
 
     def checkWord(self, spWord):
-        return spWord in self.spellChkIgnore or \
+        verdictCache = self.verdictCaches.get(self.dictLanguage)
+        if verdictCache is None:
+            verdictCache = {}
+            self.verdictCaches[self.dictLanguage] = verdictCache
+        else:
+            verdict = verdictCache.get(spWord)
+            if verdict is not None:
+                return verdict
+
+        verdict = spWord in self.spellChkIgnore or \
                 spWord in self.spellChkAddedGlobal or \
                 spWord in self.spellChkAddedLocal or \
                 (self.enchantDict is not None and \
                 self.enchantDict.check(spWord))
 
+        if len(verdictCache) >= self.VERDICT_CACHE_SIZE:
+            verdictCache.clear()
+
+        verdictCache[spWord] = verdict
+        return verdict
+
     def suggest(self, spWord):
         if self.enchantDict is None:
             return []
@@ -516,11 +576,13 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
         Clear the list of words to ignore for this session.
         """
         self.spellChkIgnore.clear()
+        self.verdictCaches.clear()
         self.fireMiscEventKeys(("modified spell checker session",))
 
 
     def addIgnoreWordSession(self, spWord):
         self.spellChkIgnore.add(spWord)
+        self.verdictCaches.clear()
         # For global and local ignores the changed FuncPage automatically
         # issues an event which triggers a reread of the word lists
         # and sends another event that session was modified.
@@ -553,7 +615,15 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
         self.localPwlPage.replaceLiveText(u"\n".join(words))
 
 
-    def buildUnknownWordList(self, text, threadstop=DUMBTHREADSTOP):
+    def buildUnknownWordList(self, text, threadstop=DUMBTHREADSTOP,
+            prevText=None, prevUnknownWords=None):
+        """
+        Return NonTerminalNode "unknownSpellList" containing a TerminalNode
+        for each unknown word in text.
+        If prevText and the result prevUnknownWords built for it are given,
+        only the lines which differ between prevText and text are checked,
+        the other unknown words are taken from prevUnknownWords.
+        """
         if not self.hasEnchantDict():
             return buildSyntaxNode([], -1, "unknownSpellList")
         
@@ -562,23 +632,64 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
         if docPage is None:
             return buildSyntaxNode([], -1, "unknownSpellList")
         
-        result = []
-
         langHelper = wx.GetApp().createWikiLanguageHelper(
                 docPage.getWikiLanguageName())
 
-        startPos = 0
+        if prevText is None or prevUnknownWords is None or \
+                getattr(prevUnknownWords, "dictLanguage", None) != \
+                self.dictLanguage:
+            result = self._findUnknownWords(langHelper, docPage, text, 0,
+                    len(text), threadstop)
+        else:
+            # Find range of changed lines
+            prefixLen = _commonPrefixLength(prevText, text)
+            suffixLen = _commonSuffixLength(prevText, text,
+                    min(len(prevText), len(text)) - prefixLen)
+
+            changeStart = text.rfind(u"\n", 0, prefixLen) + 1
+            changeEnd = text.find(u"\n", len(text) - suffixLen)
+            if changeEnd == -1:
+                changeEnd = len(text)
 
+            delta = len(text) - len(prevText)
+            prevChangeEnd = changeEnd - delta
+
+            result = [node for node in prevUnknownWords
+                    if node.pos < changeStart]
+
+            result += self._findUnknownWords(langHelper, docPage, text,
+                    changeStart, changeEnd, threadstop)
+
+            for node in prevUnknownWords:
+                if node.pos < prevChangeEnd:
+                    continue
+                if delta != 0:
+                    node = TerminalNode(node.getText(), node.pos + delta,
+                            "unknownSpelling")
+                result.append(node)
+
+        result = buildSyntaxNode(result, -1, "unknownSpellList")
+        result.dictLanguage = self.dictLanguage
+
+        return result
+
+
+    def _findUnknownWords(self, langHelper, docPage, text, startPos, endPos,
+            threadstop):
+        """
+        Return list of TerminalNodes for unknown words in text starting
+        between startPos and endPos.
+        """
+        result = []
         while True:
             threadstop.testValidThread()
 
             start, end, spWord = langHelper.findNextWordForSpellcheck(text,
                     startPos, docPage)
-            
 
-            if start is None:
-                # End of page reached
-                return buildSyntaxNode(result, -1, "unknownSpellList")
+            if start is None or start >= endPos:
+                # End of range reached
+                return result
 
             startPos = end
 
@@ -591,7 +702,7 @@ class SpellCheckerSession(MiscEvent.MiscEventSourceMixin):
             # It is added as a WikiPyparsing.TerminalNode
             
             result.append(buildSyntaxNode(spWord, start, "unknownSpelling"))
-            
+
 
 
 def isSpellCheckSupported():
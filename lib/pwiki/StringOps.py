@@ -867,21 +867,39 @@ def base64BlockEncode(data):
     """
     b64 = base64.b64encode(data)
 
-    result = []
-    while len(b64) > 70:
-        result.append(b64[:70])
-        b64 = b64[70:]
+    return u"\n".join([b64[i:i + 70] for i in xrange(0, len(b64), 70)])
 
-    if len(b64) > 0:
-        result.append(b64)
 
-    return u"\n".join(result)
+def iterBase64BlockEncode(data, linesPerChunk=1000):
+    """
+    Iterator yielding the result of base64BlockEncode(data) in chunks of
+    about linesPerChunk lines to avoid holding the whole encoded block.
+    """
+    # Two lines of 70 characters encode exactly 105 bytes
+    chunkSize = 105 * max(linesPerChunk // 2, 1)
+
+    for i in xrange(0, len(data), chunkSize):
+        if i > 0:
+            yield u"\n"
+        yield base64BlockEncode(data[i:i + chunkSize])
 
 
 # Just for completeness
 base64BlockDecode = base64.b64decode
 
 
+def formatThroughput(byteCount, seconds):
+    """
+    Return unistring describing amount of processed data and the
+    throughput, e.g. u"12.5 MB, 3.1 MB/s"
+    """
+    mb = byteCount / 1048576.0
+    if seconds <= 0:
+        return u"%.1f MB" % mb
+
+    return u"%.1f MB, %.1f MB/s" % (mb, mb / seconds)
+
+
 
 EXTENDED_STRFTIME_RE = _re.compile(
         r"([^%]+|%(?:%|[%aAbBcdHIJmMpSUwWxXyYZ])|(?:%u))",
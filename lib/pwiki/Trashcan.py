@@ -175,24 +175,34 @@ class Trashcan(MiscEventSourceMixin):
 
 
     def onChangedWikiConfiguration(self, miscEvt):
-        self._removeOldest()
+        if self._removeOldest():
+            # Overview must not list bags whose packets are deleted
+            self.writeOverview()
 
 
     def _removeOldest(self):
         """
-        Remove oldest trashbags if there are more in the can than configuration
-        setting allows
+        Remove oldest trashbags (including their packets) if there are more
+        in the can than configuration setting allows. Returns True if bags
+        were removed.
         """
         remCount = len(self.trashBags) - self.wikiDocument.getWikiConfig()\
                 .getint("main", "trashcan_maxNoOfBags", 200)
 
         if remCount <= 0:
-            return
+            return False
 
+        packetNames = []
         for bag in self.trashBags[:remCount]:
             self.trashBagIds.discard(bag.bagId)
+            unifName = bag.getPacketUnifiedName()
+            if unifName is not None:
+                packetNames.append(unifName)
         
         del self.trashBags[:remCount]
+        self.wikiDocument.deleteDataBlocks(packetNames)
+
+        return True
         
 
     def _addTrashBag(self, trashBag):
@@ -293,11 +303,8 @@ class Trashcan(MiscEventSourceMixin):
         Delete all trashcan data in case existing data is broken and can't
         be deleted in regular ways.
         """
-        dataBlocks = wikiDocument.getDataBlockUnifNamesStartingWith(
-                u"trashcan/")
-
-        for db in dataBlocks:
-            wikiDocument.deleteDataBlock(db)
+        wikiDocument.deleteDataBlocks(
+                wikiDocument.getDataBlockUnifNamesStartingWith(u"trashcan/"))
 
 
     def writeOverview(self):
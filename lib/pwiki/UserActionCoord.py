@@ -1,6 +1,9 @@
 # from MiscEvent import KeyFunctionSink
 
+from __future__ import with_statement
+
 from DocPagePresenter import BasicDocPagePresenter
+import Profiling
 
 
 class AbstractAction(object):
@@ -211,7 +214,7 @@ class UserActionCoord(object):
             if not paramDict.has_key("main control"):
                 paramDict["main control"] = self.mainControl
 
-            action.doAction(actionUName, paramDict)
+            self._doAction(action, actionUName, paramDict)
     
     
     def runAction(self, actionUName, paramDict=None):
@@ -222,8 +225,25 @@ class UserActionCoord(object):
 
         for action in _ACTIONS:
             if actionUName in action.getActionUnifiedNames():
-                action.doAction(actionUName, paramDict)
+                self._doAction(action, actionUName, paramDict)
                 break
 
 
+    def _doAction(self, action, actionUName, paramDict):
+        """
+        Run action as timing span, with cProfile if option
+        "profiling_userActions" is set.
+        """
+        with Profiling.timingSpan(u"Action " + actionUName):
+            if self.mainControl.getConfig().getboolean("main",
+                    "profiling_userActions", False):
+                Profiling.runProfiled(Profiling.buildProfilePath(
+                        Profiling.getProfileDir(
+                        self.mainControl.getWikiDocument()),
+                        u"action_" + actionUName),
+                        action.doAction, actionUName, paramDict)
+            else:
+                action.doAction(actionUName, paramDict)
+
+
 
@@ -128,6 +128,19 @@ class ExecutionResult(object):
 
 
 class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
+    """
+    Runs jobs in a separate thread. Jobs are taken from a number of deques,
+    each deque is processed in FIFO order and only if all deques with lower
+    index are empty.
+
+    Jobs can be pushed with a key (see executeAsyncUniqueWithThreadStop()),
+    then at most one job per key is pending. Jobs with a key in the priority
+    keys (see setPriorityKeys()) are processed before all other jobs of
+    their deque.
+
+    A job is a tuple (fct, args, kwargs, event, retObj, tstop, key,
+    <time when job was pushed>).
+    """
     def __init__(self, dequeCount=1, daemon=False):
         MiscEvent.MiscEventSourceMixin.__init__(self)
 
@@ -136,6 +149,12 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
         self.dequeCount = dequeCount
 
         self.deques = None
+        # Dictionary {<key>: <pending job>}
+        self.keyedJobs = {}
+        self.priorityKeys = frozenset()
+        # List with an entry [<done jobs>, <sum of waiting times>,
+        #     <max. waiting time>] for each deque
+        self.queueStats = None
         self.thread = None
         self.paused = False
         self.currentThreadStop = None
@@ -155,6 +174,10 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
             if self.deques is None:
                 self.deques = tuple(collections.deque()
                         for i in range(self.dequeCount))
+                self.keyedJobs = {}
+
+            if self.queueStats is None:
+                self.resetQueueStatistics()
 
     def start(self):
         with self.dequeCondition:
@@ -186,6 +209,9 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
             return  # Error?
 
         with self.dequeCondition:
+            for job in self.deques[idx]:
+                self._dropJobKey(job)
+
             self.deques[idx].clear()
 
 
@@ -195,16 +221,89 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
     def _getNextJob(self):
         if self.paused:
             return (SingleThreadExecutor.PAUSEOBJECT, None, None, None, None,
-                        False)
+                        False, None, None)
 
         # No lock as it is called always inside a lock
-        for deque in self.deques:
+        for idx, deque in enumerate(self.deques):
             if len(deque) != 0:
-                return deque.pop()
-        
+                job = deque.pop()
+                self._dropJobKey(job)
+
+                if job[7] is not None:
+                    waited = _time() - job[7]
+                    stat = self.queueStats[idx]
+                    stat[0] += 1
+                    stat[1] += waited
+                    stat[2] = max(stat[2], waited)
+
+                return job
+
+        return None
+
+
+    def _dropJobKey(self, job):
+        key = job[6]
+        if key is not None and self.keyedJobs.get(key) is job:
+            del self.keyedJobs[key]
+
+
+    def _pushJob(self, idx, fct, args, kwargs, event, retObj, tstop,
+            key=None):
+        """
+        Put new job into deque idx (before all other jobs of the deque if key
+        is a priority key) and wake up thread. Must be called inside the lock.
+        """
+        job = (fct, args, kwargs, event, retObj, tstop, key, _time())
+
+        if key is not None:
+            self.keyedJobs[key] = job
+            if key in self.priorityKeys:
+                self.deques[idx].append(job)
+                self.dequeCondition.notify()
+                return
+
+        self.deques[idx].appendleft(job)
+        self.dequeCondition.notify()
+
+
+    def _removeJob(self, job):
+        """
+        Remove job (identified by identity) from its deque and return the
+        deque (None if job wasn't found). Must be called inside the lock.
+        """
+        for deque in self.deques:
+            for i, j in enumerate(deque):
+                if j is job:
+                    del deque[i]
+                    return deque
+
         return None
 
 
+    def setPriorityKeys(self, keys):
+        """
+        Set sequence of keys of jobs which should run before all other jobs
+        of their deque in the order of the sequence. Pending jobs with these
+        keys are moved to the front of their deque, jobs pushed later with
+        one of the keys are put to the front as well. Deques with lower
+        index are still processed first.
+        """
+        with self.dequeCondition:
+            self.priorityKeys = frozenset(keys)
+
+            if self.deques is None:
+                return
+
+            for key in reversed(keys):
+                job = self.keyedJobs.get(key)
+                if job is None:
+                    continue
+
+                deque = self._removeJob(job)
+                if deque is not None:
+                    deque.append(job)
+
+
     def getJobCount(self, start=None, end=None):
         if start is not None and end is None:
             end = start
@@ -247,6 +346,36 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
         callInMainThreadAsync(self.fireMiscEventProps, {"changed state": True,
             "isRunning": running, "jobCount": self.getJobCount()})
 
+
+    def resetQueueStatistics(self):
+        with self.dequeCondition:
+            self.queueStats = [[0, 0.0, 0.0] for i in range(self.dequeCount)]
+
+    def getQueueStatistics(self):
+        """
+        Returns list with a tuple (<pending jobs>, <done jobs>,
+        <average waiting time>, <max. waiting time>) for each deque.
+        Waiting times are in seconds and count from pushing a job until
+        it starts.
+        """
+        with self.dequeCondition:
+            if self.queueStats is None:
+                return []
+
+            result = []
+            for idx, (count, waitSum, waitMax) in enumerate(self.queueStats):
+                if self.deques is None:
+                    pending = 0
+                else:
+                    pending = len(self.deques[idx])
+
+                if count == 0:
+                    result.append((pending, 0, 0.0, 0.0))
+                else:
+                    result.append((pending, count, waitSum / count, waitMax))
+
+            return result
+
     def _runQueue(self):
         while True:
             with self.dequeCondition:
@@ -264,7 +393,7 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
                     self._fireStateChange(False)
                     return
 
-                fct, args, kwargs, event, retObj, tstop = job
+                fct, args, kwargs, event, retObj, tstop = job[:6]
 
                 try:
                     if fct is SingleThreadExecutor.ENDOBJECT:
@@ -277,7 +406,7 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
 
                         self.deques[-1].appendleft(
                                 (SingleThreadExecutor.ENDOBJECT, None, None,
-                                None, None))
+                                None, None, False, None, None))
                         continue
                     elif fct is SingleThreadExecutor.PAUSEOBJECT:
                         # Operation should pause, this means to kill the thread, but
@@ -325,8 +454,7 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
         retObj = ExecutionResult()
 
         with self.dequeCondition:
-            self.deques[idx].appendleft((fct, args, kwargs, event, retObj, None))
-            self.dequeCondition.notify()
+            self._pushJob(idx, fct, args, kwargs, event, retObj, None)
 
         event.wait(240)  # TODO: Replace by constant
 
@@ -352,8 +480,7 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
             return retObj  # Error?
 
         with self.dequeCondition:
-            self.deques[idx].appendleft((fct, args, kwargs, None, retObj, False))
-            self.dequeCondition.notify()
+            self._pushJob(idx, fct, args, kwargs, None, retObj, False)
 
         return retObj
 
@@ -365,8 +492,27 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
             return retObj  # Error?
 
         with self.dequeCondition:
-            self.deques[idx].appendleft((fct, args, kwargs, None, retObj, True))
-            self.dequeCondition.notify()
+            self._pushJob(idx, fct, args, kwargs, None, retObj, True)
+
+        return retObj
+
+
+    def executeAsyncUniqueWithThreadStop(self, idx, key, fct, *args, **kwargs):
+        """
+        Like executeAsyncWithThreadStop() but if a job with the same key
+        is still pending, no new job is pushed and the ExecutionResult
+        of the pending job is returned.
+        """
+        if self.deques is None:
+            return ExecutionResult()  # Error?
+
+        with self.dequeCondition:
+            job = self.keyedJobs.get(key)
+            if job is not None:
+                return job[4]
+
+            retObj = ExecutionResult()
+            self._pushJob(idx, fct, args, kwargs, None, retObj, True, key)
 
         return retObj
 
@@ -392,10 +538,11 @@ class SingleThreadExecutor(BasicThreadStop, MiscEvent.MiscEventSourceMixin):
         with self.dequeCondition:
             if hardEnd:
                 self.deques = None
+                self.keyedJobs = {}
             else:
                 self.deques[-1].appendleft(
                         (SingleThreadExecutor.ENDOBJECT, None, None, None, None,
-                        False))
+                        False, None, None))
             self.dequeCondition.notify()
 
         self.thread.join(120)  # TODO: Replace by constant
@@ -621,6 +768,37 @@ def seqStartsWith(seq, startSeq):
 
 
 
+def calcRowsDelta(oldRows, newRows):
+    """
+    Compare the sequences oldRows and newRows of hashable rows (normally
+    tuples) as multisets. Returns tuple (toDelete, toInsert) where toDelete
+    is a list of distinct rows of which all occurrences must be deleted
+    and toInsert is a list of rows (maybe with repetitions) which must be
+    inserted afterwards to get newRows.
+    """
+    oldCounts = {}
+    for row in oldRows:
+        oldCounts[row] = oldCounts.get(row, 0) + 1
+
+    newCounts = {}
+    for row in newRows:
+        newCounts[row] = newCounts.get(row, 0) + 1
+
+    toDelete = [row for row, count in oldCounts.iteritems()
+            if newCounts.get(row, 0) != count]
+
+    toInsert = []
+    for row, count in newCounts.iteritems():
+        oldCount = oldCounts.get(row, 0)
+        if oldCount == count:
+            continue
+
+        toInsert += [row] * count
+
+    return toDelete, toInsert
+
+
+
 
 # class FlagHolder(object):
 #     __slots__ = ("__weakref__", "flag")
@@ -128,6 +128,8 @@ class WikiHtmlView(wx.html.HtmlWindow):
         self.exporterInstance.styleSheet = u""
         self.exporterInstance.tempFileSet = TempFileSet()
         self._updateTempFilePrefPath()
+        # Only changed blocks of a page are rendered again on refresh
+        self.exporterInstance.enableBlockFragmentCache()
 
         self.exporterInstance.setWikiDocument(
                 self.presenter.getWikiDocument())
@@ -338,6 +340,7 @@ class WikiHtmlView(wx.html.HtmlWindow):
 
     def onOpenedWiki(self, miscevt):
         self.currentLoadedWikiWord = None
+        self.exporterInstance.clearBlockFragmentCache()
 
         self._updateTempFilePrefPath()
         self.exporterInstance.setWikiDocument(
@@ -356,6 +359,7 @@ class WikiHtmlView(wx.html.HtmlWindow):
 
     def onOptionsChanged(self, miscevt):
         self.outOfSync = True
+        self.exporterInstance.clearBlockFragmentCache()
         self._updateTempFilePrefPath()
         if self.visible:
             self.refresh()
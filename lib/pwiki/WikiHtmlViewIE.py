@@ -149,6 +149,8 @@ class WikiHtmlViewIE(iewin.IEHtmlWindow):
 
         self.exporterInstance.tempFileSet = TempFileSet()
         self._updateTempFilePrefPath()
+        # Only changed blocks of a page are rendered again on refresh
+        self.exporterInstance.enableBlockFragmentCache()
 
         self.exporterInstance.setWikiDocument(
                 self.presenter.getWikiDocument())
@@ -366,6 +368,7 @@ class WikiHtmlViewIE(iewin.IEHtmlWindow):
 
     def onOpenedWiki(self, miscevt):
         self.currentLoadedWikiWord = None
+        self.exporterInstance.clearBlockFragmentCache()
 
         self._updateTempFilePrefPath()
         self.exporterInstance.setWikiDocument(
@@ -379,6 +382,7 @@ class WikiHtmlViewIE(iewin.IEHtmlWindow):
 
     def onOptionsChanged(self, miscevt):
         self.outOfSync = True
+        self.exporterInstance.clearBlockFragmentCache()
         self._updateTempFilePrefPath()
         if self.visible:
             self.refresh()
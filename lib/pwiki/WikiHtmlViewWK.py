@@ -306,6 +306,8 @@ class WikiHtmlViewWK(wx.Panel):
 
         self.exporterInstance.tempFileSet = TempFileSet()
         self._updateTempFilePrefPath()
+        # Only changed blocks of a page are rendered again on refresh
+        self.exporterInstance.enableBlockFragmentCache()
 
         self.exporterInstance.setWikiDocument(
                 self.presenter.getWikiDocument())
@@ -1262,6 +1264,7 @@ class WikiHtmlViewWK(wx.Panel):
 
     def onOpenedWiki(self, miscevt):
         self.currentLoadedWikiWord = None
+        self.exporterInstance.clearBlockFragmentCache()
 
         self._updateTempFilePrefPath()
         self.exporterInstance.setWikiDocument(
@@ -1282,6 +1285,7 @@ class WikiHtmlViewWK(wx.Panel):
 
     def onOptionsChanged(self, miscevt):
         self.outOfSync = True
+        self.exporterInstance.clearBlockFragmentCache()
         self._updateTempFilePrefPath()
         
         # To allow switching vi keys on and off without restart
@@ -93,7 +93,7 @@ __all__ = [
 'ParseSyntaxException', 'ParserElement', 'QuotedString', 'RecursiveGrammarException',   # 'ParseResults',
 'Regex', 'SkipTo', 'StringEnd', 'StringStart', 'Suppress', 'SyntaxNode', 'TerminalNode', 'Token', 'TokenConverter', 'Upcase',
 'White', 'Word', 'WordEnd', 'WordStart', 'ZeroOrMore',
-'alphanums', 'alphas', 'alphas8bit', 'buildSyntaxNode', 'cStyleComment', 'col',   # 'anyCloseTag', 'anyOpenTag'
+'alphanums', 'alphas', 'alphas8bit', 'buildSourceTerminalNode', 'buildSyntaxNode', 'cStyleComment', 'col',   # 'anyCloseTag', 'anyOpenTag'
 'commaSeparatedList', 'commonHTMLEntity', 'countedArray', 'cppStyleComment', 'dblQuotedString',
 'dblSlashComment', 'delimitedList', 'downcaseTokens', 'empty', 'getTokenLength', 'getTokensEndLoc', 'hexnums',
 'htmlComment', 'javaStyleComment', 'keepOriginalText', 'line', 'lineEnd', 'lineStart', 'lineno',
@@ -328,8 +328,22 @@ def getTokenLength(tokList):
 
 
 
+def _internName(name):
+    """
+    Intern bytestring result names so that all nodes share one instance
+    and name comparisons are mostly identity checks.
+    """
+    if type(name) is str:
+        return intern(name)
+    return name
+
+
+
 class SyntaxNode(object):
-    __slots__ = ("pos", "strLength", "name", "__dict__", "__weakref__")
+    # The instance dictionary (for additional attributes like "wikiWord"
+    # set by parse actions) is only created by Python when the first such
+    # attribute is set, so plain nodes don't carry a dictionary.
+    __slots__ = ("pos", "name", "__dict__", "__weakref__")
     def __init__(self, pos, name):
         self.name = name
         self.pos = pos
@@ -359,6 +373,16 @@ class SyntaxNode(object):
     def findNodesForCharPos(self, charPos):
         raise NotImplementedError  # abstract
 
+    def getExtraAttributes(self):
+        """
+        Return dictionary of additional attributes set by parse actions
+        or None if there are none. The dictionary must not be modified.
+        """
+        if _hasAttrDict(self):
+            return self.__dict__
+
+        return None
+
 #     def cloneDeep(self):
 #         raise NotImplementedError  # abstract
 
@@ -388,7 +412,7 @@ class SyntaxNode(object):
 
 
 class NonTerminalNode(SyntaxNode):
-    __slots__ = ("sub",)
+    __slots__ = ("sub", "_calcedStrLength")
 
     def __init__(self, sub, pos, name):
         super(NonTerminalNode, self).__init__(pos, name)
@@ -398,7 +422,7 @@ class NonTerminalNode(SyntaxNode):
 
 
     def __repr__(self):
-        if self.__dict__:
+        if _hasAttrDict(self):
             return "NonTerminalNode" + repr((self.pos, self.strLength, self.name, self.sub, self.__dict__))
         else:
             return "NonTerminalNode" + repr((self.pos, self.strLength, self.name, self.sub))
@@ -648,7 +672,7 @@ class NonTerminalNode(SyntaxNode):
 
 
     def _pprintRecurs(self, ind, inc, result):
-        if self.__dict__:
+        if _hasAttrDict(self):
             result.append(" " * ind + "NtNode(%s, %s, %s, %s, " %
                     (self.pos, self.strLength, repr(self.name), repr(self.__dict__)))
         else:
@@ -713,17 +737,43 @@ class NonTerminalNode(SyntaxNode):
 
 
 class TerminalNode(SyntaxNode):
-    __slots__ = ("text",)
+    """
+    The text of a terminal node is stored as range (_start, strLength) of
+    the string _source. Nodes created by the parser refer to the parsed
+    text this way instead of holding a copy of the substring
+    (see buildSourceTerminalNode()).
+    """
+    __slots__ = ("_source", "_start", "strLength")
 
     def __init__(self, text, pos, name):
-        super(TerminalNode, self).__init__(pos, name)
+        self.name = name
+        self.pos = pos
+        self._source = text
+        self._start = 0
+        self.strLength = len(text)
+
 
-        self.text = text
+    def getText(self):
+        start = self._start
+        return self._source[start:start + self.strLength]
+
+    def setText(self, text):
+        self._source = text
+        self._start = 0
         self.strLength = len(text)
 
+    text = property(getText, setText)
+
+    def getSourceRange(self):
+        """
+        Return tuple (source, start, end) where source[start:end] is the
+        text of the node.
+        """
+        return (self._source, self._start, self._start + self.strLength)
+
 
     def __repr__(self):
-        if self.__dict__:
+        if _hasAttrDict(self):
             return "TerminalNode" + repr((self.pos, self.strLength, self.name, self.text, self.__dict__))
         else:
             return "TerminalNode" + repr((self.pos, self.strLength, self.name, self.text))
@@ -731,9 +781,6 @@ class TerminalNode(SyntaxNode):
     def isTerminal(self):
         return True
 
-    def getText(self):
-        return self.text
-
     def asList(self):
         return [ self ]
     
@@ -744,10 +791,10 @@ class TerminalNode(SyntaxNode):
         return [ self.text ]
         
     def recalcStrLength(self):
-        self.strLength = len(self.text)
+        # strLength is already kept up to date by setText()
+        pass
 
-    def getString(self):
-        return self.text
+    getString = getText
 
     def iterFlatNamed(self, start=0):
         """
@@ -764,7 +811,7 @@ class TerminalNode(SyntaxNode):
 
 
     def _pprintRecurs(self, ind, inc, result):
-        if self.__dict__:
+        if _hasAttrDict(self):
             result.append(" " * ind + "TNode(%s, %s, %s, %s, " %
                     (self.pos, self.strLength, repr(self.name), repr(self.__dict__)))
         else:
@@ -806,6 +853,30 @@ class ParsingState(object):
 
 
 
+def _hasAttrDict(node):
+    """
+    Test if additional attributes were set on node without leaving an
+    instance dictionary behind if it didn't exist yet. Reading
+    node.__dict__ creates an empty one, so it is deleted again.
+    """
+    if node.__dict__:
+        return True
+
+    del node.__dict__
+    return False
+
+
+def buildSourceTerminalNode(source, start, end, pos=-1, name=None):
+    """
+    Create terminal node for source[start:end] which refers to source
+    instead of copying the substring.
+    """
+    node = TerminalNode(source, pos, name)
+    node._start = start
+    node.strLength = end - start
+    return node
+
+
 def buildSyntaxNode(sub, pos=-1, name=None):
     if isinstance(sub, basestring):   # sub.__class__ is unicode:
         return TerminalNode(sub, pos, name)
@@ -939,7 +1010,7 @@ class ParserElement(object):
            integer, and reference it in multiple places with different names.
         """
         newself = self.copy()
-        newself.resultsName = name
+        newself.resultsName = _internName(name)
 #         newself.modalResults = not listAllMatches
         return newself
 
@@ -951,7 +1022,7 @@ class ParserElement(object):
            this is so that the client can define a basic element, such as an
            integer, and reference it in multiple places with different names.
         """
-        self.resultsName = name
+        self.resultsName = _internName(name)
 #         newself.modalResults = not listAllMatches
         return self
 
@@ -2159,6 +2230,14 @@ class CaselessLiteral(Literal):
         self.errmsg = "Expected " + self.name
         #self.myException.msg = self.errmsg
 
+    def getRegex(self):
+        # The inherited case sensitive regex would be wrong and case folding
+        # of re.IGNORECASE differs from comparing upper() results
+        return None
+
+    def isRegexComplete(self):
+        return False
+
     def parseImpl( self, instring, loc, state, doActions=True ):
         if instring[ loc:loc+self.matchLen ].upper() == self.match:
             return loc+self.matchLen, self.returnString
@@ -2287,7 +2366,7 @@ class Word(Token):
             exc.pstr = instring
             return -1, exc
 
-        return loc, instring[start:loc]
+        return loc, buildSourceTerminalNode(instring, start, loc)
 
     def __str__( self ):
         try:
@@ -2371,7 +2450,7 @@ class Regex(Token, NecessaryRegexProvider):
 #         startLoc = loc
         loc = result.end()
 #         d = result.groupdict()
-        ret = buildSyntaxNode(result.group())
+        ret = buildSourceTerminalNode(instring, result.start(), loc)
 #         ret.groupDict = d
 
 #         if d:
@@ -2575,7 +2654,7 @@ class CharsNotIn(Token):
             exc.pstr = instring
             return -1, exc
 
-        return loc, instring[start:loc]
+        return loc, buildSourceTerminalNode(instring, start, loc)
 
     def __str__( self ):
         try:
@@ -2648,7 +2727,7 @@ class White(Token):
             exc.pstr = instring
             return -1, exc
 
-        return loc, instring[start:loc]
+        return loc, buildSourceTerminalNode(instring, start, loc)
 
 
 class _PositionToken(Token):
@@ -3670,7 +3749,8 @@ class FindFirst(ParseExpression):
 
         pTokens = []
         for fn in self.pseudoParseAction:
-            pTokens = fn(instring, startLoc, state, buildSyntaxNode(instring[startLoc:loc], startLoc))
+            pTokens = fn(instring, startLoc, state,
+                    buildSourceTerminalNode(instring, startLoc, loc, startLoc))
 
         if pTokens is None:
             pTokens = []
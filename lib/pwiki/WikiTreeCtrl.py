@@ -1295,6 +1295,25 @@ class FuncPageNode(AbstractNode):
                 self.funcTag == other.funcTag
 
 
+class PendingNode(AbstractNode):
+    """
+    Placeholder root shown while the caches needed to build the tree
+    are loaded in background after opening a wiki
+    """
+    __slots__ = ()
+
+    def __init__(self, tree, parentNode):
+        AbstractNode.__init__(self, tree, parentNode)
+        self.unifiedName = u"helpernode/pending"
+
+    def getNodePresentation(self):
+        style = NodeStyle()
+        style.label = _(u"Loading...")
+        style.icon = u"time"
+        style.hasChildren = False
+        return style
+
+
 
 
 # ----------------------------------------------------------------------
@@ -2053,6 +2072,9 @@ class WikiTreeCtrl(customtreectrl.CustomTreeCtrl):          # wxTreeCtrl):
 #         if selectNode:
 #             doexpand = True
 
+        if self.isPendingRoot():
+            # Tree is built later
+            return False
 
         wikiData = self.pWiki.getWikiData()
         wikiDoc = self.pWiki.getWikiDocument()
@@ -2242,6 +2264,17 @@ class WikiTreeCtrl(customtreectrl.CustomTreeCtrl):          # wxTreeCtrl):
         self.mainTreeMode = False
         self.setRootByUnifiedName(u"helpernode/main/view")
 
+    def setPendingAsRoot(self):
+        """
+        Show only a "Loading..." node until the real root is set
+        """
+        self.setRootByUnifiedName(u"helpernode/pending")
+
+    def isPendingRoot(self):
+        root = self.GetRootItem()
+        return root is not None and root.IsOk() and \
+                isinstance(self.GetPyData(root), PendingNode)
+
 
     def setRootByUnifiedName(self, unifName):
         """
@@ -2273,6 +2306,8 @@ class WikiTreeCtrl(customtreectrl.CustomTreeCtrl):          # wxTreeCtrl):
             return WikiWordNode(self, None, unifName[9:])
         elif unifName == u"helpernode/main/view":
             return MainViewNode(self, None)
+        elif unifName == u"helpernode/pending":
+            return PendingNode(self, None)
         else:
             raise InternalError(
                     "createNodeObjectByUnifiedName called with invalid parameter")
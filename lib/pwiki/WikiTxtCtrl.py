@@ -56,6 +56,7 @@ from . import UserActionCoord, WindowLayout
 from .SearchAndReplace import SearchReplaceOperation
 from . import StringOps
 from . import SpellChecker
+from . import Profiling
 
 # from StringOps import *  # TODO Remove this
 # mbcsDec, uniToGui, guiToUni, \
@@ -79,6 +80,25 @@ except:
 # Python compiler flag for float division
 CO_FUTURE_DIVISION = 0x2000
 
+_NEWLINE_RE = re.compile(u"\n", re.UNICODE)
+
+
+def _findFirstNodeEndingAfter(nodes, charPos):
+    """
+    Binary search in list of consecutive AST nodes for the index of the
+    first node ending after charPos. Returns len(nodes) if there is none.
+    """
+    lo = 0
+    hi = len(nodes)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        node = nodes[mid]
+        if node.pos + node.strLength <= charPos:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
 
 
 
@@ -104,6 +124,14 @@ class WikiTxtCtrl(SearchableScintillaControl):
                 presenter.getMainControl(), parent, ID)
         self.evalScope = None
         self.stylingThreadHolder = ThreadHolder()
+        # Range of visible lines as tuple (first, last) of document line
+        # numbers, set on each paint. Used by the styling thread to style
+        # visible part first
+        self.visibleDocLineRange = (0, 0)
+        # Time when the last styling started and duration until the
+        # visible part was styled (for measurement)
+        self.stylingStartTime = 0
+        self.firstScreenStylingDuration = None
         self.calltipThreadHolder = ThreadHolder()
         self.clearStylingCache()
         self.pageType = "normal"   # The pagetype controls some special editor behaviour
@@ -269,6 +297,7 @@ class WikiTxtCtrl(SearchableScintillaControl):
         wx.stc.EVT_STC_MARGINCLICK(self, ID, self.OnMarginClick)
         wx.stc.EVT_STC_DWELLSTART(self, ID, self.OnDwellStart)
         wx.stc.EVT_STC_DWELLEND(self, ID, self.OnDwellEnd)
+        wx.stc.EVT_STC_PAINTED(self, ID, self.OnPainted)
 
 #         wx.EVT_LEFT_DOWN(self, self.OnClick)
         wx.EVT_MIDDLE_DOWN(self, self.OnMiddleDown)
@@ -1253,6 +1282,10 @@ class WikiTxtCtrl(SearchableScintillaControl):
             self.stylingThreadHolder.setThread(None)
             self.clearStylingCache()
 
+        self.stylingStartTime = time()
+        self.firstScreenStylingDuration = None
+        self._updateVisibleDocLineRange()
+
 
         if textlen < self.presenter.getConfig().getint(
                 "main", "sync_highlight_byte_limit"):
@@ -1577,6 +1610,17 @@ class WikiTxtCtrl(SearchableScintillaControl):
 
 
 
+    def OnPainted(self, evt):
+        evt.Skip()
+        self._updateVisibleDocLineRange()
+
+
+    def _updateVisibleDocLineRange(self):
+        firstLine = self.GetFirstVisibleLine()
+        self.visibleDocLineRange = (self.DocLineFromVisible(firstLine),
+                self.DocLineFromVisible(firstLine + self.LinesOnScreen()))
+
+
     def storeStylingAndAst(self, stylebytes, foldingseq, styleMask=0xff):
         self.stylebytes = stylebytes
 #         self.pageAst = pageAst
@@ -1614,7 +1658,12 @@ class WikiTxtCtrl(SearchableScintillaControl):
                 else:
                     break
 
-            stylebytes = self.processTokens(text, pageAst, threadstop)
+            if threadstop is not DUMBTHREADSTOP and \
+                    len(text) > self._getStylingChunkSize():
+                stylebytes = self.processTokensViewportFirst(text, pageAst,
+                        threadstop)
+            else:
+                stylebytes = self.processTokens(text, pageAst, threadstop)
 
             threadstop.testValidThread()
 
@@ -1638,15 +1687,11 @@ class WikiTxtCtrl(SearchableScintillaControl):
                 threadstop.testValidThread()
 
                 if scTokens.getChildrenCount() > 0:
-                    spellStyleBytes = self.processSpellCheckTokens(text, scTokens,
-                            threadstop)
+                    stylebytes = self.processSpellCheckTokens(text, scTokens,
+                            threadstop, stylebytes)
 
                     threadstop.testValidThread()
 
-                    # TODO: Faster? How?
-                    stylebytes = "".join([chr(ord(a) | ord(b))
-                            for a, b in itertools.izip(stylebytes, spellStyleBytes)])
-
                     self.storeStylingAndAst(stylebytes, None, styleMask=0xff)
                 else:
                     self.storeStylingAndAst(stylebytes, None, styleMask=0xff)
@@ -1721,15 +1766,117 @@ class WikiTxtCtrl(SearchableScintillaControl):
 
 
 
-    def processTokens(self, text, pageAst, threadstop):
+    def _getStylingChunkSize(self):
+        return self.presenter.getConfig().getint("main",
+                "async_highlight_chunkSize", 30000)
+
+
+    def processTokensViewportFirst(self, text, pageAst, threadstop):
+        """
+        Build style bytes of text in chunks of complete lines. The chunk
+        nearest to the currently visible lines is processed next, each
+        chunk is applied to the editor as soon as it is ready.
+        Returns the style bytes of the whole text.
+        """
+        lineStarts = [0]
+        lineStarts.extend(m.end() for m in _NEWLINE_RE.finditer(text))
+
+        chunkSize = self._getStylingChunkSize()
+        chunkRanges = []
+        chunkStart = 0
+        for lineStart in lineStarts:
+            if lineStart - chunkStart >= chunkSize:
+                chunkRanges.append((chunkStart, lineStart))
+                chunkStart = lineStart
+        chunkRanges.append((chunkStart, len(text)))
+
+        chunkBytes = [None] * len(chunkRanges)
+        remaining = range(len(chunkRanges))
+        byteMap = self.getCharToByteMap(text)
+
+        while remaining:
+            firstLine, lastLine = self.visibleDocLineRange
+            visStart = lineStarts[min(firstLine, len(lineStarts) - 1)]
+            visEnd = lineStarts[min(lastLine + 1, len(lineStarts) - 1)]
+
+            def distance(idx):
+                start, end = chunkRanges[idx]
+                return max(start - visEnd, visStart - end, 0)
+
+            idx = min(remaining, key=distance)
+            remaining.remove(idx)
+
+            start, end = chunkRanges[idx]
+            stylebytes = self.processTokens(text, pageAst, threadstop,
+                    start, end)
+            chunkBytes[idx] = stylebytes
+
+            self._applyStylingChunk(stylebytes, byteMap.getBytePos(start))
+
+        return "".join(chunkBytes)
+
+
+    def _applyStylingChunk(self, stylebytes, startBytePos):
+        stylingThread = threading.currentThread()
+
+        def putStyle():
+            if self.stylingThreadHolder.getThread() is not stylingThread:
+                # Styling was restarted meanwhile
+                return
+
+            # Only syntax styles, spell checking indicators follow later
+            self.applyStyling(stylebytes, 0x1f, startBytePos)
+            # Prevent that Scintilla requests the styling of the
+            # remaining (not yet styled) text
+            self.stopStcStyler()
+
+            if self.firstScreenStylingDuration is None:
+                self.firstScreenStylingDuration = time() - \
+                        self.stylingStartTime
+                Profiling.addSpan(u"First screen styling",
+                        self.stylingStartTime,
+                        self.firstScreenStylingDuration)
+
+        wx.CallAfter(putStyle)
+
+
+    def processTokens(self, text, pageAst, threadstop, startCharPos=0,
+            endCharPos=None):
+        """
+        Return style bytes for range startCharPos to endCharPos (or end
+        of text) of text.
+        """
+        if endCharPos is None:
+            endCharPos = len(text)
+
         wikiDoc = self.presenter.getWikiDocument()
         stylebytes = StyleCollector(FormatTypes.Default,
-                text, self.bytelenSct)
+                text, self.bytelenSct, startCharPos, endCharPos,
+                byteMap=self.getCharToByteMap(text))
+
+        def iterChunkNodes(pageAst):
+            # Skip the nodes before the chunk without visiting them
+            if pageAst.isTerminal():
+                for node in pageAst.iterFlatNamed():
+                    yield node
+                return
+
+            sub = pageAst.sub
+            for i in xrange(_findFirstNodeEndingAfter(sub, startCharPos),
+                    len(sub)):
+                node = sub[i]
+                if node.name is not None and node.name != "":
+                    yield node
 
         def process(pageAst, stack):
-            for node in pageAst.iterFlatNamed():
+            for node in iterChunkNodes(pageAst):
                 threadstop.testValidThread()
 
+                if node.pos >= endCharPos:
+                    break
+                if node.pos + node.strLength <= startCharPos:
+                    continue
+
                 styleNo = WikiTxtCtrl._TOKEN_TO_STYLENO.get(node.name)
 
                 if styleNo is not None:
@@ -1790,11 +1937,19 @@ class WikiTxtCtrl(SearchableScintillaControl):
         return stylebytes.value()
 
 
-    def processSpellCheckTokens(self, text, scTokens, threadstop):
-        stylebytes = StyleCollector(0, text, self.bytelenSct)
+    def processSpellCheckTokens(self, text, scTokens, threadstop,
+            baseStyleBytes=None):
+        """
+        Return style bytes with the indicator for unknown words set.
+        If baseStyleBytes (style bytes of the whole text) is given, the
+        indicator is added to them.
+        """
+        stylebytes = StyleCollector(0, text, self.bytelenSct,
+                byteMap=self.getCharToByteMap(text),
+                initialBytes=baseStyleBytes)
         for node in scTokens:
             threadstop.testValidThread()
-            stylebytes.bindStyle(node.pos, node.strLength,
+            stylebytes.addStyleBits(node.pos, node.strLength,
                     wx.stc.STC_INDIC2_MASK)
 
         return stylebytes.value()
@@ -1907,10 +2062,20 @@ class WikiTxtCtrl(SearchableScintillaControl):
         return foldingseq
 
 
-    def applyStyling(self, stylebytes, styleMask=0xff):
-        if len(stylebytes) == self.GetLength():
-            self.StartStyling(0, styleMask)
-            self.SetStyleBytes(len(stylebytes), stylebytes)
+    def applyStyling(self, stylebytes, styleMask=0xff, startBytePos=None):
+        """
+        Apply stylebytes beginning at startBytePos. If startBytePos is None,
+        stylebytes must cover the whole text.
+        """
+        if startBytePos is None:
+            if len(stylebytes) != self.GetLength():
+                return
+            startBytePos = 0
+        elif startBytePos + len(stylebytes) > self.GetLength():
+            return
+
+        self.StartStyling(startBytePos, styleMask)
+        self.SetStyleBytes(len(stylebytes), stylebytes)
 
     def applyFolding(self, foldingseq):
         if foldingseq and self.getFoldingActive() and \
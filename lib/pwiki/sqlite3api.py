@@ -252,6 +252,18 @@ def connect(dsn, *params, **keywords):
 
 
 
+# Commands which begin a transaction if none is open
+BEGIN_COMMANDS = frozenset(("insert", "update", "delete", "replace",
+        "create", "drop", "savepoint"))
+
+# Commands which can be executed inside a transaction without commit
+# before. Savepoints are placed inside a transaction so that releasing
+# them doesn't commit.
+TRANSACTION_COMMANDS = frozenset(("select", "begin", "commit", "rollback",
+        "insert", "update", "delete", "replace", "create", "drop",
+        "savepoint", "release"))
+
+
 class Cursor:
     def __init__(self, conn):
         """
@@ -319,13 +331,10 @@ class Cursor:
             
             if not self.conn._autoCommit:
                 if self.conn.thinConn.get_autocommit():
-                    if cmd in ("insert", "update", "delete", "replace",
-                            "create", "drop"):
+                    if cmd in BEGIN_COMMANDS:
                         self.conn.begin()
                 else:
-                    if cmd not in ("select", "begin", "commit", "rollback",
-                            "insert", "update", "delete", "replace", "create",
-                            "drop"):
+                    if cmd not in TRANSACTION_COMMANDS:
                         self.conn.commit()
             
             self.stmt = self.conn.prepare(sql)
@@ -385,12 +394,46 @@ class Cursor:
             raise Error, "Trying to access a closed cursor"
 
 
-    def executemany(self, sql, seq_of_parameters, *params, **keywords):
+    def executemany(self, sql, seq_of_parameters, bindfct=None, **keywords):
         """
-        Simple implementation
+        Execute a data modifying statement once for each parameter sequence
+        in seq_of_parameters. The statement is prepared only once and
+        reused for all parameter sequences. Result rows are discarded.
         """
-        for pars in seq_of_parameters:
-            self.execute(sql, pars, *params, **keywords)
+        self._reset()
+
+        try:
+            if bindfct is None:
+                bindfct = self.conn.bindfct
+
+            cmd = sql.lstrip().split(" ",1)[0].lower()
+
+            if not self.conn._autoCommit:
+                if self.conn.thinConn.get_autocommit():
+                    if cmd in BEGIN_COMMANDS:
+                        self.conn.begin()
+                else:
+                    if cmd not in TRANSACTION_COMMANDS:
+                        self.conn.commit()
+
+            stmt = self.conn.prepare(sql)
+            thinStmt = stmt[0]
+            changes = 0
+            try:
+                for pars in seq_of_parameters:
+                    if pars:
+                        thinStmt.bind_auto_multi(pars, fctfinder=bindfct)
+                    thinStmt.step()
+                    thinStmt.reset()
+                    changes += self.conn.thinConn.changes()
+            finally:
+                self.conn.putStmtBack(sql, stmt)
+
+            if cmd in ("insert", "update", "delete", "replace"):
+                self.rowcount = changes
+
+        except AttributeError:
+            raise Error, "Trying to access a closed cursor"
             
     def fetchone(self):
         """
@@ -0,0 +1,517 @@
+"""
+Alternative to sqlite3api using Python's built-in sqlite3 module instead of
+the ctypes binding SqliteThin3. Values are converted by the C code of the
+sqlite3 module, which avoids the Python-level bind and column calls of
+SqliteThin3 for each value.
+
+The module provides the part of the sqlite3api interface used by the
+sqlite database backends. Exceptions, transfer objects and Binary are those
+of sqlite3api so that code catching "sqlite.Error" or creating
+"sqlite.Binary" works with both drivers. User-defined functions written
+for SqliteThin3 (taking a context and a sequence of values) can be
+registered unchanged.
+
+With "typeDetect=TYPEDET_FIRST" NULL values are returned as sqlite3api
+does it: the type of a column in the first retrieved row decides the value
+returned for NULL in later rows (0, 0.0 or empty string). Unlike sqlite3api
+non-NULL values are never converted to the type of the first row and a
+NULL in the first row doesn't turn later values of the column into None.
+"""
+
+import sys, sqlite3
+
+import sqlite3api
+from sqlite3api import Warning, Error, InterfaceError, DatabaseError, \
+        ReadOnlyDbError, DataError, OperationalError, IntegrityError, \
+        InternalError, ProgrammingError, NotSupportedError, \
+        TYPEDET_NONE, TYPEDET_FIRST, Binary, escapeForGlob, \
+        addTransObject, getTransObject, delTransObject, \
+        BEGIN_COMMANDS, TRANSACTION_COMMANDS
+
+from .StringOps import utf8Enc, utf8Dec, mbcsDec
+
+
+apilevel = "2.0"
+threadsafety = 0
+paramstyle = "qmark"
+
+
+def _convertError(e):
+    """
+    Return sqlite3api exception matching exception e of the sqlite3 module
+    """
+    msg = str(e)
+    if "readonly" in msg:
+        return ReadOnlyDbError(msg)
+
+    return getattr(sqlite3api, e.__class__.__name__, Error)(msg)
+
+
+def _reraise():
+    """
+    Must be called in an except clause catching sqlite3.Error, raises
+    the corresponding sqlite3api exception
+    """
+    excType, e, tb = sys.exc_info()
+    raise _convertError(e), None, tb
+
+
+def _utf8TextFactory(s):
+    return utf8Dec(s, "replace")[0]
+
+
+def _rowFactory(cursor, row):
+    """
+    Blobs are returned as buffer objects by sqlite3, convert them
+    to bytestrings as SqliteThin3 does.
+    """
+    if buffer in map(type, row):
+        return tuple([str(v) if type(v) is buffer else v for v in row])
+
+    return row
+
+
+# Value returned by sqlite3api for NULL if the column had the key type
+# in the first row (None if it was NULL there, too)
+_NULL_VALUES = {
+        int: 0,
+        long: 0,
+        float: 0.0,
+        str: "",
+        unicode: u""
+    }
+
+
+def _getNullValues(row):
+    """
+    Return tuple of values to use for NULL in rows following row
+    """
+    return tuple([_NULL_VALUES.get(type(v)) for v in row])
+
+
+def _replaceNulls(row, nullValues):
+    if None not in row:
+        return row
+
+    return tuple([nv if v is None else v for v, nv in zip(row, nullValues)])
+
+
+def _bindUtf8(value):
+    t = type(value)
+    if t is str:
+        # Same as DbStructure.bind_mbcsutftext()
+        return mbcsDec(value)[0]
+    if t is unicode or value is None:
+        return value
+    if isinstance(value, Binary):
+        return buffer(value.data)
+
+    return value
+
+
+def _bindRaw(value):
+    if isinstance(value, Binary):
+        return buffer(value.data)
+
+    return value
+
+
+
+class _FunctionValue(object):
+    """
+    Provides the value access methods of SqliteThin3 for an argument of
+    a user-defined function.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def value_text(self):
+        value = self.value
+        if value is None:
+            return ""
+        if type(value) is unicode:
+            return utf8Enc(value)[0]
+
+        return str(value)
+
+    value_blob = value_text
+
+    def value_int(self):
+        if self.value is None:
+            return 0
+
+        return int(self.value)
+
+    value_int64 = value_int
+
+    def value_double(self):
+        if self.value is None:
+            return 0.0
+
+        return float(self.value)
+
+
+
+class _FunctionContext(object):
+    """
+    Collects the result of a user-defined function written for SqliteThin3.
+    """
+    __slots__ = ("result",)
+
+    def __init__(self):
+        self.result = None
+
+    def result_text(self, s):
+        # Bytestrings are passed to sqlite as text without conversion
+        self.result = s
+
+    def result_blob(self, s):
+        self.result = buffer(s)
+
+    def result_int(self, i):
+        self.result = i
+
+    result_int64 = result_int
+    result_double = result_int
+
+    def result_null(self):
+        self.result = None
+
+
+
+def _wrapThinFunction(func):
+    def callFunction(*args):
+        context = _FunctionContext()
+        func(context, [_FunctionValue(a) for a in args])
+        return context.result
+
+    return callFunction
+
+
+
+class Connection:
+    def __init__(self, dsn, *params, **keywords):
+        self.stdConn = None
+        try:
+            # Transactions are started explicitly by Cursor.execute() the
+            # same way as sqlite3api does it
+            self.stdConn = sqlite3.connect(dsn, isolation_level=None,
+                    check_same_thread=False)
+        except sqlite3.Error:
+            _reraise()
+
+        self.stdConn.text_factory = str
+        self.stdConn.row_factory = _rowFactory
+
+        self._autoCommit = False
+        self._inTransaction = False
+        self.bindConv = _bindRaw
+        self.cursorFactory = keywords.get("cursorfactory", Cursor)
+
+
+    def _getStdConn(self):
+        if self.stdConn is None:
+            raise Error, "Trying to access a closed connection"
+
+        return self.stdConn
+
+
+    def close(self):
+        if self.stdConn is not None:
+            try:
+                self.stdConn.close()
+            except sqlite3.Error:
+                _reraise()
+            finally:
+                self.stdConn = None
+
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+
+    def _executeIntern(self, sql):
+        try:
+            self._getStdConn().execute(sql)
+        except sqlite3.Error:
+            _reraise()
+
+
+    def begin(self):
+        self._executeIntern("begin")
+        self._inTransaction = True
+
+    def commit(self):
+        if self._inTransaction:
+            self._executeIntern("commit")
+            self._inTransaction = False
+
+    def rollback(self):
+        if self._inTransaction:
+            self._executeIntern("rollback")
+            self._inTransaction = False
+
+
+    def cursor(self):
+        return self.cursorFactory(self)
+
+
+    def setBindFctFinder(self, fct):
+        """
+        The fctfinders of SqliteThin3 can't be used here. Setting one
+        switches to the UTF-8 conversion of DbStructure.utf8_bind_fctfinder
+        (bytestrings are converted from mbcs, unicode is stored as UTF-8).
+        """
+        if fct is None:
+            self.bindConv = _bindRaw
+        else:
+            self.bindConv = _bindUtf8
+
+    def setColumnFctFinder(self, fct):
+        """
+        Setting a fctfinder switches to UTF-8 decoding of text columns
+        as DbStructure.utf8_column_fctfinder does.
+        """
+        if fct is None:
+            self._getStdConn().text_factory = str
+        else:
+            self._getStdConn().text_factory = _utf8TextFactory
+
+
+    def createFunction(self, funcname, nArg, func, textRep=None):
+        """
+        Register user-defined function func written for SqliteThin3
+        """
+        try:
+            self._getStdConn().create_function(funcname, nArg,
+                    _wrapThinFunction(func))
+        except sqlite3.Error:
+            _reraise()
+
+
+    def setAutoCommit(self, v=True, silent=False):
+        if v and not self._autoCommit and not silent:
+            self.commit()
+
+        self._autoCommit = v
+
+
+    def getAutoCommit(self):
+        return self._autoCommit
+
+
+Connection.Warning = Warning
+Connection.Error = Error
+Connection.InterfaceError = InterfaceError
+Connection.DatabaseError = DatabaseError
+Connection.ReadOnlyDbError = ReadOnlyDbError
+Connection.DataError = DataError
+Connection.OperationalError = OperationalError
+Connection.IntegrityError = IntegrityError
+Connection.InternalError = InternalError
+Connection.ProgrammingError = ProgrammingError
+Connection.NotSupportedError = NotSupportedError
+
+
+
+def connect(dsn, *params, **keywords):
+    return Connection(dsn, *params, **keywords)
+
+
+
+class Cursor:
+    def __init__(self, conn):
+        """
+        conn -- underlying connection
+        """
+        self.conn = conn
+        self.stdCursor = conn._getStdConn().cursor()
+        self.arraysize = 1
+        # Emulate type detection of sqlite3api for NULL values
+        self.typeDetectFirst = False
+        # Tuple of values replacing NULL, None before first row was fetched
+        self.nullValues = None
+
+
+    def close(self):
+        if self.stdCursor is not None:
+            self.stdCursor.close()
+            self.stdCursor = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+
+    def _getStdCursor(self):
+        if self.stdCursor is None:
+            raise Error, "Trying to access a closed cursor"
+
+        return self.stdCursor
+
+
+    def _prepareTransaction(self, cmd):
+        """
+        Begin or commit transaction before executing a command
+        the same way as sqlite3api.Cursor.execute()
+        """
+        conn = self.conn
+        if conn._autoCommit:
+            return
+
+        if not conn._inTransaction:
+            if cmd in BEGIN_COMMANDS:
+                conn.begin()
+        else:
+            if cmd not in TRANSACTION_COMMANDS:
+                conn.commit()
+
+
+    def _trackTransaction(self, cmd, sql):
+        """
+        Track transaction statements executed directly as SQL
+        """
+        if cmd == "begin":
+            self.conn._inTransaction = True
+        elif cmd in ("commit", "end"):
+            self.conn._inTransaction = False
+        elif cmd == "rollback" and " to " not in sql.lower():
+            # "rollback to <savepoint>" keeps the transaction open
+            self.conn._inTransaction = False
+
+
+    def execute(self, sql, parameters=None, bindfct=None, colfct=None,
+            **keywords):
+        """
+        Parameters bindfct and colfct are accepted for compatibility with
+        sqlite3api but ignored. Keyword "typeDetect" only affects how
+        NULL values are returned (see module docstring).
+        """
+        stdCursor = self._getStdCursor()
+        cmd = sql.lstrip().split(" ",1)[0].lower()
+        self._prepareTransaction(cmd)
+
+        self.typeDetectFirst = keywords.get("typeDetect", TYPEDET_NONE) == \
+                TYPEDET_FIRST
+        self.nullValues = None
+
+        try:
+            if parameters:
+                bindConv = self.conn.bindConv
+                stdCursor.execute(sql, [bindConv(p) for p in parameters])
+            else:
+                stdCursor.execute(sql)
+        except sqlite3.Error:
+            _reraise()
+
+        self._trackTransaction(cmd, sql)
+
+
+    def executemany(self, sql, seq_of_parameters, bindfct=None, **keywords):
+        """
+        Execute a data modifying statement once for each parameter sequence
+        in seq_of_parameters. Result rows are discarded.
+        """
+        stdCursor = self._getStdCursor()
+        cmd = sql.lstrip().split(" ",1)[0].lower()
+        self._prepareTransaction(cmd)
+
+        bindConv = self.conn.bindConv
+        try:
+            stdCursor.executemany(sql, ([bindConv(p) for p in pars]
+                    for pars in seq_of_parameters))
+        except sqlite3.Error:
+            _reraise()
+
+
+    def _processRows(self, rows):
+        """
+        Replace NULL values in list of rows if typeDetect was TYPEDET_FIRST
+        """
+        if not self.typeDetectFirst or not rows:
+            return rows
+
+        nullValues = self.nullValues
+        if nullValues is None:
+            nullValues = _getNullValues(rows[0])
+            self.nullValues = nullValues
+            rows[1:] = [_replaceNulls(row, nullValues) for row in rows[1:]]
+        else:
+            rows[:] = [_replaceNulls(row, nullValues) for row in rows]
+
+        return rows
+
+
+    def fetchone(self):
+        try:
+            row = self._getStdCursor().fetchone()
+        except sqlite3.Error:
+            _reraise()
+
+        if row is None or not self.typeDetectFirst:
+            return row
+
+        if self.nullValues is None:
+            self.nullValues = _getNullValues(row)
+            return row
+
+        return _replaceNulls(row, self.nullValues)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+
+        try:
+            return self._processRows(self._getStdCursor().fetchmany(size))
+        except sqlite3.Error:
+            _reraise()
+
+    def fetchall(self):
+        try:
+            return self._processRows(self._getStdCursor().fetchall())
+        except sqlite3.Error:
+            _reraise()
+
+
+    def next(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+
+        return row
+
+    def __iter__(self):
+        return self
+
+
+    def setinputsizes(self, sizes):
+        "Dummy"
+        pass
+
+    def setoutputsize(self, size, column=None):
+        "Dummy"
+        pass
+
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def begin(self):
+        self.conn.begin()
+
+
+    def __getattr__(self, attr):
+        if attr in ("lastrowid", "rowcount", "description"):
+            return getattr(self._getStdCursor(), attr)
+
+        raise AttributeError, "No attribute %s in sqlite3stdapi.Cursor" % attr
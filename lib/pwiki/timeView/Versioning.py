@@ -18,7 +18,7 @@ from ..StringOps import applyBinCompact, getBinCompactForDiff, \
         fileContentToUnicode, BOM_UTF8, formatWxDate
 
 from ..Serialization import serToXmlUnicode, serFromXmlUnicode, serToXmlInt, \
-        serFromXmlInt, iterXmlElementFlat
+        serFromXmlInt, iterXmlElementFlat, findXmlElementFlat
 
 from ..DocPages import AbstractWikiPage
 
@@ -88,6 +88,12 @@ class VersionEntry(object):
         if self.contentEncoding is not None:
             serToXmlUnicode(xmlNode, xmlDoc, u"contentEncoding",
                     self.contentEncoding, replace=True)
+        else:
+            # xmlNode may come from an overview read before, remove
+            # the encoding the packet had then
+            subNode = findXmlElementFlat(xmlNode, u"contentEncoding", False)
+            if subNode is not None:
+                xmlNode.removeChild(subNode)
 
 
 
@@ -138,6 +144,18 @@ class VersionOverview(MiscEventSourceMixin):
         return u"versioning/overview/" + self.unifiedBasePageName
 
 
+    def getPacketUnifiedName(self, versionNumber, unifiedPageName=None):
+        """
+        Return unified name of the data block containing the packet of
+        versionNumber.
+        """
+        if unifiedPageName is None:
+            unifiedPageName = self.unifiedBasePageName
+
+        return u"versioning/packet/versionNo/%s/%s" % (versionNumber,
+                unifiedPageName)
+
+
     def isNotInDatabase(self):
         """
         Can be called before readOverview() to check if the version overview
@@ -203,8 +221,7 @@ class VersionOverview(MiscEventSourceMixin):
             result = [u"versioning/overview/" + unifiedPageName]
 
         for entry in self.versionEntries:
-            result.append(u"versioning/packet/versionNo/%s/%s" % (entry.versionNumber,
-                unifiedPageName))
+            result.append(self.getPacketUnifiedName(entry.versionNumber))
 
         return result
 
@@ -216,31 +233,14 @@ class VersionOverview(MiscEventSourceMixin):
         """
         oldUnifiedPageName = self.unifiedBasePageName
 
-        # First copy to new 
-        for entry in self.versionEntries:
-            oldUnifName = u"versioning/packet/versionNo/%s/%s" % (entry.versionNumber,
-                oldUnifiedPageName)
-            newUnifName = u"versioning/packet/versionNo/%s/%s" % (entry.versionNumber,
-                newUnifiedPageName)
-
-            content = self.wikiDocument.retrieveDataBlock(oldUnifName,
-                    default=None)
-            if content is None:
-                continue
-#                 raise VersioningException(_(u"Versioning data damaged"))
-
-            self.wikiDocument.storeDataBlock(newUnifName, content,
-                    storeHint=self.getStorageHint())
+        # Packets are renamed in place, missing ones are ignored
+        self.wikiDocument.renameDataBlocks([
+                (self.getPacketUnifiedName(entry.versionNumber),
+                self.getPacketUnifiedName(entry.versionNumber,
+                newUnifiedPageName)) for entry in self.versionEntries])
 
         self.writeOverview(newUnifiedPageName)
 
-        # Then delete old data
-        for entry in self.versionEntries:
-            oldUnifName = u"versioning/packet/versionNo/%s/%s" % (entry.versionNumber,
-                oldUnifiedPageName)
-
-            self.wikiDocument.deleteDataBlock(oldUnifName)
-
         oldUnifName = u"versioning/overview/" + oldUnifiedPageName
         self.wikiDocument.deleteDataBlock(oldUnifName)
         
@@ -254,14 +254,7 @@ class VersionOverview(MiscEventSourceMixin):
         Delete all versioning data. This object becomes invalid after
         doing so.
         """
-        for entry in self.versionEntries:
-            unifName = u"versioning/packet/versionNo/%s/%s" % (entry.versionNumber,
-                self.unifiedBasePageName)
-
-            self.wikiDocument.deleteDataBlock(unifName)
-
-        unifName = u"versioning/overview/" + self.unifiedBasePageName
-        self.wikiDocument.deleteDataBlock(unifName)
+        self.wikiDocument.deleteDataBlocks(self.getDependentDataBlocks())
 
         self.invalidate()
         self.fireMiscEventKeys(("deleted version overview",
@@ -287,8 +280,7 @@ class VersionOverview(MiscEventSourceMixin):
         dataBlocks = [db for db in dataBlocks if matOb.match(db)]
         dataBlocks.append(u"versioning/overview/" + unifPageName)
 
-        for db in dataBlocks:
-            wikiDocument.deleteDataBlock(db)
+        wikiDocument.deleteDataBlocks(dataBlocks)
 
 
     def writeOverview(self, unifPageName=None):
@@ -338,6 +330,31 @@ class VersionOverview(MiscEventSourceMixin):
             return Consts.DATABLOCK_STOREHINT_EXTERN
 
 
+    def getCompleteContentEncoding(self):
+        """
+        Return encoding for new complete packets according to option settings.
+        Reverse differential packets are always stored unencoded.
+        """
+        if self.wikiDocument.getWikiConfig().getboolean("main",
+                "versioning_compressComplete", False):
+            return u"zlib"
+        else:
+            return None
+
+
+    def _storeCompletePacket(self, entry, content):
+        """
+        Store content as complete packet for entry and set the entry's
+        differencing and encoding accordingly.
+        """
+        entry.contentDifferencing = u"complete"
+        entry.contentEncoding = self.getCompleteContentEncoding()
+        self.wikiDocument.storeDataBlock(
+                self.getPacketUnifiedName(entry.versionNumber),
+                self.encodeContent(content, entry.contentEncoding),
+                storeHint=self.getStorageHint())
+
+
     @staticmethod
     def decodeContent(encContent, encoding):
         if encoding is None:
@@ -435,30 +452,24 @@ class VersionOverview(MiscEventSourceMixin):
             raise InternalError(u"No base version found for getVersionContent(%s)" %
                     versionNumber)
 
-        unifName = u"versioning/packet/versionNo/%s/%s" % (base.versionNumber,
-                self.unifiedBasePageName)
-
-        content = self.wikiDocument.retrieveDataBlock(unifName, default=DAMAGED)
-        if content is DAMAGED:
-            raise VersioningException(_(u"Versioning data damaged"))
-        elif content is None:
-            raise InternalError(u"Tried to retrieve non-existing "
-                    u"packet for version number %s" % versionNumber)
-
-        content = self.decodeContent(content, entry.contentEncoding)
+        # Fetch all needed packets at once
+        packets = self.wikiDocument.retrieveDataBlocks(
+                [self.getPacketUnifiedName(e.versionNumber)
+                for e in [base] + workList], default=DAMAGED)
 
-        for entry in workList:
-            unifName = u"versioning/packet/versionNo/%s/%s" % (entry.versionNumber,
-                    self.unifiedBasePageName)
-            packet = self.wikiDocument.retrieveDataBlock(unifName, default=None)
-            if content is DAMAGED:
+        content = None
+        for entry in [base] + workList:
+            packet = packets.get(self.getPacketUnifiedName(entry.versionNumber))
+            if packet is DAMAGED:
                 raise VersioningException(_(u"Versioning data damaged"))
-            elif content is None:
+            elif packet is None:
                 raise InternalError(u"Tried to retrieve non-existing "
-                        u"packet for version number %s" % versionNumber)
+                        u"packet for version number %s" % entry.versionNumber)
 
-
-            content = applyBinCompact(content, packet)
+            if content is None:
+                content = self.decodeContent(packet, entry.contentEncoding)
+            else:
+                content = applyBinCompact(content, packet)
 
         return content
 
@@ -493,16 +504,9 @@ class VersionOverview(MiscEventSourceMixin):
         self.maxVersionNumber += 1
         newHeadVerNo = self.maxVersionNumber
 
-        newHeadUnifName = u"versioning/packet/versionNo/%s/%s" % \
-                (newHeadVerNo, self.unifiedBasePageName)
-
-        self.wikiDocument.storeDataBlock(newHeadUnifName, content,
-                storeHint=self.getStorageHint())
-
         entry.versionNumber = newHeadVerNo
         entry.unifiedBasePageName = self.unifiedBasePageName
-        entry.contentDifferencing = "complete"
-        entry.contentEncoding = None
+        self._storeCompletePacket(entry, content)
         self.versionEntries.append(entry)
 
         if len(self.versionEntries) > 1:
@@ -510,8 +514,8 @@ class VersionOverview(MiscEventSourceMixin):
                 prevHeadEntry = self.versionEntries[-2]
                 prevHeadContent = self.getVersionContentRaw(prevHeadEntry.versionNumber)
 
-                unifName = u"versioning/packet/versionNo/%s/%s" % (prevHeadEntry.versionNumber,
-                        self.unifiedBasePageName)
+                unifName = self.getPacketUnifiedName(
+                        prevHeadEntry.versionNumber)
                 diffPacket = getBinCompactForDiff(content, prevHeadContent)
 
                 if len(diffPacket) < len(prevHeadContent):
@@ -533,10 +537,8 @@ class VersionOverview(MiscEventSourceMixin):
 
         if versionNumber == self.versionEntries[0].versionNumber:
             # Delete oldest
-            unifName = u"versioning/packet/versionNo/%s/%s" % (versionNumber,
-                    self.unifiedBasePageName)
-
-            self.wikiDocument.deleteDataBlock(unifName)
+            self.wikiDocument.deleteDataBlock(
+                    self.getPacketUnifiedName(versionNumber))
             del self.versionEntries[0]
             self.fireMiscEventKeys(("deleted version", "changed version overview"))
 
@@ -550,16 +552,10 @@ class VersionOverview(MiscEventSourceMixin):
 
             prevHeadEntry = self.versionEntries[-2]
             newContent = self.getVersionContentRaw(prevHeadEntry.versionNumber)
-            
-            unifName = u"versioning/packet/versionNo/%s/%s" % (prevHeadEntry.versionNumber,
-                    self.unifiedBasePageName)
-            prevHeadEntry.contentDifferencing = "complete"
-            self.wikiDocument.storeDataBlock(unifName, newContent,
-                    storeHint=self.getStorageHint())
-                
-            unifName = u"versioning/packet/versionNo/%s/%s" % (versionNumber,
-                    self.unifiedBasePageName)
-            self.wikiDocument.deleteDataBlock(unifName)
+            self._storeCompletePacket(prevHeadEntry, newContent)
+
+            self.wikiDocument.deleteDataBlock(
+                    self.getPacketUnifiedName(versionNumber))
             del self.versionEntries[-1]
             self.fireMiscEventKeys(("deleted version", "changed version overview"))
 
@@ -0,0 +1,320 @@
+"""
+Copy the content of a wiki database into a fresh database of another type,
+e.g. to move a wiki away from the "original_gadfly" backend without
+a multipage text export and import.
+
+Pages and data blocks (which also hold versioning and trashcan data) are
+read one at a time from the source and written to the destination in
+batches with a commit after each batch, so memory use doesn't grow with the
+wiki size. If the destination supports it, each batch is written with a
+single prepared statement.
+Cache information (relations, attributes, todos, match terms) is not copied,
+it is rebuilt in background when the wiki is opened with the new database.
+"""
+
+import os, os.path, time, hashlib, traceback, shutil
+
+import Consts
+from pwiki.WikiExceptions import *
+
+from .. import Profiling
+from ..StringOps import utf8Enc, pathEnc, formatThroughput
+
+import DbBackendUtils
+
+
+# Number of pages or data blocks written before each commit
+COMMIT_BATCH_SIZE = 200
+
+
+def _checksum(data):
+    if isinstance(data, unicode):
+        data = utf8Enc(data, "replace")[0]
+
+    return hashlib.md5(data).digest()
+
+
+def _getDataDirValue(wikiDocument, dataDir):
+    """
+    Return value for the "data_dir" entry in the wiki configuration, relative
+    if dataDir is in the directory of the configuration file.
+    """
+    if os.path.dirname(os.path.abspath(dataDir)) == \
+            os.path.abspath(wikiDocument.getWikiPath()):
+        return os.path.basename(dataDir)
+
+    return dataDir
+
+
+class _Progress(object):
+    """
+    Wraps the progresshandler (which may be None) and adds amount of
+    copied data and throughput to the messages.
+    """
+    def __init__(self, progresshandler, count):
+        self.progresshandler = progresshandler
+        self.startTime = time.time()
+        self.byteCount = 0
+        self.step = 0
+
+        if self.progresshandler is not None:
+            self.progresshandler.open(count)
+
+    def update(self, msg, byteCount=0):
+        self.byteCount += byteCount
+        self.step += 1
+
+        if self.progresshandler is not None:
+            self.progresshandler.update(self.step, msg + u" (" +
+                    formatThroughput(self.byteCount,
+                    time.time() - self.startTime) + u")")
+
+    def getSummary(self):
+        return formatThroughput(self.byteCount, time.time() - self.startTime)
+
+    def close(self):
+        if self.progresshandler is not None:
+            self.progresshandler.close()
+
+
+
+def _writePages(dstWikiData, pages):
+    """
+    Write pages (list of tuples as taken by importPages()) to destination
+    and commit.
+    """
+    if dstWikiData.checkCapability("bulk page import") is not None:
+        dstWikiData.importPages(pages)
+    else:
+        for word, content, timestamps, readOnly, presentation in pages:
+            dstWikiData.setContent(word, content)
+
+            if timestamps[0] is not None:
+                dstWikiData.setTimestamps(word, timestamps)
+
+            if readOnly:
+                dstWikiData.setWikiWordReadOnly(word, readOnly)
+
+            if presentation:
+                dstWikiData.setPresentationBlock(word, presentation)
+
+    dstWikiData.commit()
+
+
+def _copyPages(srcWikiData, dstWikiData, words, progress):
+    """
+    Copy wiki pages and return dictionary {<page name>: <checksum>}.
+    Pages whose content can't be found are skipped.
+    """
+    checksums = {}
+    pages = []
+
+    for word in words:
+        try:
+            content = srcWikiData.getContent(word)
+        except WikiFileNotFoundException:
+            traceback.print_exc()
+            progress.update(_(u"Copying pages"))
+            continue
+
+        pages.append((word, content, srcWikiData.getTimestamps(word),
+                1 if srcWikiData.getWikiWordReadOnly(word) else 0,
+                srcWikiData.getPresentationBlock(word)))
+        checksums[word] = _checksum(content)
+
+        if len(pages) >= COMMIT_BATCH_SIZE:
+            _writePages(dstWikiData, pages)
+            pages = []
+
+        progress.update(_(u"Copying pages"), len(content))
+
+    _writePages(dstWikiData, pages)
+    return checksums
+
+
+def _writeDataBlocks(dstWikiData, blocksByHint):
+    """
+    Write data blocks to destination and commit.
+    blocksByHint -- dictionary {<store hint>: <list of tuples (unifName,
+        data)>}
+    """
+    batch = dstWikiData.checkCapability("datablock batch") is not None
+
+    for storeHint, blocks in blocksByHint.iteritems():
+        if batch:
+            dstWikiData.storeDataBlocks(blocks, storeHint=storeHint)
+        else:
+            for unifName, data in blocks:
+                dstWikiData.storeDataBlock(unifName, data,
+                        storeHint=storeHint)
+
+    dstWikiData.commit()
+
+
+def _copyDataBlocks(srcWikiData, dstWikiData, unifNames, progress):
+    """
+    Copy data blocks and return dictionary {<unified name>: <checksum>}.
+    """
+    checksums = {}
+    blocksByHint = {}
+    blockCount = 0
+
+    for unifName in unifNames:
+        data = srcWikiData.retrieveDataBlock(unifName, default=None)
+        if data is None:
+            progress.update(_(u"Copying data blocks"))
+            continue
+
+        storeHint = srcWikiData.guessDataBlockStoreHint(unifName)
+        if storeHint is None:
+            storeHint = Consts.DATABLOCK_STOREHINT_INTERN
+
+        blocksByHint.setdefault(storeHint, []).append((unifName, data))
+        blockCount += 1
+        checksums[unifName] = _checksum(data)
+
+        if blockCount >= COMMIT_BATCH_SIZE:
+            _writeDataBlocks(dstWikiData, blocksByHint)
+            blocksByHint = {}
+            blockCount = 0
+
+        progress.update(_(u"Copying data blocks"), len(data))
+
+    _writeDataBlocks(dstWikiData, blocksByHint)
+    return checksums
+
+
+def _verify(dstWikiData, pageChecksums, blockChecksums, progress):
+    """
+    Compare page names, data block names and checksums of the destination
+    with those read from the source, raises WikiDataException on difference.
+    """
+    dstWords = dstWikiData.getAllDefinedWikiPageNames()
+    if set(dstWords) != set(pageChecksums):
+        raise WikiDataException(_(u"Migration failed: Page count of "
+                u"new database is %i instead of %i") %
+                (len(dstWords), len(pageChecksums)))
+
+    for word in dstWords:
+        if _checksum(dstWikiData.getContent(word)) != pageChecksums[word]:
+            raise WikiDataException(_(u"Migration failed: Content of "
+                    u"page '%s' differs in new database") % word)
+
+        progress.update(_(u"Verifying pages"))
+
+    for unifName, checksum in blockChecksums.iteritems():
+        data = dstWikiData.retrieveDataBlock(unifName, default=None)
+        if data is None or _checksum(data) != checksum:
+            raise WikiDataException(_(u"Migration failed: Data block "
+                    u"'%s' differs in new database") % unifName)
+
+        progress.update(_(u"Verifying data blocks"))
+
+
+
+def _removePartialDataDir(dataDir, keepDir):
+    """
+    Remove what a failed migration left in dataDir which was empty or didn't
+    exist before. The directory itself is only kept if keepDir is True.
+    """
+    dataDir = pathEnc(dataDir)
+    try:
+        if not os.path.exists(dataDir):
+            return
+
+        if not keepDir:
+            shutil.rmtree(dataDir)
+            return
+
+        for name in os.listdir(dataDir):
+            path = os.path.join(dataDir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    except (IOError, OSError):
+        traceback.print_exc()
+
+
+def migrateWikiData(wikiDocument, dstDbtype, dstDataDir, progresshandler):
+    """
+    Copy the database of wikiDocument into a new database of type dstDbtype
+    in directory dstDataDir which must not exist or be empty.
+    On success the wiki configuration is changed to use the new database,
+    the wiki must be closed and opened again afterwards. The old database
+    is left untouched.
+
+    progresshandler -- Object, fulfilling the
+        PersonalWikiFrame.GuiProgressHandler protocol or None
+    Returns unistring with amount of copied data and throughput.
+    """
+    wikiDataFactory, createWikiDbFunc = DbBackendUtils.getHandler(dstDbtype)
+    if wikiDataFactory is None:
+        raise NoDbHandlerException(
+                _(u"Data handler %s not available") % dstDbtype)
+
+    if os.path.exists(pathEnc(dstDataDir)) and \
+            len(os.listdir(pathEnc(dstDataDir))) > 0:
+        raise WikiDBExistsException(
+                _(u"Directory for new database is not empty"))
+
+    wikiConfig = wikiDocument.getWikiConfig()
+    oldDbtype = wikiConfig.get("main", "wiki_database_type", u"")
+
+    srcWikiData = wikiDocument.getWikiData()
+    srcWikiData.commit()
+
+    # On failure the new database is removed again so the migration can
+    # be retried with the same directory
+    dataDirExisted = os.path.exists(pathEnc(dstDataDir))
+    try:
+        createWikiDbFunc(wikiDocument.getWikiName(), dstDataDir, False)
+        dstWikiData = wikiDataFactory(wikiDocument, dstDataDir,
+                wikiDocument.getWikiTempDir())
+    except:
+        _removePartialDataDir(dstDataDir, dataDirExisted)
+        raise
+
+    success = False
+    try:
+        # Sets "wiki_database_type" in wiki configuration, restored below
+        # if migration fails
+        dstWikiData.connect()
+
+        words = srcWikiData.getAllDefinedWikiPageNames()
+        unifNames = srcWikiData.getDataBlockUnifNamesStartingWith(u"")
+
+        progress = _Progress(progresshandler,
+                2 * (len(words) + len(unifNames)))
+        try:
+            pageChecksums = _copyPages(srcWikiData, dstWikiData, words,
+                    progress)
+            blockChecksums = _copyDataBlocks(srcWikiData, dstWikiData,
+                    unifNames, progress)
+            summary = progress.getSummary()
+
+            _verify(dstWikiData, pageChecksums, blockChecksums, progress)
+
+            Profiling.addSpan(u"Database migration to %s (%s)" %
+                    (dstDbtype, summary), progress.startTime,
+                    time.time() - progress.startTime)
+        finally:
+            progress.close()
+
+        success = True
+    finally:
+        try:
+            dstWikiData.close()
+        except:
+            traceback.print_exc()
+
+        if not success:
+            wikiConfig.set("main", "wiki_database_type", oldDbtype)
+            _removePartialDataDir(dstDataDir, dataDirExisted)
+
+    wikiConfig.set("main", "wiki_database_type", dstDbtype)
+    wikiConfig.set("wiki_db", "data_dir",
+            _getDataDirValue(wikiDocument, dstDataDir))
+    wikiConfig.save()
+
+    return summary
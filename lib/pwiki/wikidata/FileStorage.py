@@ -3,7 +3,7 @@ Handles the storage of external files (e.g. images, but also other
 data or programs)
 """
 
-import os, os.path, traceback, glob
+import os, os.path, traceback, marshal, hashlib, threading
 
 import re
 from pwiki.StringOps import createRandomString, pathEnc
@@ -20,6 +20,271 @@ _FILESPLITPAT = re.compile(ur"^(?P<name>\.*[^.]+)(?P<suffix>.*)$",
 
 
 
+class FileStorageIndex(object):
+    """
+    Persistent index of the files directly contained in the file storage
+    directory. It maps file names to (size, modification time, content
+    hash) and file sizes to file names. Hashes are computed lazily when
+    a file with the same size is searched. Entries are verified by size and
+    modification time before use, new or deleted files are detected by the
+    modification time of the storage directory.
+    """
+
+    # Increase if the format of the index file changes
+    FORMAT_VERSION = 1
+
+    def __init__(self, storagePath, indexPath):
+        """
+        storagePath -- directory path of file storage
+        indexPath -- path of file to store index in or None if the index
+                should not be stored
+        """
+        self.storagePath = storagePath
+        self.indexPath = indexPath
+        self.lock = threading.RLock()
+
+        # Dictionary {<file name>: [<size>, <mod. time>, <hash or None>]}
+        self.entries = None
+        # Dictionary {<size>: <set of file names>}
+        self.sizeNames = None
+        # Modification time of the storage directory when entries were
+        # synchronized with its content
+        self.dirMtime = None
+        self.modified = False
+
+
+    def _readIndex(self):
+        self.entries = {}
+        self.dirMtime = None
+        self.modified = False
+
+        if self.indexPath is not None and \
+                os.path.exists(pathEnc(self.indexPath)):
+            try:
+                f = open(pathEnc(self.indexPath), "rb")
+                try:
+                    version, dirMtime, entries = marshal.loads(f.read())
+                finally:
+                    f.close()
+
+                if version == self.FORMAT_VERSION:
+                    self.entries = entries
+                    self.dirMtime = dirMtime
+            except (IOError, OSError, ValueError, EOFError, TypeError):
+                traceback.print_exc()
+
+        self.sizeNames = {}
+        for name, entry in self.entries.iteritems():
+            self.sizeNames.setdefault(entry[0], set()).add(name)
+
+
+    def writeIndex(self):
+        """
+        Write index file if index was modified.
+        """
+        with self.lock:
+            if self.indexPath is None or not self.modified:
+                return
+
+            try:
+                data = marshal.dumps((self.FORMAT_VERSION, self.dirMtime,
+                        self.entries), 2)
+                f = open(pathEnc(self.indexPath), "wb")
+                try:
+                    f.write(data)
+                finally:
+                    f.close()
+
+                self.modified = False
+            except (IOError, OSError, ValueError):
+                traceback.print_exc()
+
+
+    def _setEntry(self, name, size, mtime, contentHash=None):
+        self._removeEntry(name)
+        self.entries[name] = [size, mtime, contentHash]
+        self.sizeNames.setdefault(size, set()).add(name)
+        self.modified = True
+
+
+    def _removeEntry(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+
+        names = self.sizeNames[entry[0]]
+        names.discard(name)
+        if len(names) == 0:
+            del self.sizeNames[entry[0]]
+
+        self.modified = True
+
+
+    def _sync(self):
+        """
+        Read index if necessary and update it if the directory content changed.
+        """
+        if self.entries is None:
+            self._readIndex()
+
+        try:
+            dirMtime = os.stat(pathEnc(self.storagePath)).st_mtime
+        except OSError:
+            # No storage directory
+            if len(self.entries) > 0:
+                for name in self.entries.keys():
+                    self._removeEntry(name)
+            return
+
+        if dirMtime == self.dirMtime:
+            return
+
+        names = set(os.listdir(self.storagePath))
+
+        for name in self.entries.keys():
+            if name not in names:
+                self._removeEntry(name)
+
+        for name in names:
+            if name in self.entries:
+                continue
+            path = os.path.join(self.storagePath, name)
+            try:
+                if not os.path.isfile(pathEnc(path)):
+                    continue
+                st = os.stat(pathEnc(path))
+            except OSError:
+                continue
+
+            self._setEntry(name, st.st_size, st.st_mtime)
+
+        self.dirMtime = dirMtime
+        self.modified = True
+
+
+    def getFileNames(self):
+        """
+        Return set of names of the files directly in the storage directory.
+        """
+        with self.lock:
+            self._sync()
+            return set(self.entries.iterkeys())
+
+
+    def getLoadedFileNames(self):
+        """
+        Return set of names of the files directly in the storage directory
+        if the index is already loaded and up to date, None otherwise.
+        Unlike getFileNames() this never reads or synchronizes the index.
+        """
+        with self.lock:
+            if self.entries is None:
+                return None
+            try:
+                dirMtime = os.stat(pathEnc(self.storagePath)).st_mtime
+            except OSError:
+                return None
+            if dirMtime != self.dirMtime:
+                return None
+
+            return set(self.entries.iterkeys())
+
+
+    def _getVerifiedEntry(self, name):
+        """
+        Return entry for name after checking it against the file. Returns
+        None if the file doesn't exist anymore.
+        """
+        path = os.path.join(self.storagePath, name)
+        try:
+            st = os.stat(pathEnc(path))
+        except OSError:
+            self._removeEntry(name)
+            return None
+
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime:
+            self._setEntry(name, st.st_size, st.st_mtime)
+            entry = self.entries[name]
+
+        return entry
+
+
+    def getNamesBySize(self, size):
+        """
+        Return list of file names with given size (according to index).
+        """
+        with self.lock:
+            self._sync()
+            return list(self.sizeNames.get(size, ()))
+
+
+    def getVerifiedStat(self, name):
+        """
+        Return tuple (size, mtime) of file name or None if not existing.
+        """
+        with self.lock:
+            entry = self._getVerifiedEntry(name)
+            if entry is None:
+                return None
+
+            return (entry[0], entry[1])
+
+
+    def getHash(self, name):
+        """
+        Return content hash of file name, compute it if necessary. Returns
+        None if file doesn't exist anymore.
+        """
+        with self.lock:
+            entry = self._getVerifiedEntry(name)
+            if entry is None:
+                return None
+
+            if entry[2] is None:
+                entry[2] = calcFileHash(os.path.join(self.storagePath, name))
+                self.modified = True
+
+            return entry[2]
+
+
+    def addFile(self, name, contentHash=None):
+        """
+        Add or update entry for file name which was just created in the
+        storage. contentHash is the known hash of its content or None.
+        """
+        with self.lock:
+            if self.entries is None:
+                self._readIndex()
+
+            path = os.path.join(self.storagePath, name)
+            try:
+                st = os.stat(pathEnc(path))
+            except OSError:
+                self._removeEntry(name)
+                return
+
+            self._setEntry(name, st.st_size, st.st_mtime, contentHash)
+
+
+
+def calcFileHash(path):
+    """
+    Return hex digest of SHA-1 hash of content of file denoted by path
+    """
+    h = hashlib.sha1()
+    f = open(pathEnc(path), "rb")
+    try:
+        while True:
+            block = f.read(1024 * 1024)
+            if len(block) == 0:
+                return h.hexdigest()
+            h.update(block)
+    finally:
+        f.close()
+
+
+
 class FileStorage:
     """
     This class handles storing of files (especially finding names and copying)
@@ -27,15 +292,18 @@ class FileStorage:
     component, so it must be replaced by a new instance if a new wiki is loaded.
     """
     
-    def __init__(self, wikiDataManager, storagePath):
+    def __init__(self, wikiDataManager, storagePath, indexPath=None):
         """
         mainControl -- PersonalWikiFrame instance
         wikiDataManager -- WikiDataManager instance of current wiki
         filePath -- directory path where new files should be stored
                 (doesn't have to exist already)
+        indexPath -- path of file to store the content index of the storage
+                in or None if it shouldn't be stored
         """
         self.wikiDataManager = wikiDataManager
         self.storagePath = storagePath
+        self.index = FileStorageIndex(storagePath, indexPath)
         
         # Conditions for identity test
         self.modDateMustMatch = False  # File is only identical if modification
@@ -65,6 +333,12 @@ class FileStorage:
     def getStoragePath(self):
         return self.storagePath
 
+    def getIndex(self):
+        return self.index
+
+    def close(self):
+        self.index.writeIndex()
+
 
     def _storageExists(self):
         """
@@ -79,126 +353,62 @@ class FileStorage:
         if not self._storageExists():
             os.makedirs(self.storagePath)
 
-#     def _preTestIdentical(self, path1, path2):
-#         """
-#         Preliminary test for identity of two files denoted by path1 and path2.
-#         This test is fast, but not fully reliable. If the function returns
-#         False, the files are definitely different. If it returns True,
-#         a call to _isIdentical is needed to 
-#         """
-
-#         This function assumes that _preTestIdentical() was already called for
-#         these pathes and returned True.
-
-    def _preTestIdentity(self, destpath, srcfname, srcstat):
-        """
-        Preliminary test if the destination file denoted by destpath and
-        the source described by its name srcfnam without path and
-        its stats COULD BE identical.
-        If the function returns False, they are definitely different,
-        if it returns True, further tests are necessary.
+    def _findIdentical(self, srcPath):
         """
-        if not os.path.isfile(destpath):
-            # Must be existing file
-            return False
-
-        destfname = os.path.basename(destpath)
-
-        if os.path.splitext(srcfname)[1] != os.path.splitext(destfname)[1]:
-            # file suffix must match always
-            return False
-
-        if self.filenameMustMatch and srcfname != destfname:
-            return False
-
-        deststat = os.stat(pathEnc(destpath))
-        
-        if deststat.st_size != srcstat.st_size:
-            # Size must match always
-            return False
-
-        if self.modDateMustMatch and deststat.st_mtime != srcstat.st_mtime:
-            return False
-            
-        # This means it COULD BE identical according to the quick tests
-        return True
-
-
-    def _getCandidates(self, srcPath):
-        """
-        Find possible candidates for detailed identity check. The file storage
-        must exist already.
+        Return path of a file in the storage identical to the one denoted
+        by srcPath according to the settings of the object or None if not
+        found. Candidates are taken from the index, files with the same
+        name are preferred, then files with same modification date.
+        The file storage must exist already.
         srcPath -- Must be a path to an existing file
         """
         srcfname = os.path.basename(srcPath)
         srcstat = os.stat(pathEnc(srcPath))
+        ext = os.path.splitext(srcfname)[1]
 
-        
-        ccSameName = set()     # candidate category: same filename
-                                    # (only one possible entry)
-        ccSameMod = set()     # candidate category: same mod. date
-        ccElse = set()     # candidate category: everything else
-
-        samenamepath = os.path.join(self.storagePath, srcfname)
-        if self._preTestIdentity(samenamepath, srcfname, srcstat):
-            ccSameName.add(samenamepath)
+        candidates = []
+        for name in self.index.getNamesBySize(srcstat.st_size):
+            if os.path.splitext(name)[1] != ext:
+                # file suffix must match always
+                continue
 
-        if self.filenameMustMatch:
-            # No other candidates possible
-            return list(ccSameName)
+            if self.filenameMustMatch and name != srcfname:
+                continue
 
+            stat = self.index.getVerifiedStat(name)
+            if stat is None or stat[0] != srcstat.st_size:
+                continue
 
-        ext = os.path.splitext(srcPath)[1]
-        for p in glob.glob(os.path.join(self.storagePath, "*" + ext)):
-            if p == samenamepath:
-                # Already tested above
+            sameMod = stat[1] == srcstat.st_mtime
+            if self.modDateMustMatch and not sameMod:
                 continue
 
-            if self._preTestIdentity(p, srcfname, srcstat):
-                deststat = os.stat(pathEnc(p))
-                if deststat.st_mtime == srcstat.st_mtime:
-                    ccSameMod.add(p)
-                else:
-                    ccElse.add(p)
+            if name == srcfname:
+                category = 0
+            elif sameMod:
+                category = 1
+            else:
+                category = 2
 
-        return list(ccSameName) + list(ccSameMod) + list(ccElse)
+            candidates.append((category, name, sameMod))
 
+        if len(candidates) == 0:
+            return None
 
-    def _isIdentical(self, path1, path2):
-        """
-        Checks if the files denoted by path1 and path2 are identical according
-        to the settings of the object.
+        candidates.sort()
 
-        The files must have passed the preliminary test by _preTestIdentity().
-        """
-        
-        stat1 = os.stat(pathEnc(path1))
-        stat2 = os.stat(pathEnc(path2))
+        srcHash = None
+        for category, name, sameMod in candidates:
+            if self.modDateIsEnough and sameMod:
+                return os.path.join(self.storagePath, name)
 
-        if self.modDateIsEnough and stat1.st_mtime == stat2.st_mtime:
-            return True
+            if srcHash is None:
+                srcHash = calcFileHash(srcPath)
 
-        # End of fast tests, now the whole content must be compared
-        
-        file1 = file(path1, "rb")    
-        file2 = file(path2, "rb")
-        
-        try:
-            while True:
-                block1 = file1.read(1024 * 1024)
-                block2 = file2.read(1024 * 1024)
-                if len(block1) == 0 and len(block2) == 0:
-                    # EOF
-                    return True
-                if len(block1) != len(block2):
-                    raise FSException(_(u"File compare error, file not readable or "
-                            u"changed during compare"))
-
-                if block1 != block2:
-                    return False
-        finally:
-            file2.close()
-            file1.close()
+            if self.index.getHash(name) == srcHash:
+                return os.path.join(self.storagePath, name)
+
+        return None
 
 
     def findDestPath(self, srcPath):
@@ -218,9 +428,10 @@ class FileStorage:
 
         self._ensureStorage()
         
-        for c in self._getCandidates(srcPath):
-            if self._isIdentical(srcPath, c):
-                return (c, True)
+        if os.path.isfile(srcPath):
+            identPath = self._findIdentical(srcPath)
+            if identPath is not None:
+                return (identPath, True)
 
         # No identical file found, so find a not yet used name for the new file.
         fname = os.path.basename(srcPath)
@@ -303,6 +514,8 @@ class FileStorage:
         else:
             self.copyFile(srcPath, destpath)
 
+        self.index.addFile(os.path.basename(destpath))
+
         return destpath
 
     @staticmethod
@@ -0,0 +1,283 @@
+"""
+In-memory trigram index over the wikiwordmatchterms table, used by the
+database backends to answer getWikiWordMatchTermsWith() without scanning
+the table for each keystroke in the "Open wiki word" dialog.
+"""
+
+import threading, heapq
+from functools import cmp_to_key
+
+import Consts
+
+
+
+def _iterTrigrams(normTerm):
+    for i in xrange(len(normTerm) - 2):
+        yield normTerm[i:i + 3]
+
+
+
+class MatchTermIndex(object):
+    """
+    Holds all match terms as tuples (matchterm, type, word, firstcharpos,
+    charlength) together with their lowercased form and a dictionary from
+    each trigram of the lowercased form to the ids of the terms containing it.
+    """
+    def __init__(self, rows=()):
+        self.lock = threading.RLock()
+
+        self.nextId = 0
+        # Dictionary {<id>: <term tuple>}
+        self.terms = {}
+        # Dictionary {<id>: <lowercased match term>}
+        self.normTerms = {}
+        # Dictionary {<term tuple>: <list of ids>} (the table may contain
+        # duplicate rows)
+        self.termIds = {}
+        # Dictionary {<wiki word>: <set of ids>}
+        self.wordIds = {}
+        # Dictionary {<trigram>: <set of ids>}
+        self.trigrams = {}
+
+        # Last search string and list of ids found for it. If the next search
+        # string contains the last one, only these ids must be checked
+        self.lastSearch = None
+        self.lastFoundIds = None
+
+        self.addTerms(rows)
+
+
+    def addTerms(self, rows):
+        with self.lock:
+            self.lastSearch = None
+            self.lastFoundIds = None
+
+            for row in rows:
+                row = tuple(row)
+                termId = self.nextId
+                self.nextId += 1
+
+                normTerm = row[0].lower()   # TODO More general normcase function
+                self.terms[termId] = row
+                self.normTerms[termId] = normTerm
+                self.termIds.setdefault(row, []).append(termId)
+                self.wordIds.setdefault(row[2], set()).add(termId)
+                for tri in _iterTrigrams(normTerm):
+                    self.trigrams.setdefault(tri, set()).add(termId)
+
+
+    def _removeId(self, termId):
+        row = self.terms.pop(termId)
+        normTerm = self.normTerms.pop(termId)
+
+        ids = self.termIds[row]
+        ids.remove(termId)
+        if len(ids) == 0:
+            del self.termIds[row]
+
+        ids = self.wordIds[row[2]]
+        ids.discard(termId)
+        if len(ids) == 0:
+            del self.wordIds[row[2]]
+
+        for tri in _iterTrigrams(normTerm):
+            ids = self.trigrams.get(tri)
+            if ids is None:
+                continue
+            ids.discard(termId)
+            if len(ids) == 0:
+                del self.trigrams[tri]
+
+
+    def removeTerms(self, rows):
+        """
+        Remove all occurrences of each term tuple in rows (as an SQL delete
+        statement does)
+        """
+        with self.lock:
+            self.lastSearch = None
+            self.lastFoundIds = None
+
+            for row in rows:
+                ids = self.termIds.get(tuple(row))
+                if ids:
+                    for termId in ids[:]:
+                        self._removeId(termId)
+
+
+    def removeWordTerms(self, word, syncUpdate=False):
+        """
+        Remove all terms of word which have (syncUpdate is True) or
+        don't have (syncUpdate is False) the
+        Consts.WIKIWORDMATCHTERMS_TYPE_SYNCUPDATE flag set.
+        """
+        with self.lock:
+            self.lastSearch = None
+            self.lastFoundIds = None
+
+            for termId in list(self.wordIds.get(word, ())):
+                isSync = bool(self.terms[termId][1] &
+                        Consts.WIKIWORDMATCHTERMS_TYPE_SYNCUPDATE)
+                if isSync == syncUpdate:
+                    self._removeId(termId)
+
+
+    def _getCandidateIds(self, normStr):
+        """
+        Return iterable of ids which may contain normStr.
+        """
+        if self.lastSearch is not None and normStr.find(self.lastSearch) != -1:
+            # Refinement of last search
+            return self.lastFoundIds
+
+        if len(normStr) < 3:
+            return self.normTerms.iterkeys()
+
+        idSets = []
+        for tri in set(_iterTrigrams(normStr)):
+            ids = self.trigrams.get(tri)
+            if ids is None:
+                return ()
+            idSets.append(ids)
+
+        idSets.sort(key=len)
+        return idSets[0].intersection(*idSets[1:])
+
+
+    def findTerms(self, normStr):
+        """
+        Return tuple (startingWith, containing) of two lists of term tuples,
+        the first with terms starting with normStr, the second with terms
+        containing it elsewhere. normStr must be lowercase.
+        """
+        with self.lock:
+            normTerms = self.normTerms
+            foundIds = [termId for termId in self._getCandidateIds(normStr)
+                    if normStr in normTerms[termId]]
+
+            self.lastSearch = normStr
+            self.lastFoundIds = foundIds
+
+            startingWith = []
+            containing = []
+            for termId in foundIds:
+                if normTerms[termId].startswith(normStr):
+                    startingWith.append(self.terms[termId])
+                else:
+                    containing.append(self.terms[termId])
+
+            return startingWith, containing
+
+
+
+def _getMatchTermCmp(collator, orderBy, descend):
+    """
+    Return compare function for match term tuples which gives the same
+    order as sortMatchTerms() (except for the order of equal elements)
+    """
+    if orderBy == "visited":
+        if descend:
+            def termCmp(left, right):
+                return cmp(right[5], left[5]) or \
+                        collator.strcollByFirst(left, right)
+        else:
+            def termCmp(left, right):
+                return cmp(left[5], right[5]) or \
+                        collator.strcollByFirst(left, right)
+    else:
+        if descend:
+            def termCmp(left, right):
+                return collator.strcollByFirst(right, left)
+        else:
+            termCmp = collator.strcollByFirst
+
+    return termCmp
+
+
+def sortMatchTerms(terms, collator, orderBy=None, descend=False):
+    """
+    Sort list of match term tuples inplace by match term or (if orderBy is
+    "visited") by visited date in the sixth tuple element.
+    """
+    collator.sortByFirst(terms)
+
+    if orderBy == "visited":
+        terms.sort(key=lambda k: k[5], reverse=descend)
+    else:
+        if descend:
+            terms.reverse()
+
+
+
+class LazySortedMatchTerms(object):
+    """
+    Read-only sequence of the match term tuples of one or more lists
+    following each other, each list sorted as by sortMatchTerms().
+    The terms are only sorted as far as items are accessed, so e.g. a list
+    box can show the first terms of a large result without sorting all of
+    them.
+    """
+    def __init__(self, termLists, collator, orderBy=None, descend=False):
+        keyFct = cmp_to_key(_getMatchTermCmp(collator, orderBy, descend))
+        # Equal elements keep the order a full sort would give them
+        if orderBy != "visited" and descend:
+            tieSign = -1
+        else:
+            tieSign = 1
+
+        self.length = 0
+        self.sortedTerms = []
+        # List of heaps of tuples (<sort key>, <tie breaker>, <term tuple>),
+        # one for each term list not sorted completely yet
+        self.heaps = []
+        for terms in termLists:
+            heap = [(keyFct(term), tieSign * i, term)
+                    for i, term in enumerate(terms)]
+            heapq.heapify(heap)
+            self.heaps.append(heap)
+            self.length += len(heap)
+
+        self.heaps.reverse()
+
+
+    def _sortUpTo(self, count):
+        """
+        Ensure that the first count terms are sorted
+        """
+        sortedTerms = self.sortedTerms
+        heaps = self.heaps
+        while len(sortedTerms) < count and heaps:
+            heap = heaps[-1]
+            if not heap:
+                heaps.pop()
+                continue
+
+            sortedTerms.append(heapq.heappop(heap)[2])
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self.length)
+            if step > 0:
+                self._sortUpTo(stop)
+            else:
+                self._sortUpTo(start + 1)
+            return self.sortedTerms[idx]
+
+        if idx < 0:
+            idx += self.length
+        if idx < 0 or idx >= self.length:
+            raise IndexError("match term index out of range")
+
+        self._sortUpTo(idx + 1)
+        return self.sortedTerms[idx]
+
+
+    def __iter__(self):
+        for i in xrange(self.length):
+            yield self[i]
+
@@ -10,7 +10,7 @@ import os, os.path, time, shutil, traceback, ConfigParser
 
 import re
 
-from wx import GetApp
+from wx import GetApp, CallAfter
 
 import Consts
 from pwiki.WikiExceptions import *
@@ -20,6 +20,7 @@ from ..Utilities import TimeoutRLock, SingleThreadExecutor, DUMBTHREADSTOP
 from ..MiscEvent import MiscEventSourceMixin
 
 from .. import ParseUtilities
+from .. import Profiling
 from .. import StringOps
 from ..StringOps import mbcsDec, re_sub_escape, pathEnc, pathDec, \
         unescapeWithRe, strToBool, pathnameFromUrl, urlFromPathname, \
@@ -35,6 +36,8 @@ from ..SearchAndReplace import SearchReplaceOperation
 
 from .. import SpellChecker
 from .. import Trashcan
+from ..InsertionCache import InsertionResultCache
+from ..PageAstCache import PageAstCache
 
 import DbBackendUtils, FileStorage
 
@@ -412,6 +415,8 @@ class WikiDataManager(MiscEventSourceMixin):
         self.funcPageDict = WeakValueDictionary()
         
         self.updateExecutor = SingleThreadExecutor(4)
+        # True as soon as the caches filled by warmCaches() are available
+        self.cachesWarm = False
         self.pageRetrievingLock = TimeoutRLock(Consts.DEADBLOCKTIMEOUT)
         self.wikiWideHistory = WikiWideHistory(self)
         
@@ -427,6 +432,9 @@ class WikiDataManager(MiscEventSourceMixin):
         self.dbtype = wikidhName
 
         self.whooshIndex = None
+        self.insertionResultCache = None
+        self.pageAstCache = None
+        self.fileStorage = None
 
         self.refCount = 1
 
@@ -468,7 +476,14 @@ class WikiDataManager(MiscEventSourceMixin):
         fileStorDir = os.path.join(os.path.dirname(self.getWikiConfigPath()),
                 "files")
 
-        self.fileStorage = FileStorage.FileStorage(self, fileStorDir)
+        if self.isReadOnlyEffect():
+            fileStorIndexPath = None
+        else:
+            fileStorIndexPath = os.path.join(self.getDataDir(),
+                    u"filestorageindex")
+
+        self.fileStorage = FileStorage.FileStorage(self, fileStorDir,
+                fileStorIndexPath)
 
         # Set file storage according to configuration
         fs = self.fileStorage
@@ -534,6 +549,16 @@ class WikiDataManager(MiscEventSourceMixin):
 
         self.updateExecutor.start()
 
+        if self.recoveryMode:
+            # Caches are filled on demand only
+            self.cachesWarm = True
+        elif GetApp().getGlobalConfig().getboolean("main",
+                "wikiOpen_deferCacheLoading", True):
+            # The last visited page can be shown before the caches are filled
+            self._pushCacheWarming()
+        else:
+            self.warmCaches()
+
 
 #         if not self.isReadOnlyEffect():
 #             words = self.getWikiData().getWikiPageNamesForMetaDataState(0)
@@ -541,6 +566,49 @@ class WikiDataManager(MiscEventSourceMixin):
 #                 self.updateExecutor.executeAsync(1, self._runDatabaseUpdate,
 #                         word)
 
+    def _pushCacheWarming(self):
+        if not self.cachesWarm:
+            self.updateExecutor.executeAsyncUniqueWithThreadStop(0,
+                    ("warm caches",), self.warmCaches)
+
+
+    def warmCaches(self, threadstop=DUMBTHREADSTOP):
+        """
+        Fill the caches which are needed by the trees, autocompletion and
+        search but not to show a page: global attributes, the dictionary
+        of wiki link terms and the search index (if enabled).
+        Afterwards a "warmed caches" event is sent in main thread, even if
+        filling was stopped or failed (the caches are then filled on demand).
+        """
+        try:
+            with Profiling.timingSpan(u"Warm wiki caches"):
+                wikiData = self.getWikiData()
+                wikiData.getGlobalAttributes()
+                threadstop.testValidThread()
+                wikiData.getAllProducedWikiLinks()
+                threadstop.testValidThread()
+                if self.isSearchIndexEnabled():
+                    try:
+                        self.getSearchIndex()
+                    except:
+                        traceback.print_exc()
+        finally:
+            # Trees etc. must not wait forever for the event
+            self.cachesWarm = True
+            # Also before main loop runs (wiki opened at startup) the event
+            # must be processed in main thread
+            CallAfter(self.fireMiscEventKeys, ("warmed caches",))
+
+
+    def areCachesWarm(self):
+        """
+        Returns True if the caches filled by warmCaches() are available.
+        If False, GUI elements depending on them should show a pending state
+        until the "warmed caches" event arrives.
+        """
+        return self.cachesWarm
+
+
     def _runDatabaseUpdate(self, word, step, threadstop=DUMBTHREADSTOP):
         time.sleep(0.1)
         try:
@@ -549,8 +617,8 @@ class WikiDataManager(MiscEventSourceMixin):
             if step == Consts.WIKIWORDMETADATA_STATE_ATTRSPROCESSED:
                 if page.runDatabaseUpdate(step=step, threadstop=threadstop):
                     if self.isSearchIndexEnabled():
-                        self.updateExecutor.executeAsyncWithThreadStop(
-                                self.UEQUEUE_INDEX,
+                        self.updateExecutor.executeAsyncUniqueWithThreadStop(
+                                self.UEQUEUE_INDEX, ("index", word),
                                 self._runDatabaseUpdate, word,
                                 Consts.WIKIWORDMETADATA_STATE_SYNTAXPROCESSED)
 
@@ -559,7 +627,9 @@ class WikiDataManager(MiscEventSourceMixin):
                     page.runDatabaseUpdate(step=step, threadstop=threadstop)
             else:   # should be: step == Consts.WIKIWORDMETADATA_STATE_DIRTY:
                 if page.runDatabaseUpdate(step=step, threadstop=threadstop):
-                    self.updateExecutor.executeAsyncWithThreadStop(1,
+                    self.updateExecutor.executeAsyncUniqueWithThreadStop(1,
+                            ("meta", word,
+                            Consts.WIKIWORDMETADATA_STATE_ATTRSPROCESSED),
                             self._runDatabaseUpdate, word,
                             Consts.WIKIWORDMETADATA_STATE_ATTRSPROCESSED)
 
@@ -573,6 +643,9 @@ class WikiDataManager(MiscEventSourceMixin):
         self.refCount += 1
         return self.refCount
 
+    def getRefCount(self):
+        return self.refCount
+
     def _releaseLockFile(self):
         """
         Release lock file if it was created before
@@ -609,6 +682,13 @@ class WikiDataManager(MiscEventSourceMixin):
             self.wikiWideHistory.writeOverview()
             self.wikiWideHistory.close()
 
+            if self.insertionResultCache is not None:
+                self.insertionResultCache.close()
+                self.insertionResultCache = None
+
+            if self.fileStorage is not None:
+                self.fileStorage.close()
+
             # Invalidate all cached pages to prevent yet running threads from
             # using them
             for page in self.wikiPageDict.values():
@@ -673,6 +753,33 @@ class WikiDataManager(MiscEventSourceMixin):
     def getWikiWideHistory(self):
         return self.wikiWideHistory
 
+    def getInsertionResultCache(self):
+        """
+        Return the InsertionResultCache of this wiki, create it on demand.
+        """
+        if self.insertionResultCache is None:
+            if self.isReadOnlyEffect():
+                cacheDir = None
+            else:
+                cacheDir = os.path.join(self.getDataDir(), u"insertioncache")
+
+            self.insertionResultCache = InsertionResultCache(self, cacheDir)
+            self.insertionResultCache.readIndex()
+
+        return self.insertionResultCache
+
+
+    def getPageAstCache(self):
+        """
+        Return the PageAstCache of this wiki, create it on demand. Returns
+        None for read-only wikis.
+        """
+        if self.pageAstCache is None and not self.isReadOnlyEffect():
+            self.pageAstCache = PageAstCache(os.path.join(self.getDataDir(),
+                    u"astcache"))
+
+        return self.pageAstCache
+
     def getWikiDefaultWikiLanguage(self):
         """
         Returns the internal name of the default wiki language of this wiki.
@@ -901,7 +1008,27 @@ class WikiDataManager(MiscEventSourceMixin):
 
 
     def pushUpdatePage(self, page):
-        self.updateExecutor.executeAsyncWithThreadStop(0, page.runDatabaseUpdate)
+        # An update still pending for the page processes the current text
+        # as well, so no further one is needed
+        self.updateExecutor.executeAsyncUniqueWithThreadStop(0,
+                ("update", page.getWikiWord()), page.runDatabaseUpdate)
+
+
+    def prioritizeUpdates(self, words):
+        """
+        Let pending background updates of the pages in sequence words run
+        before all other jobs of the update executor, in the order of
+        the sequence (normally the page shown in the current tab first, then
+        the pages in the other tabs).
+        """
+        keys = []
+        for word in words:
+            keys += [("update", word),
+                    ("meta", word, Consts.WIKIWORDMETADATA_STATE_DIRTY),
+                    ("meta", word, Consts.WIKIWORDMETADATA_STATE_ATTRSPROCESSED),
+                    ("index", word)]
+
+        self.updateExecutor.setPriorityKeys(keys)
 
 
     def getUpdateExecutor(self):
@@ -944,11 +1071,16 @@ class WikiDataManager(MiscEventSourceMixin):
 
             with self.updateExecutor.getDequeCondition():
                 for word in words0:
-                    self.updateExecutor.executeAsyncWithThreadStop(1, self._runDatabaseUpdate,
+                    self.updateExecutor.executeAsyncUniqueWithThreadStop(1,
+                            ("meta", word, Consts.WIKIWORDMETADATA_STATE_DIRTY),
+                            self._runDatabaseUpdate,
                             word, Consts.WIKIWORDMETADATA_STATE_DIRTY)
     
                 for word in words1:
-                    self.updateExecutor.executeAsyncWithThreadStop(1, self._runDatabaseUpdate,
+                    self.updateExecutor.executeAsyncUniqueWithThreadStop(1,
+                            ("meta", word,
+                            Consts.WIKIWORDMETADATA_STATE_ATTRSPROCESSED),
+                            self._runDatabaseUpdate,
                             word, Consts.WIKIWORDMETADATA_STATE_ATTRSPROCESSED)
             
             if self.isSearchIndexEnabled():
@@ -957,9 +1089,10 @@ class WikiDataManager(MiscEventSourceMixin):
 
                 with self.updateExecutor.getDequeCondition():
                     for word in words2:
-                        self.updateExecutor.executeAsyncWithThreadStop(
-                                self.UEQUEUE_INDEX, self._runDatabaseUpdate,
-                                word, Consts.WIKIWORDMETADATA_STATE_SYNTAXPROCESSED)
+                        self.updateExecutor.executeAsyncUniqueWithThreadStop(
+                                self.UEQUEUE_INDEX, ("index", word),
+                                self._runDatabaseUpdate, word,
+                                Consts.WIKIWORDMETADATA_STATE_SYNTAXPROCESSED)
 
 
     def isReadOnlyEffect(self):
@@ -1035,6 +1168,23 @@ class WikiDataManager(MiscEventSourceMixin):
         return self.wikiData.getAllDefinedWikiPageNames()
 
 
+    def getAllChildRelationships(self, existingonly=False, selfreference=True):
+        """
+        Return list of tuples (word, relation) with the child relations of
+        all wiki pages. Parameters are the same as for
+        WikiPage.getChildRelationships().
+        Function must work for read-only wiki.
+        """
+        if self.wikiData.checkCapability("all relations") is not None:
+            return self.wikiData.getAllChildRelationships(
+                    existingonly=existingonly, selfreference=selfreference)
+
+        return [(word, relation)
+                for word in self.wikiData.getAllDefinedWikiPageNames()
+                for relation in self.wikiData.getChildRelationships(word,
+                        existingonly=existingonly, selfreference=selfreference)]
+
+
     def getWikiPage(self, wikiWord):
         """
         Fetch a WikiPage for the wikiWord, throws WikiWordNotFoundException
@@ -1213,6 +1363,22 @@ class WikiDataManager(MiscEventSourceMixin):
         """
         return self.wikiData.retrieveDataBlock(unifName, default=default)
 
+    def retrieveDataBlocks(self, unifNames, default=""):
+        """
+        Retrieve multiple data blocks as binary strings at once. Returns
+        dictionary {unifName: data} without entries for non-existing blocks.
+        """
+        if self.wikiData.checkCapability("datablock batch") is not None:
+            return self.wikiData.retrieveDataBlocks(unifNames, default=default)
+
+        result = {}
+        for unifName in unifNames:
+            data = self.wikiData.retrieveDataBlock(unifName, default=default)
+            if data is not None:
+                result[unifName] = data
+
+        return result
+
     def retrieveDataBlockAsText(self, unifName, default=""):
         """
         Retrieve data block as unicode string (assuming it was encoded properly)
@@ -1253,14 +1419,29 @@ class WikiDataManager(MiscEventSourceMixin):
         return self.wikiData.deleteDataBlock(unifName)
 
 
+    def deleteDataBlocks(self, unifNames):
+        """
+        Delete all data blocks with the given unified names. Non-existing
+        names are ignored.
+        """
+        if self.wikiData.checkCapability("datablock batch") is not None:
+            return self.wikiData.deleteDataBlocks(unifNames)
+
+        for unifName in unifNames:
+            self.wikiData.deleteDataBlock(unifName)
+
+
     def renameDataBlock(self, oldUnifName, newUnifName):
         """
         Renames data block with oldUnifName to newUnifName. Tries to preserve
         storage hint. If data block with newUnifName exists, it is overwritten.
         Currently if oldUnifName doesn't exist, the function does nothing
-
-        TODO: Native support in WikiData classes.
         """
+        if self.wikiData.checkCapability("datablock batch") is not None:
+            if oldUnifName != newUnifName:
+                self.wikiData.renameDataBlocks(((oldUnifName, newUnifName),))
+            return
+
         sh = self.guessDataBlockStoreHint(oldUnifName)
         if sh is None:
             return
@@ -1270,6 +1451,20 @@ class WikiDataManager(MiscEventSourceMixin):
         self.deleteDataBlock(oldUnifName)
 
 
+    def renameDataBlocks(self, renames):
+        """
+        Rename multiple data blocks. renames is a sequence of tuples
+        (oldUnifName, newUnifName), old and new names must be disjoint.
+        Storage hints are preserved, existing data blocks with a new name
+        are overwritten and non-existing old names are ignored.
+        """
+        if self.wikiData.checkCapability("datablock batch") is not None:
+            return self.wikiData.renameDataBlocks(renames)
+
+        for oldUnifName, newUnifName in renames:
+            self.renameDataBlock(oldUnifName, newUnifName)
+
+
 
     # TODO Remove if not needed
     def checkFileSignatureForWikiPageNameAndMarkDirty(self, word):
@@ -1373,6 +1568,7 @@ class WikiDataManager(MiscEventSourceMixin):
         finally:
             progresshandler.close()
             self.updateExecutor.start()
+            self._pushCacheWarming()
 
 
     def initiateExtWikiFileUpdate(self):
@@ -1392,6 +1588,7 @@ class WikiDataManager(MiscEventSourceMixin):
             self.pushDirtyMetaDataUpdate()
         finally:
             self.updateExecutor.start()
+            self._pushCacheWarming()
 
 
     def rebuildWiki(self, progresshandler, onlyDirty):
@@ -1534,6 +1731,7 @@ class WikiDataManager(MiscEventSourceMixin):
             progresshandler.close()
             self.fireMiscEventKeys(("end foreground update",))
             self.updateExecutor.start()
+            self._pushCacheWarming()
 
 
 
@@ -1605,125 +1803,172 @@ class WikiDataManager(MiscEventSourceMixin):
         modifyText -- Should the text of links to the renamed page be
                 modified? This text replacement works unreliably
         """
-        global _openDocuments
-        
+        self.renameWikiWords([(wikiWord, toWikiWord)], modifyText)
+
+
+    def renameWikiWords(self, renameSeq, modifyText):
+        """
+        Rename multiple wiki words at once, e.g. a page with its subpages.
+        The database entries of all pages are renamed in one transaction,
+        each page containing one of the words is rewritten only once and
+        each touched page gets a single meta-data update.
+
+        renameSeq -- Sequence of tuples (fromWikiWord, toWikiWord) as
+                returned by buildRenameSeqWithSubpages()
+        modifyText -- Should the text of links to the renamed pages be
+                modified? This text replacement works unreliably
+        """
+        if len(renameSeq) == 0:
+            return
+
         langHelper = GetApp().createWikiLanguageHelper(
                 self.getWikiDefaultWikiLanguage())
 
-        errMsg = langHelper.checkForInvalidWikiWord(toWikiWord, self)
+        for wikiWord, toWikiWord in renameSeq:
+            errMsg = langHelper.checkForInvalidWikiWord(toWikiWord, self)
+    
+            if errMsg:
+                raise WikiDataException(_(u"'%s' is an invalid wiki word. %s") %
+                        (toWikiWord, errMsg))
+    
+            if self.isDefinedWikiLinkTerm(toWikiWord):
+                raise WikiDataException(
+                        _(u"Cannot rename '%s' to '%s', '%s' already exists") %
+                        (wikiWord, toWikiWord, toWikiWord))
 
-        if errMsg:
-            raise WikiDataException(_(u"'%s' is an invalid wiki word. %s") %
-                    (toWikiWord, errMsg))
+        renameDict = dict(renameSeq)
+        oldWikiPages = []
+        # Dictionary {<toWikiWord>: <previous title line or None>}
+        prevTitles = {}
 
-        if self.isDefinedWikiLinkTerm(toWikiWord):
-            raise WikiDataException(
-                    _(u"Cannot rename '%s' to '%s', '%s' already exists") %
-                    (wikiWord, toWikiWord, toWikiWord))
+        for wikiWord, toWikiWord in renameSeq:
+            try:
+                oldWikiPage = self.getWikiPage(wikiWord)
+            except WikiWordNotFoundException:
+                # So create page first
+                oldWikiPage = self.createWikiPage(wikiWord)
+                oldWikiPage.writeToDatabase()
 
-        try:
-            oldWikiPage = self.getWikiPage(wikiWord)
-        except WikiWordNotFoundException:
-            # So create page first
-            oldWikiPage = self.createWikiPage(wikiWord)
-            oldWikiPage.writeToDatabase()
+            oldWikiPages.append(oldWikiPage)
 
-        self.getWikiData().renameWord(wikiWord, toWikiWord)
-        
-        # TODO: Replace always?
-        
-        # Check if replacing previous title of page with new one
+            # Check if replacing previous title of page with new one
+            wikiWordTitle = self.getWikiPageTitle(wikiWord)
+            
+            if wikiWordTitle is not None:
+                prevTitles[toWikiWord] = self.formatPageTitle(wikiWordTitle) + \
+                        u"\n"
+            else:
+                prevTitles[toWikiWord] = None
 
-        wikiWordTitle = self.getWikiPageTitle(wikiWord)
-        
-        if wikiWordTitle is not None:
-            prevTitle = self.formatPageTitle(wikiWordTitle) + u"\n"
+        if self.wikiData.checkCapability("bulk rename") is not None:
+            self.wikiData.renameWords(renameSeq)
         else:
-            prevTitle = None
+            for wikiWord, toWikiWord in renameSeq:
+                self.wikiData.renameWord(wikiWord, toWikiWord)
 
         # if the root was renamed we have a little more to do
-        if wikiWord == self.getWikiName():
-            wikiConfig = self.getWikiConfig()
-            wikiConfig.set("main", "wiki_name", toWikiWord)
-            wikiConfig.set("main", "last_wiki_word", toWikiWord)
-            wikiConfig.save()
+        if self.getWikiName() in renameDict:
+            self._renameWikiConfigForRoot(renameDict[self.getWikiName()])
 
-            wikiConfigPath = wikiConfig.getConfigPath()
-            # Unload wiki configuration file
-            wikiConfig.loadConfig(None)
+        for oldWikiPage in oldWikiPages:
+            wikiWord = oldWikiPage.getWikiWord()
+            oldWikiPage.renameVersionData(renameDict[wikiWord])
+            oldWikiPage.queueRemoveFromSearchIndex()
+            oldWikiPage.informRenamedWikiPage(renameDict[wikiWord])
+            del self.wikiPageDict[wikiWord]
 
-            # Rename config file
-            renamedConfigPath = os.path.join(
-                    os.path.dirname(wikiConfigPath),
-                    u"%s.wiki" % toWikiWord)
-            os.rename(wikiConfigPath, renamedConfigPath)
-
-            # Load it again
-            wikiConfig.loadConfig(renamedConfigPath)
-            self.wikiName = toWikiWord
-            
-            # Update dict of open documents (= wiki data managers)
-            del _openDocuments[wikiConfigPath]
-            _openDocuments[renamedConfigPath] = self
-
-        oldWikiPage.renameVersionData(toWikiWord)
-        oldWikiPage.queueRemoveFromSearchIndex()
-        oldWikiPage.informRenamedWikiPage(toWikiWord)
-        del self.wikiPageDict[wikiWord]
+        # Words of pages which must be rewritten, in order of processing
+        touchedWords = [toWikiWord for wikiWord, toWikiWord in renameSeq]
+        referringWords = set()
 
         if modifyText:
-            # now we have to search the wiki files and replace the old word with the new
+            # now we have to search the wiki files and replace the old words
+            # with the new ones. All words are searched at once, longer
+            # ones first so that a word containing another one is found
+            searchStr = ur"\b(?:" + u"|".join(re.escape(wikiWord)
+                    for wikiWord in sorted(renameDict, key=len, reverse=True)) + \
+                    ur")\b"
+
             sarOp = SearchReplaceOperation()
             sarOp.wikiWide = True
             sarOp.wildCard = 'regex'
             sarOp.caseSensitive = True
-            sarOp.searchStr = ur"\b" + re.escape(wikiWord) + ur"\b"
-            
-            for resultWord in self.searchWiki(sarOp):
-                wikiPage = self.getWikiPage(resultWord)
-                text = wikiPage.getLiveTextNoTemplate()
-                if text is None:
-                    continue
+            sarOp.searchStr = searchStr
 
-                sarOp.replaceStr = re_sub_escape(toWikiWord)
-                sarOp.replaceOp = True
-                sarOp.cycleToStart = False
+            referringWords.update(self.searchWiki(sarOp))
+            touchedWords += [word for word in referringWords
+                    if word not in prevTitles]
 
-                charStartPos = 0
-    
-                while True:
-                    found = sarOp.searchText(text, charStartPos)
-                    start, end = found[:2]
-                    
-                    if start is None: break
-                    
-                    repl = sarOp.replace(text, found)
-                    text = text[:start] + repl + text[end:]  # TODO Faster?
-                    charStartPos = start + len(repl)
+            searchRe = re.compile(searchStr, re.MULTILINE | re.UNICODE)
+
+        for word in touchedWords:
+            page = self.getWikiPage(word)
+            isRenamed = word in prevTitles
 
-                wikiPage.replaceLiveText(text)
-#                 wikiPage.update(text)
+            if isRenamed:
+                # But first update the match terms which need synchronous
+                # updating
+                page.refreshSyncUpdateMatchTerms()
+        
+                self.getWikiData().setMetaDataState(word,
+                        Consts.WIKIWORDMETADATA_STATE_DIRTY)
+
+                text = page.getLiveText()
+            else:
+                text = page.getLiveTextNoTemplate()
+                if text is None:
+                    continue
 
+            content = text
+            if word in referringWords:
+                content = searchRe.sub(lambda m: renameDict[m.group(0)],
+                        content)
 
-        # Now we modify the page heading if not yet done by text replacing
-        page = self.getWikiPage(toWikiWord)
-        # But first update the match terms which need synchronous updating
-        page.refreshSyncUpdateMatchTerms()
+            # Now we modify the page heading if not yet done by text replacing
+            prevTitle = prevTitles.get(word)
+            if prevTitle is not None and content.startswith(prevTitle):
+                # Replace previous title with new one
+                content = self.formatPageTitle(self.getWikiPageTitle(word)) + \
+                        u"\n" + content[len(prevTitle):]
 
-        self.getWikiData().setMetaDataState(toWikiWord,
-                Consts.WIKIWORDMETADATA_STATE_DIRTY)
+            if content != text:
+                page.replaceLiveText(content)
 
-        content = page.getLiveText()
-        if prevTitle is not None and content.startswith(prevTitle):
-            # Replace previous title with new one
-            content = self.formatPageTitle(self.getWikiPageTitle(toWikiWord)) + \
-                    u"\n" + content[len(prevTitle):]
-            page.replaceLiveText(content)
+            if isRenamed:
+                # replaceLiveText() doesn't start an update if the page
+                # is open in an editor (or read-only)
+                page.initiateUpdate()
 
-        page.initiateUpdate()
 
+    def _renameWikiConfigForRoot(self, toWikiWord):
+        """
+        Called by renameWikiWords() if the root page was renamed to
+        toWikiWord, renames the wiki configuration file.
+        """
+        global _openDocuments
 
-#             page.update(content)
+        wikiConfig = self.getWikiConfig()
+        wikiConfig.set("main", "wiki_name", toWikiWord)
+        wikiConfig.set("main", "last_wiki_word", toWikiWord)
+        wikiConfig.save()
+
+        wikiConfigPath = wikiConfig.getConfigPath()
+        # Unload wiki configuration file
+        wikiConfig.loadConfig(None)
+
+        # Rename config file
+        renamedConfigPath = os.path.join(
+                os.path.dirname(wikiConfigPath),
+                u"%s.wiki" % toWikiWord)
+        os.rename(wikiConfigPath, renamedConfigPath)
+
+        # Load it again
+        wikiConfig.loadConfig(renamedConfigPath)
+        self.wikiName = toWikiWord
+        
+        # Update dict of open documents (= wiki data managers)
+        del _openDocuments[wikiConfigPath]
+        _openDocuments[renamedConfigPath] = self
 
 
     # TODO threadstop?
@@ -5,7 +5,7 @@ DB formats to the current one
 """
 
 
-import string, codecs, types, threading, traceback
+import string, codecs, types, threading, traceback, time
 
 from os import mkdir, unlink, rename
 from os.path import exists, join
@@ -16,7 +16,10 @@ from pwiki.StringOps import mbcsDec, mbcsEnc, utf8Enc, utf8Dec, applyBinCompact,
         removeBracketsFilename, pathEnc
 from pwiki.SearchAndReplace import SearchReplaceOperation
 
+from wx import GetApp
+
 import pwiki.sqlite3api as sqlite
+import pwiki.sqlite3stdapi as sqlite3stdapi
 
 
 
@@ -56,6 +59,14 @@ class ConnectWrapBase:
             self.dbCursor.execute(sql)
 
 
+    def execSqlMany(self, sql, paramsSeq):
+        """
+        utility method, executes the sql once for each parameter tuple
+        in paramsSeq with a single prepared statement
+        """
+        self.dbCursor.executemany(sql, paramsSeq)
+
+
     def execSqlQuery(self, sql, params=None):
         "utility method, executes the sql, returns query result"
         if params:
@@ -114,6 +125,30 @@ class ConnectWrapBase:
             pass
 
 
+    def savepoint(self, name):
+        """
+        Set savepoint with name. Changes made after it can be discarded
+        by rollbackToSavepoint() without affecting other uncommitted
+        changes.
+        """
+        self.execSql("savepoint " + name)
+
+    def releaseSavepoint(self, name):
+        self.execSql("release savepoint " + name)
+
+    def rollbackToSavepoint(self, name):
+        """
+        Discard changes made after savepoint name and remove savepoint.
+        If sqlite already rolled back the whole transaction after an error,
+        the savepoint doesn't exist anymore and nothing is done.
+        """
+        try:
+            self.execSql("rollback to savepoint " + name)
+            self.execSql("release savepoint " + name)
+        except sqlite.Error:
+            traceback.print_exc()
+
+
     def getLastRowid(self):
         return self.dbCursor.lastrowid
 
@@ -170,26 +205,121 @@ class ConnectWrapSyncCommit(ConnectWrapBase):
 
 class ConnectWrapAsyncCommit(ConnectWrapBase):
     """
-    Connection wrapper for asynchronous commit (experimental)
+    Connection wrapper which collects commits into batches.
+    Writes are kept in one open transaction which is really committed when
+    maxStatements write statements were executed or maxDelay seconds
+    passed since the first of them, or at a sync point (syncCommit(),
+    close()).
+    A commit() call only marks the end of a logical change by setting a
+    savepoint, a following rollback() discards the changes made after it.
+    The timer commit waits until the current logical change is finished.
     """
-    def __init__(self, connection):
+    BATCH_SAVEPOINT = "wikidpad_batch"
+
+    # Commands which don't change data, not counted as write statements
+    NON_DATA_COMMANDS = frozenset(("savepoint", "release", "rollback",
+            "begin", "commit", "end"))
+
+    def __init__(self, connection, maxDelay=0.6, maxStatements=500):
         ConnectWrapBase.__init__(self, connection)
         
         self.__dict__["accessLock"] = threading.RLock()
         self.__dict__["commitTimer"] = None
-        self.__dict__["commitNeeded"] = False
+        self.__dict__["maxDelay"] = maxDelay
+        self.__dict__["maxStatements"] = maxStatements
+
+        # Number of data changing statements since last real commit and
+        # time of the first write (None if nothing to commit)
+        self.__dict__["pendingStatements"] = 0
+        self.__dict__["pendingSince"] = None
+        # Were statements executed since last commit() call?
+        self.__dict__["changeOpen"] = False
+        # Is the savepoint of the last commit() call set?
+        self.__dict__["batchSavepoint"] = False
+
+        # Statistics
+        self.__dict__["statStartTime"] = time.time()
+        self.__dict__["statCommits"] = 0
+        self.__dict__["statStatements"] = 0
+
+
+    def __setattr__(self, attr, value):
+        # Own attributes are in __dict__, everything else belongs to cursor
+        if attr in self.__dict__:
+            self.__dict__[attr] = value
+        else:
+            ConnectWrapBase.__setattr__(self, attr, value)
+
+
+    def _noteWrite(self, sql=None, failed=False):
+        """
+        Note execution of a write statement. sql is None for a data
+        changing statement. Failed statements and statements not changing
+        data are not counted but the transaction the driver may have
+        begun for them must be committed, too.
+        """
+        if self.pendingSince is None:
+            self.pendingSince = time.time()
+        if not failed and (sql is None or sql.lstrip().split(" ", 1)[0]
+                .lower() not in self.NON_DATA_COMMANDS):
+            self.pendingStatements += 1
+        self.changeOpen = True
+
+
+    def _startTimer(self, delay):
+        if self.commitTimer is not None:
+            return
+
+        t = threading.Timer(max(0, delay), self._timerCommit)
+        t.setDaemon(True)
+        self.commitTimer = t
+        t.start()
+
+
+    def _cancelTimer(self):
+        if self.commitTimer is not None:
+            if self.commitTimer is not threading.currentThread():
+                self.commitTimer.cancel()
+            self.commitTimer = None
+
+
+    def _commitNow(self):
+        """
+        Commit open transaction. Caller must hold the accessLock.
+        """
+        self._cancelTimer()
+        self.dbConn.commit()
+
+        if self.pendingStatements > 0:
+            self.statCommits += 1
+            self.statStatements += self.pendingStatements
+
+        self.pendingStatements = 0
+        self.pendingSince = None
+        self.changeOpen = False
+        self.batchSavepoint = False
 
 
     def commit(self):
         self.accessLock.acquire()
         try:
-            if not self.commitNeeded:
+            self.changeOpen = False
+            if self.pendingSince is None:
                 return
-            if self.commitTimer is not None and self.commitTimer.isAlive():
+
+            if self.pendingStatements >= self.maxStatements or \
+                    time.time() - self.pendingSince >= self.maxDelay:
+                self._commitNow()
                 return
-            t = threading.Timer(0.6, self._timerCommit)
-            self.commitTimer = t
-            t.start()
+
+            # Mark end of logical change for rollback()
+            if self.batchSavepoint:
+                ConnectWrapBase.execSql(self, "release savepoint " +
+                        self.BATCH_SAVEPOINT)
+            ConnectWrapBase.execSql(self, "savepoint " + self.BATCH_SAVEPOINT)
+            self.batchSavepoint = True
+
+            self._startTimer(self.pendingSince + self.maxDelay - time.time())
         finally:
             self.accessLock.release()
 
@@ -199,11 +329,23 @@ class ConnectWrapAsyncCommit(ConnectWrapBase):
         Called by timer to commit.
         """
         self.accessLock.acquire()
-        try:    
-            if not self.commitNeeded:
+        try:
+            if self.commitTimer is not threading.currentThread():
+                # Timer was cancelled while waiting for the lock
+                return
+
+            self.commitTimer = None
+            if self.pendingSince is None:
+                return
+
+            if self.changeOpen:
+                # Don't commit a half finished change, try again later
+                self._startTimer(self.maxDelay)
                 return
-            self.dbConn.commit()
-            self.commitNeeded = False
+
+            self._commitNow()
+        except sqlite.Error:
+            traceback.print_exc()
         finally:
             self.accessLock.release()
         
@@ -214,48 +356,78 @@ class ConnectWrapAsyncCommit(ConnectWrapBase):
         """
         self.accessLock.acquire()
         try:
-            if self.commitTimer is not None and self.commitTimer.isAlive():
-                self.commitTimer.cancel()
-            self.dbConn.commit()
-            self.commitNeeded = False
+            self._commitNow()
         finally:
             self.accessLock.release()
 
 
     def rollback(self):
+        """
+        Discard changes made since the last commit() call.
+        """
         self.accessLock.acquire()
-        try:    
-            if self.commitTimer is not None and self.commitTimer.isAlive():
-                self.commitTimer.cancel()
+        try:
+            self.changeOpen = False
+            if self.batchSavepoint:
+                try:
+                    ConnectWrapBase.execSql(self, "rollback to savepoint " +
+                            self.BATCH_SAVEPOINT)
+                    return
+                except sqlite.Error:
+                    # If sqlite already rolled back the whole transaction
+                    # after an error, the savepoint doesn't exist anymore
+                    traceback.print_exc()
+                    self.batchSavepoint = False
+
+            self._cancelTimer()
             self.dbConn.rollback()
-            self.commitNeeded = False
+            self.pendingStatements = 0
+            self.pendingSince = None
         finally:
             self.accessLock.release()
 
 
-    def _commitIfPending(self):
+    def getCommitStatistics(self):
         """
-        Execute commit synchronously if timer currently runs.
-        This function is not secured by a lock as it is only called
-        by other functions.
+        Return tuple (<commits per second>, <average number of data
+        changing statements per commit>) since creation of the wrapper.
+        Commits without such statements are not counted.
         """
-        if self.commitTimer is not None and self.commitTimer.isAlive():
-            self.commitTimer.cancel()
+        self.accessLock.acquire()
+        try:
+            elapsed = time.time() - self.statStartTime
+            if elapsed <= 0 or self.statCommits == 0:
+                return (0.0, 0.0)
 
-            if not self.commitNeeded:
-                return
-            self.dbConn.commit()
-            self.commitNeeded = False
+            return (self.statCommits / elapsed,
+                    float(self.statStatements) / self.statCommits)
+        finally:
+            self.accessLock.release()
 
 
     def execSql(self, sql, params=None):
         "utility method, executes the sql"
         self.accessLock.acquire()
         try:
-            # Commit first before executing something that changes database
-            self._commitIfPending()
-            self.commitNeeded = True
-            return ConnectWrapBase.execSql(self, sql, params)
+            try:
+                ConnectWrapBase.execSql(self, sql, params)
+            except sqlite.Error:
+                self._noteWrite(sql, failed=True)
+                raise
+            self._noteWrite(sql)
+        finally:
+            self.accessLock.release()
+
+    def execSqlMany(self, sql, paramsSeq):
+        "utility method, executes the sql for each parameter tuple"
+        self.accessLock.acquire()
+        try:
+            try:
+                ConnectWrapBase.execSqlMany(self, sql, paramsSeq)
+            except sqlite.Error:
+                self._noteWrite(failed=True)
+                raise
+            self._noteWrite()
         finally:
             self.accessLock.release()
 
@@ -268,20 +440,6 @@ class ConnectWrapAsyncCommit(ConnectWrapBase):
             self.accessLock.release()
 
 
-#     def execSqlQueryIter(self, sql, params=None):
-#         """
-#         utility method, executes the sql, returns an iterator
-#         over the query results
-#         """
-#         ## print "execSqlQuery sql", sql, repr(params)
-#         if params:
-#             self.dbCursor.execute(sql, params, typeDetect=sqlite.TYPEDET_FIRST)
-#         else:
-#             self.dbCursor.execute(sql, typeDetect=sqlite.TYPEDET_FIRST)
-# 
-#         return iter(self.dbCursor)
-
-
     def execSqlQuerySingleColumn(self, sql, params=None):
         "utility method, executes the sql, returns query result"
         self.accessLock.acquire()
@@ -311,10 +469,8 @@ class ConnectWrapAsyncCommit(ConnectWrapBase):
         """
         self.accessLock.acquire()
         try:
-            # Commit first before executing something that changes database
-            self._commitIfPending()
-            self.commitNeeded = True
-            return ConnectWrapBase.execSqlNoError(self, sql)
+            ConnectWrapBase.execSqlNoError(self, sql)
+            self._noteWrite(sql)
         finally:
             self.accessLock.release()
 
@@ -330,8 +486,8 @@ class ConnectWrapAsyncCommit(ConnectWrapBase):
     def closeCursor(self):
         self.accessLock.acquire()
         try:
-            # Commit first before executing something that changes database
-            self._commitIfPending()
+            if self.dbConn:
+                self._commitNow()
             return ConnectWrapBase.closeCursor(self)
         finally:
             self.accessLock.release()
@@ -343,8 +499,8 @@ class ConnectWrapAsyncCommit(ConnectWrapBase):
         """
         self.accessLock.acquire()
         try:
-            # Commit first before executing something that changes database
-            self._commitIfPending()
+            if self.dbConn:
+                self._commitNow()
             ConnectWrapBase.close(self)
         finally:
             self.accessLock.release()
@@ -684,6 +840,21 @@ def changeTableSchema(connwrap, tablename, schema, forcechange=False):
 
 
 
+def connect(dbfile):
+    """
+    Open database file dbfile with the sqlite driver chosen by global
+    option "db_sqliteDriver" ("thin": ctypes binding SqliteThin3,
+    "stdlib": Python's built-in sqlite3 module). Both drivers raise
+    the exceptions of sqlite3api.
+    """
+    app = GetApp()
+    if app is not None and app.getGlobalConfig().get("main",
+            "db_sqliteDriver", u"thin") == u"stdlib":
+        return sqlite3stdapi.connect(dbfile)
+
+    return sqlite.connect(dbfile)
+
+
 def createWikiDB(wikiName, dataDir, overwrite=False, wikiDocument=None):
     """
     creates the initial db
@@ -707,7 +878,7 @@ def createWikiDB(wikiName, dataDir, overwrite=False, wikiDocument=None):
                 unlink(pathEnc(dbfile))
 
         # create the database
-        connwrap = ConnectWrapSyncCommit(sqlite.connect(dbfile))
+        connwrap = ConnectWrapSyncCommit(connect(dbfile))
 
         try:
             for tn in MAIN_TABLES:
@@ -13,17 +13,23 @@ Used terms:
 
 
 
+from __future__ import with_statement
+
 from os.path import exists, join, basename
 import os, os.path
 
 from time import time, localtime
 import datetime
-import string, glob, traceback
+import string, glob, traceback, threading
 
 from wx import GetApp
 
 from pwiki.WikiExceptions import *   # TODO make normal import
+from pwiki import Profiling
+from pwiki.Utilities import calcRowsDelta
 from pwiki import SearchAndReplace
+from pwiki.wikidata.MatchTermIndex import MatchTermIndex, sortMatchTerms, \
+        LazySortedMatchTerms
 
 try:
     import pwiki.sqlite3api as sqlite
@@ -51,6 +57,13 @@ class WikiData:
         self.wikiDocument = wikiDocument
         self.dataDir = dataDir
         self.cachedWikiPageLinkTermDict = None
+        self.matchTermIndex = None
+        # Held while building or modifying self.matchTermIndex so the index
+        # can't miss changes written while it is built
+        self.matchTermIndexLock = threading.RLock()
+        # Dictionary {<wiki word>: <visited timestamp>} or None, built on
+        # first use by getWikiWordMatchTermsWith()
+        self.cachedWikiWordVisited = None
 
         dbPath = self.wikiDocument.getWikiConfig().get("wiki_db", "db_filename",
                 u"").strip()
@@ -71,8 +84,17 @@ class WikiData:
         dbfile = longPathDec(dbfile)
 
         try:
-            self.connWrap = DbStructure.ConnectWrapSyncCommit(
-                    sqlite.connect(dbfile))
+            globalConfig = GetApp().getGlobalConfig()
+            if globalConfig.getboolean("main", "db_asyncCommit", False):
+                self.connWrap = DbStructure.ConnectWrapAsyncCommit(
+                        DbStructure.connect(dbfile),
+                        maxDelay=globalConfig.getfloat("main",
+                        "db_asyncCommit_maxDelay", 0.6),
+                        maxStatements=globalConfig.getint("main",
+                        "db_asyncCommit_maxStatements", 500))
+            else:
+                self.connWrap = DbStructure.ConnectWrapSyncCommit(
+                        DbStructure.connect(dbfile))
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbReadAccessError(e)
@@ -146,7 +168,8 @@ class WikiData:
         try:
             # Further possible updates
             if not recoveryMode:
-                DbStructure.updateDatabase2(self.connWrap)
+                with Profiling.timingSpan(u"Update database structure"):
+                    DbStructure.updateDatabase2(self.connWrap)
         except sqlite.Error, e:
             # Remember but continue
             lastException = DbWriteAccessError(e)
@@ -180,10 +203,9 @@ class WikiData:
 
             # reset cache
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
+            self._dropMatchTermIndex()
             self.cachedGlobalAttrs = None
-            
-            if not recoveryMode:
-                self.getGlobalAttributes()
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             try:
@@ -279,6 +301,7 @@ class WikiData:
         self.setContentRaw(word, content, moddate, creadate)
 
         self.cachedWikiPageLinkTermDict = None
+        self.cachedWikiWordVisited = None
 
 
     def setContentRaw(self, word, content, moddate = None, creadate = None):
@@ -324,6 +347,43 @@ class WikiData:
             raise DbWriteAccessError(e)
 
 
+    def importPages(self, pages):
+        """
+        Store multiple pages at once, existing pages are replaced.
+        Does not modify the cache information except
+        self.cachedWikiPageLinkTermDict
+        
+        pages -- sequence of tuples (word, content, timestamps, readOnly,
+            presentation) with unistring content, timestamps tuple as
+            returned by getTimestamps(), readonly flag as for
+            setWikiWordReadOnly() and presentation datablock (may be empty)
+        """
+        ti = time()
+        rows = []
+        for word, content, timestamps, readOnly, presentation in pages:
+            moddate, creadate, visitdate = [t if t is not None else ti
+                    for t in timestamps[:3]]
+            if presentation:
+                presentation = sqlite.Binary(presentation)
+            else:
+                presentation = None
+
+            rows.append((word, sqlite.Binary(self.contentUniInputToDb(
+                    content)), moddate, creadate, visitdate, readOnly,
+                    presentation))
+
+        try:
+            self.connWrap.execSqlMany("insert or replace into wikiwordcontent"
+                    "(word, content, modified, created, visited, readonly, "
+                    "presentationdatablock) values (?,?,?,?,?,?,?)", rows)
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+        self.cachedWikiPageLinkTermDict = None
+        self.cachedWikiWordVisited = None
+
+
     def _renameContent(self, oldWord, newWord):
         """
         The content which was stored under oldWord is stored
@@ -335,6 +395,7 @@ class WikiData:
                     "where word = ?", (newWord, oldWord))
     
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbWriteAccessError(e)
@@ -344,6 +405,7 @@ class WikiData:
         try:
             self.connWrap.execSql("delete from wikiwordcontent where word = ?", (word,))
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbWriteAccessError(e)
@@ -391,6 +453,7 @@ class WikiData:
                 self.connWrap.execSql("update wikiwordcontent set modified = ?, "
                         "created = ?, visited = ? where word = ?",
                         (moddate, creadate, visitdate, word))
+                self.cachedWikiWordVisited = None
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbWriteAccessError(e)
@@ -502,18 +565,48 @@ class WikiData:
 
     def renameWord(self, word, toWord):
         try:
-            # commit anything pending so we can rollback on error
-            self.connWrap.syncCommit()
+            # savepoint so only the renaming is rolled back on error
+            self.connWrap.savepoint("renameword")
 
             try:
                 self.connWrap.execSql("update wikirelations set word = ? where word = ?", (toWord, word))
                 self.connWrap.execSql("update wikiwordattrs set word = ? where word = ?", (toWord, word))
                 self.connWrap.execSql("update todos set word = ? where word = ?", (toWord, word))
                 self.connWrap.execSql("update wikiwordmatchterms set word = ? where word = ?", (toWord, word))
+                self._dropMatchTermIndex()
                 self._renameContent(word, toWord)
+                self.connWrap.releaseSavepoint("renameword")
                 self.connWrap.commit()
             except:
-                self.connWrap.rollback()
+                self.connWrap.rollbackToSavepoint("renameword")
+                raise
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
+    def renameWords(self, renameSeq):
+        """
+        Rename multiple words at once in one transaction. renameSeq is
+        a sequence of tuples (word, toWord).
+        """
+        try:
+            # savepoint so only the renaming is rolled back on error
+            self.connWrap.savepoint("renamewords")
+
+            try:
+                params = [(toWord, word) for word, toWord in renameSeq]
+                for table in ("wikirelations", "wikiwordattrs", "todos",
+                        "wikiwordmatchterms"):
+                    self.connWrap.execSqlMany("update %s set word = ? "
+                            "where word = ?" % table, params)
+                self._dropMatchTermIndex()
+                for word, toWord in renameSeq:
+                    self._renameContent(word, toWord)
+                self.connWrap.releaseSavepoint("renamewords")
+                self.connWrap.commit()
+            except:
+                self.connWrap.rollbackToSavepoint("renamewords")
                 raise
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
@@ -530,7 +623,7 @@ class WikiData:
         """
         if word != self.wikiDocument.getWikiName():
             try:
-                self.connWrap.syncCommit()
+                self.connWrap.savepoint("deleteword")
                 try:
                     # don't delete the relations to the word since other
                     # pages still have valid outward links to this page.
@@ -543,9 +636,11 @@ class WikiData:
                         self._deleteContent(word)
                     self.deleteWikiWordMatchTerms(word, syncUpdate=False)
                     self.deleteWikiWordMatchTerms(word, syncUpdate=True)
+                    self.connWrap.releaseSavepoint("deleteword")
                     self.connWrap.commit()
                 except:
-                    self.connWrap.rollback()
+                    self.connWrap.rollbackToSavepoint("deleteword")
+                    self._dropMatchTermIndex()
                     raise
             except (IOError, OSError, sqlite.Error), e:
                 traceback.print_exc()
@@ -699,6 +794,34 @@ class WikiData:
             raise DbReadAccessError(e)
 
 
+    def getAllChildRelationships(self, existingonly=False, selfreference=True):
+        """
+        get the child relations of all words at once as list of tuples
+        (word, relation). Parameters are the same as for
+        getChildRelationships().
+        Function must work for read-only wiki.
+        """
+        sql = "select word, relation from wikirelations"
+        conjunction = Conjunction(" where ", " and ")
+
+        if existingonly:
+            sql += conjunction() + ("(exists (select 1 from wikiwordcontent "
+                    "where wikiwordcontent.word = relation) or exists "
+                    "(select 1 from wikiwordmatchterms "
+                    "where wikiwordmatchterms.matchterm = relation and "
+                    "(wikiwordmatchterms.type & 2) != 0))")
+            # Consts.WIKIWORDMATCHTERMS_TYPE_ASLINK == 2
+
+        if not selfreference:
+            sql += conjunction() + "relation != word"
+
+        try:
+            return self.connWrap.execSqlQuery(sql)
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
+
     def getParentRelationships(self, wikiWord):
         """
         get the parent relations to this word
@@ -787,10 +910,35 @@ class WikiData:
             raise DbWriteAccessError(e)
 
     def updateChildRelations(self, word, childRelations):
-        self.deleteChildRelationships(word)
+        """
+        Set the child relations of word to the sequence childRelations of
+        tuples (toWord, pos). Only the difference to the stored relations
+        is written.
+        """
+        try:
+            oldRows = self.connWrap.execSqlQuery("select relation, "
+                    "firstcharpos from wikirelations where word = ?", (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
-        for r in childRelations:
-            self._addRelationship(word, r)
+
+        # A relation is unique, so the last one for a toWord wins
+        newRows = dict((r[0], r[1]) for r in childRelations).items()
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        try:
+            self.connWrap.execSqlMany("delete from wikirelations "
+                    "where word = ? and relation = ?",
+                    [(word, r[0]) for r in toDelete])
+            self.connWrap.execSqlMany(
+                    "insert or replace into wikirelations(word, relation, "
+                    "firstcharpos) values (?, ?, ?)",
+                    [(word, r[0], r[1]) for r in toInsert])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
 
     def deleteChildRelationships(self, fromWord):
         try:
@@ -958,6 +1106,7 @@ class WikiData:
         The self.cachedWikiPageLinkTermDict is invalidated.
         """
         self.cachedWikiPageLinkTermDict = None
+        self.cachedWikiWordVisited = None
 
 
 
@@ -1391,12 +1540,33 @@ class WikiData:
 
 
     def updateAttributes(self, word, attrs):
-        self.deleteAttributes(word)
+        """
+        Set the attributes of word to attrs, a dictionary
+        {key: sequence of values}. Only the difference to the stored
+        attributes is written.
+        """
+        try:
+            oldRows = self.connWrap.execSqlQuery("select key, value "
+                    "from wikiwordattrs where word = ?", (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
-        for k in attrs.keys():
-            values = attrs[k]
-            for v in values:
-                self._setAttribute(word, k, v)
+
+        newRows = [(k, v) for k, values in attrs.iteritems() for v in values]
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        try:
+            self.connWrap.execSqlMany("delete from wikiwordattrs "
+                    "where word = ? and key = ? and value = ?",
+                    [(word, k, v) for k, v in toDelete])
+            self.connWrap.execSqlMany("insert into wikiwordattrs(word, key, "
+                    "value) values (?, ?, ?)",
+                    [(word, k, v) for k, v in toInsert])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
 
         self.cachedGlobalAttrs = None   # reset global attributes cache
 
@@ -1508,10 +1678,32 @@ class WikiData:
 
 
     def updateTodos(self, word, todos):
-        self.deleteTodos(word)
+        """
+        Set the todos of word to the sequence todos of tuples (key, value).
+        Only the difference to the stored todos is written.
+        """
+        try:
+            oldRows = self.connWrap.execSqlQuery("select key, value "
+                    "from todos where word = ?", (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
-        for t in todos:
-            self._addTodo(word, t)
+
+        newRows = [(t[0], t[1]) for t in todos]
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        try:
+            self.connWrap.execSqlMany("delete from todos "
+                    "where word = ? and key = ? and value = ?",
+                    [(word, k, v) for k, v in toDelete])
+            self.connWrap.execSqlMany("insert into todos(word, key, value) "
+                    "values (?, ?, ?)",
+                    [(word, k, v) for k, v in toInsert])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
 
 
     def _addTodo(self, word, todo):
@@ -1533,86 +1725,153 @@ class WikiData:
 
     # ---------- Wikiword matchterm cache handling ----------
 
-    def getWikiWordMatchTermsWith(self, thisStr, orderBy=None, descend=False):
-        "get the list of match terms with thisStr in them."
-        thisStr = sqlite.escapeForGlob(thisStr.lower())   # TODO More general normcase function
+    def _getMatchTermIndex(self):
+        """
+        Return MatchTermIndex of all match terms, build it if necessary.
+        """
+        with self.matchTermIndexLock:
+            index = self.matchTermIndex
+            if index is None:
+                try:
+                    index = MatchTermIndex(self.connWrap.execSqlQuery(
+                            "select matchterm, type, word, firstcharpos, "
+                            "charlength from wikiwordmatchterms"))
+                except (IOError, OSError, sqlite.Error), e:
+                    traceback.print_exc()
+                    raise DbReadAccessError(e)
 
-#         orderBy = "visited"   # !!! Test
-#         descend = True   # !!! Test
+                self.matchTermIndex = index
 
-        if orderBy == "visited":
-            try:
-                result1 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, wikiwordmatchterms.word, "
-                        "firstcharpos, charlength, visited "
-                        "from wikiwordmatchterms inner join wikiwordcontent "
-                        "on wikiwordmatchterms.word = wikiwordcontent.word where "
-                        "matchtermnormcase glob (? || '*')", (thisStr,))
-    
-                result2 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, wikiwordmatchterms.word, "
-                        "firstcharpos, charlength, visited "
-                        "from wikiwordmatchterms inner join wikiwordcontent "
-                        "on wikiwordmatchterms.word = wikiwordcontent.word where "
-                        "not matchtermnormcase glob (? || '*') "
-                        "and matchtermnormcase glob ('*' || ? || '*')",
-                        (thisStr, thisStr))
-            except (IOError, OSError, sqlite.Error), e:
-                traceback.print_exc()
-                raise DbReadAccessError(e)
-        else:
+            return index
+
+
+    def _dropMatchTermIndex(self):
+        """
+        Drop the match term index, it is rebuilt from the database when
+        needed next time.
+        """
+        with self.matchTermIndexLock:
+            self.matchTermIndex = None
+
+
+    def _getWikiWordVisitedDict(self):
+        """
+        Return dictionary {<wiki word>: <visited timestamp>} for all pages.
+        """
+        visited = self.cachedWikiWordVisited
+        if visited is None:
             try:
-                result1 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, word, firstcharpos, charlength "
-                        "from wikiwordmatchterms where "
-                        "matchtermnormcase glob (? || '*')", (thisStr,))
-    
-                result2 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, word, firstcharpos, charlength "
-                        "from wikiwordmatchterms where "
-                        "not matchtermnormcase glob (? || '*') "
-                        "and matchtermnormcase glob ('*' || ? || '*')",
-                        (thisStr, thisStr))
+                visited = dict(self.connWrap.execSqlQuery(
+                        "select word, visited from wikiwordcontent"))
             except (IOError, OSError, sqlite.Error), e:
                 traceback.print_exc()
                 raise DbReadAccessError(e)
 
-        coll = self.wikiDocument.getCollator()
+            self.cachedWikiWordVisited = visited
+
+        return visited
+
+
+    def getWikiWordMatchTermsWith(self, thisStr, orderBy=None, descend=False,
+            lazySort=False):
+        """
+        get the list of match terms with thisStr in them.
+        If lazySort is True, a LazySortedMatchTerms sequence is returned
+        instead of a list which sorts the terms only as far as they are
+        accessed.
+        """
+        result1, result2 = self._getMatchTermIndex().findTerms(
+                thisStr.lower())   # TODO More general normcase function
 
-        coll.sortByFirst(result1)
-        coll.sortByFirst(result2)
-        
         if orderBy == "visited":
-            result1.sort(key=lambda k: k[5], reverse=descend)
-            result2.sort(key=lambda k: k[5], reverse=descend)
-        else:
-            if descend:
-                result1.reverse()
-                result2.reverse()
+            visited = self._getWikiWordVisitedDict()
+
+            result1 = [term + (visited[term[2]],) for term in result1
+                    if term[2] in visited]
+            result2 = [term + (visited[term[2]],) for term in result2
+                    if term[2] in visited]
+
+        coll = self.wikiDocument.getCollator()
+
+        if lazySort:
+            return LazySortedMatchTerms((result1, result2), coll, orderBy,
+                    descend)
+
+        sortMatchTerms(result1, coll, orderBy, descend)
+        sortMatchTerms(result2, coll, orderBy, descend)
 
         return result1 + result2
 
 
     def updateWikiWordMatchTerms(self, word, wwmTerms, syncUpdate=False):
-        self.deleteWikiWordMatchTerms(word, syncUpdate=syncUpdate)
+        """
+        Set the match terms of word to the sequence wwmTerms of tuples
+        (matchterm, type, word, firstcharpos, charlength). Only the
+        difference to the stored match terms is written.
+        """
+        if syncUpdate:
+            addSql = " and (type & 16) != 0"
+        else:
+            addSql = " and (type & 16) == 0"
+            # Consts.WIKIWORDMATCHTERMS_TYPE_SYNCUPDATE == 16
+
+        try:
+            oldRows = self.connWrap.execSqlQuery("select matchterm, type, "
+                    "word, firstcharpos, charlength from wikiwordmatchterms "
+                    "where word = ?" + addSql, (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
+
+        newRows = []
         for t in wwmTerms:
             assert t[2] == word
-            self._addWikiWordMatchTerm(t)
+            newRows.append(tuple(t))
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        if len(toDelete) == 0 and len(toInsert) == 0:
+            return
+
+        with self.matchTermIndexLock:
+            try:
+                self.connWrap.execSqlMany("delete from wikiwordmatchterms "
+                        "where matchterm = ? and type = ? and word = ? and "
+                        "firstcharpos = ? and charlength = ?", toDelete)
+                # TODO Check for name collisions
+                self.connWrap.execSqlMany("insert into wikiwordmatchterms("
+                        "matchterm, type, word, firstcharpos, charlength, "
+                        "matchtermnormcase) values (?, ?, ?, ?, ?, ?)",
+                        [t + (t[0].lower(),) for t in toInsert])
+                self.cachedWikiPageLinkTermDict = None
+                self.cachedWikiWordVisited = None
+            except (IOError, OSError, sqlite.Error), e:
+                traceback.print_exc()
+                self.matchTermIndex = None
+                raise DbWriteAccessError(e)
+
+            if self.matchTermIndex is not None:
+                self.matchTermIndex.removeTerms(toDelete)
+                self.matchTermIndex.addTerms(toInsert)
 
 
     def _addWikiWordMatchTerm(self, wwmTerm):
         matchterm, typ, word, firstcharpos, charlength = wwmTerm
-        try:
-            # TODO Check for name collisions
-            self.connWrap.execSql("insert into wikiwordmatchterms(matchterm, "
-                    "type, word, firstcharpos, charlength, matchtermnormcase) "
-                    "values (?, ?, ?, ?, ?, ?)",
-                    (matchterm, typ, word, firstcharpos, charlength,
-                    matchterm.lower()))
-        except (IOError, OSError, sqlite.Error), e:
-            traceback.print_exc()
-            raise DbWriteAccessError(e)
+        with self.matchTermIndexLock:
+            try:
+                # TODO Check for name collisions
+                self.connWrap.execSql("insert into wikiwordmatchterms("
+                        "matchterm, type, word, firstcharpos, charlength, "
+                        "matchtermnormcase) values (?, ?, ?, ?, ?, ?)",
+                        (matchterm, typ, word, firstcharpos, charlength,
+                        matchterm.lower()))
+            except (IOError, OSError, sqlite.Error), e:
+                traceback.print_exc()
+                raise DbWriteAccessError(e)
+
+            if self.matchTermIndex is not None:
+                self.matchTermIndex.addTerms((wwmTerm,))
 
 
     def deleteWikiWordMatchTerms(self, word, syncUpdate=False):
@@ -1622,13 +1881,19 @@ class WikiData:
             addSql = " and (type & 16) == 0"
             # Consts.WIKIWORDMATCHTERMS_TYPE_SYNCUPDATE == 16
 
-        try:
-            self.connWrap.execSql("delete from wikiwordmatchterms where "
-                    "word = ?" + addSql, (word,))
-            self.cachedWikiPageLinkTermDict = None
-        except (IOError, OSError, sqlite.Error), e:
-            traceback.print_exc()
-            raise DbWriteAccessError(e)
+        with self.matchTermIndexLock:
+            try:
+                self.connWrap.execSql("delete from wikiwordmatchterms where "
+                        "word = ?" + addSql, (word,))
+                self.cachedWikiPageLinkTermDict = None
+                self.cachedWikiWordVisited = None
+            except (IOError, OSError, sqlite.Error), e:
+                traceback.print_exc()
+                self.matchTermIndex = None
+                raise DbWriteAccessError(e)
+
+            if self.matchTermIndex is not None:
+                self.matchTermIndex.removeWordTerms(word, syncUpdate)
 
 
     # ---------- Data block handling ----------
@@ -1744,6 +2009,81 @@ class WikiData:
             raise DbWriteAccessError(e)
 
 
+    def storeDataBlocks(self, blocks, storeHint=None):
+        """
+        Store multiple data blocks at once, existing ones are replaced.
+        blocks -- sequence of tuples (unifName, newdata)
+        storeHint -- ignored in compact_sqlite
+        """
+        try:
+            self.connWrap.execSqlMany("insert or replace into "
+                    "datablocks(unifiedname, data) values (?, ?)",
+                    [(unifName, sqlite.Binary(newdata))
+                    for unifName, newdata in blocks])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
+    # Maximum number of unified names in one "in (...)" query
+    DATABLOCK_BATCH_SIZE = 500
+
+    def retrieveDataBlocks(self, unifNames, default=""):
+        """
+        Retrieve multiple data blocks as binary strings with as few queries as
+        possible. Returns dictionary {unifName: data} which doesn't contain
+        entries for non-existing data blocks.
+        """
+        unifNames = list(unifNames)
+        result = {}
+        try:
+            for i in xrange(0, len(unifNames), self.DATABLOCK_BATCH_SIZE):
+                batch = tuple(unifNames[i:i + self.DATABLOCK_BATCH_SIZE])
+                result.update(self.connWrap.execSqlQuery(
+                        "select unifiedname, data from datablocks where "
+                        "unifiedname in (%s)" % ", ".join(["?"] * len(batch)),
+                        batch))
+
+            return result
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
+
+    def deleteDataBlocks(self, unifNames):
+        """
+        Delete all data blocks with the given unified names. Non-existing
+        names are ignored.
+        """
+        try:
+            self.connWrap.execSqlMany(
+                    "delete from datablocks where unifiedname = ?",
+                    [(unifName,) for unifName in unifNames])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
+    def renameDataBlocks(self, renames):
+        """
+        Rename data blocks without copying their content.
+        renames -- sequence of tuples (oldUnifName, newUnifName). Existing
+            data blocks with a new name are overwritten, non-existing old
+            names are ignored. Old and new names must be disjoint.
+        """
+        renames = [(newName, oldName) for oldName, newName in renames]
+        try:
+            self.connWrap.execSqlMany(
+                    "delete from datablocks where unifiedname = ?",
+                    [(newName,) for newName, oldName in renames])
+            self.connWrap.execSqlMany(
+                    "update datablocks set unifiedname = ? "
+                    "where unifiedname = ?", renames)
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
     # ---------- Searching pages ----------
 
     def search(self, sarOp, exclusionSet):
@@ -1804,6 +2144,12 @@ class WikiData:
         "compactify": 1,     # = sqlite vacuum
         "plain text import": 1,
         "recovery mode": 1,
+        "datablock batch": 1,   # retrieveDataBlocks(), deleteDataBlocks(),
+                # renameDataBlocks(), storeDataBlocks()
+        "bulk page import": 1,   # importPages()
+        "all relations": 1,   # getAllChildRelationships()
+        "bulk rename": 1,   # renameWords()
+        "commit statistics": 1,   # getCommitStatistics()
 #         "asynchronous commit":1  # Commit can be done in separate thread, but
 #                 # calling any other function during running commit is not allowed
         }
@@ -1829,6 +2175,8 @@ class WikiData:
         self.connWrap.syncCommit()
 
         self.cachedWikiPageLinkTermDict = None
+        self.cachedWikiWordVisited = None
+        self._dropMatchTermIndex()
         self.cachedGlobalAttrs = None
 
 
@@ -1841,6 +2189,18 @@ class WikiData:
         return DbStructure.getSettingsValue(self.connWrap, key, default)
 
 
+    def getCommitStatistics(self):
+        """
+        Return tuple (<commits per second>, <average number of data
+        changing statements per commit>) or None if commits aren't
+        collected into batches (option "db_asyncCommit" off).
+        """
+        if not isinstance(self.connWrap, DbStructure.ConnectWrapAsyncCommit):
+            return None
+
+        return self.connWrap.getCommitStatistics()
+
+
     def setPresentationBlock(self, word, datablock):
         """
         Save the presentation datablock (a byte string) for a word to
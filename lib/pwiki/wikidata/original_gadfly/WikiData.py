@@ -13,6 +13,8 @@ Used terms:
 
 
 
+from __future__ import with_statement
+
 from os.path import exists, join, basename
 import os, os.path
 
@@ -38,7 +40,9 @@ if gadfly is not None:
 
 import Consts
 from pwiki.WikiExceptions import *   # TODO make normal import?
+from pwiki import Profiling
 from pwiki import SearchAndReplace
+from pwiki.wikidata.MatchTermIndex import sortMatchTerms, LazySortedMatchTerms
 
 from pwiki.StringOps import longPathEnc, longPathDec, utf8Enc, utf8Dec, BOM_UTF8, \
         fileContentToUnicode, loadEntireTxtFile, loadEntireFile, \
@@ -109,7 +113,8 @@ class WikiData:
         lastException = None
         try:
             # Further possible updates   
-            DbStructure.updateDatabase2(self.connWrap)
+            with Profiling.timingSpan(u"Update database structure"):
+                DbStructure.updateDatabase2(self.connWrap)
         except (IOError, OSError, ValueError), e:
             # Remember but continue
             lastException = DbWriteAccessError(e)
@@ -136,7 +141,6 @@ class WikiData:
 #                 self.cachedWikiPageLinkTermDict[word] = 1
 #     
             self.cachedGlobalAttrs = None
-            self.getGlobalAttributes()
         except (IOError, OSError, ValueError), e:
             traceback.print_exc()
             try:
@@ -1838,8 +1842,14 @@ class WikiData:
 
     # ---------- Wikiword matchterm cache handling ----------
 
-    def getWikiWordMatchTermsWith(self, thisStr, orderBy=None, descend=False):
-        "get the list of match terms with thisStr in them."
+    def getWikiWordMatchTermsWith(self, thisStr, orderBy=None, descend=False,
+            lazySort=False):
+        """
+        get the list of match terms with thisStr in them.
+        If lazySort is True, a LazySortedMatchTerms sequence is returned
+        instead of a list which sorts the terms only as far as they are
+        accessed.
+        """
         thisStr = thisStr.lower()   # TODO More general normcase function
 
         if orderBy == "visited":
@@ -1874,16 +1884,12 @@ class WikiData:
 
         coll = self.wikiDocument.getCollator()
 
-        coll.sortByFirst(result1)
-        coll.sortByFirst(result2)
-        
-        if orderBy == "visited":
-            result1.sort(key=lambda k: k[5], reverse=descend)
-            result2.sort(key=lambda k: k[5], reverse=descend)
-        else:
-            if descend:
-                result1.reverse()
-                result2.reverse()
+        if lazySort:
+            return LazySortedMatchTerms((result1, result2), coll, orderBy,
+                    descend)
+
+        sortMatchTerms(result1, coll, orderBy, descend)
+        sortMatchTerms(result2, coll, orderBy, descend)
 
         return result1 + result2
 
@@ -13,17 +13,23 @@ Used terms:
 
 
 
+from __future__ import with_statement
+
 from os.path import exists, join, basename
 import os, os.path
 
 from time import time, localtime
 import datetime
-import string, glob, traceback
+import string, glob, traceback, threading
 
 from wx import GetApp
 
 from pwiki.WikiExceptions import *   # TODO make normal import
+from pwiki import Profiling
+from pwiki.Utilities import calcRowsDelta
 from pwiki import SearchAndReplace
+from pwiki.wikidata.MatchTermIndex import MatchTermIndex, sortMatchTerms, \
+        LazySortedMatchTerms
 
 try:
     import pwiki.sqlite3api as sqlite
@@ -53,6 +59,13 @@ class WikiData:
         self.wikiDocument = wikiDocument
         self.dataDir = dataDir
         self.cachedWikiPageLinkTermDict = None
+        self.matchTermIndex = None
+        # Held while building or modifying self.matchTermIndex so the index
+        # can't miss changes written while it is built
+        self.matchTermIndexLock = threading.RLock()
+        # Dictionary {<wiki word>: <visited timestamp>} or None, built on
+        # first use by getWikiWordMatchTermsWith()
+        self.cachedWikiWordVisited = None
         
         dbPath = self.wikiDocument.getWikiConfig().get("wiki_db", "db_filename",
                 u"").strip()
@@ -73,8 +86,17 @@ class WikiData:
         dbfile = longPathDec(dbfile)
 
         try:
-            self.connWrap = DbStructure.ConnectWrapSyncCommit(
-                    sqlite.connect(dbfile))
+            globalConfig = GetApp().getGlobalConfig()
+            if globalConfig.getboolean("main", "db_asyncCommit", False):
+                self.connWrap = DbStructure.ConnectWrapAsyncCommit(
+                        DbStructure.connect(dbfile),
+                        maxDelay=globalConfig.getfloat("main",
+                        "db_asyncCommit_maxDelay", 0.6),
+                        maxStatements=globalConfig.getint("main",
+                        "db_asyncCommit_maxStatements", 500))
+            else:
+                self.connWrap = DbStructure.ConnectWrapSyncCommit(
+                        DbStructure.connect(dbfile))
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbReadAccessError(e)
@@ -159,7 +181,8 @@ class WikiData:
         lastException = None
         try:
             # Further possible updates
-            DbStructure.updateDatabase2(self.connWrap)
+            with Profiling.timingSpan(u"Update database structure"):
+                DbStructure.updateDatabase2(self.connWrap)
         except sqlite.Error, e:
             # Remember but continue
             lastException = DbWriteAccessError(e)
@@ -192,8 +215,9 @@ class WikiData:
 
             # reset cache
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
+            self._dropMatchTermIndex()
             self.cachedGlobalAttrs = None
-            self.getGlobalAttributes()
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             try:
@@ -295,6 +319,7 @@ class WikiData:
                                 (fileName, fileName.lower(), word))
 
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbWriteAccessError(e)
@@ -344,6 +369,7 @@ class WikiData:
                     longPathEnc(os.path.join(self.dataDir, newFilePath)))
 
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
 
             self.connWrap.execSql("update wikiwords set word = ?, filepath = ?, "
                     "filenamelowercase = ?, metadataprocessed = 0 where word = ?",
@@ -368,6 +394,7 @@ class WikiData:
             self.connWrap.execSql("delete from wikiwords where word = ?",
                     (word,))
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
             if fileName is not None and os.path.exists(fileName):
                 os.unlink(fileName)
         except (IOError, OSError, sqlite.Error), e:
@@ -417,6 +444,7 @@ class WikiData:
                 self.connWrap.execSql("update wikiwords set modified = ?, "
                         "created = ?, visited = ? where word = ?",
                         (moddate, creadate, visitdate, word))
+                self.cachedWikiWordVisited = None
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
             raise DbWriteAccessError(e)
@@ -527,18 +555,48 @@ class WikiData:
 
     def renameWord(self, word, toWord):
         try:
-            # commit anything pending so we can rollback on error
-            self.connWrap.syncCommit()
+            # savepoint so only the renaming is rolled back on error
+            self.connWrap.savepoint("renameword")
 
             try:
                 self.connWrap.execSql("update wikirelations set word = ? where word = ?", (toWord, word))
                 self.connWrap.execSql("update wikiwordattrs set word = ? where word = ?", (toWord, word))
                 self.connWrap.execSql("update todos set word = ? where word = ?", (toWord, word))
                 self.connWrap.execSql("update wikiwordmatchterms set word = ? where word = ?", (toWord, word))
+                self._dropMatchTermIndex()
                 self._renameContent(word, toWord)
+                self.connWrap.releaseSavepoint("renameword")
                 self.connWrap.commit()
             except:
-                self.connWrap.rollback()
+                self.connWrap.rollbackToSavepoint("renameword")
+                raise
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
+    def renameWords(self, renameSeq):
+        """
+        Rename multiple words at once in one transaction. renameSeq is
+        a sequence of tuples (word, toWord).
+        """
+        try:
+            # savepoint so only the renaming is rolled back on error
+            self.connWrap.savepoint("renamewords")
+
+            try:
+                params = [(toWord, word) for word, toWord in renameSeq]
+                for table in ("wikirelations", "wikiwordattrs", "todos",
+                        "wikiwordmatchterms"):
+                    self.connWrap.execSqlMany("update %s set word = ? "
+                            "where word = ?" % table, params)
+                self._dropMatchTermIndex()
+                for word, toWord in renameSeq:
+                    self._renameContent(word, toWord)
+                self.connWrap.releaseSavepoint("renamewords")
+                self.connWrap.commit()
+            except:
+                self.connWrap.rollbackToSavepoint("renamewords")
                 raise
         except (IOError, OSError, sqlite.Error), e:
             traceback.print_exc()
@@ -555,7 +613,7 @@ class WikiData:
         """
         if word != self.wikiDocument.getWikiName():
             try:
-                self.connWrap.syncCommit()
+                self.connWrap.savepoint("deleteword")
                 try:
                     # don't delete the relations to the word since other
                     # pages still have valid outward links to this page.
@@ -568,9 +626,11 @@ class WikiData:
                         self._deleteContent(word)
                     self.deleteWikiWordMatchTerms(word, syncUpdate=False)
                     self.deleteWikiWordMatchTerms(word, syncUpdate=True)
+                    self.connWrap.releaseSavepoint("deleteword")
                     self.connWrap.commit()
                 except:
-                    self.connWrap.rollback()
+                    self.connWrap.rollbackToSavepoint("deleteword")
+                    self._dropMatchTermIndex()
                     raise
             except (IOError, OSError, sqlite.Error), e:
                 traceback.print_exc()
@@ -775,6 +835,34 @@ class WikiData:
             raise DbReadAccessError(e)
 
 
+    def getAllChildRelationships(self, existingonly=False, selfreference=True):
+        """
+        get the child relations of all words at once as list of tuples
+        (word, relation). Parameters are the same as for
+        getChildRelationships().
+        Function must work for read-only wiki.
+        """
+        sql = "select word, relation from wikirelations"
+        conjunction = Conjunction(" where ", " and ")
+
+        if existingonly:
+            sql += conjunction() + ("(exists (select 1 from wikiwords "
+                    "where wikiwords.word = relation) or exists "
+                    "(select 1 from wikiwordmatchterms "
+                    "where wikiwordmatchterms.matchterm = relation and "
+                    "(wikiwordmatchterms.type & 2) != 0))")
+            # Consts.WIKIWORDMATCHTERMS_TYPE_ASLINK == 2
+
+        if not selfreference:
+            sql += conjunction() + "relation != word"
+
+        try:
+            return self.connWrap.execSqlQuery(sql)
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
+
 #     def getChildRelationshipsAndChildNumber(self, wikiWord, existingonly=False,
 #             selfreference=False):
 #         sql = ("select parent.relation, count(child.relation) "
@@ -936,10 +1024,35 @@ class WikiData:
             raise DbWriteAccessError(e)
 
     def updateChildRelations(self, word, childRelations):
-        self.deleteChildRelationships(word)
+        """
+        Set the child relations of word to the sequence childRelations of
+        tuples (toWord, pos). Only the difference to the stored relations
+        is written.
+        """
+        try:
+            oldRows = self.connWrap.execSqlQuery("select relation, "
+                    "firstcharpos from wikirelations where word = ?", (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
-        for r in childRelations:
-            self._addRelationship(word, r)
+
+        # A relation is unique, so the last one for a toWord wins
+        newRows = dict((r[0], r[1]) for r in childRelations).items()
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        try:
+            self.connWrap.execSqlMany("delete from wikirelations "
+                    "where word = ? and relation = ?",
+                    [(word, r[0]) for r in toDelete])
+            self.connWrap.execSqlMany(
+                    "insert or replace into wikirelations(word, relation, "
+                    "firstcharpos) values (?, ?, ?)",
+                    [(word, r[0], r[1]) for r in toInsert])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
 
     def deleteChildRelationships(self, fromWord):
         try:
@@ -1139,6 +1252,7 @@ class WikiData:
         dbFiles = frozenset(self._getAllWikiFileNamesFromDb())
         
         self.cachedWikiPageLinkTermDict = None
+        self.cachedWikiWordVisited = None
         try:
             # Delete words for which no file is present anymore
             for path in self.connWrap.execSqlQuerySingleColumn(
@@ -1784,14 +1898,33 @@ class WikiData:
 
 
     def updateAttributes(self, word, attrs):
-        self.deleteAttributes(word)
+        """
+        Set the attributes of word to attrs, a dictionary
+        {key: sequence of values}. Only the difference to the stored
+        attributes is written.
+        """
+        try:
+            oldRows = self.connWrap.execSqlQuery("select key, value "
+                    "from wikiwordattrs where word = ?", (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
-        for k in attrs.keys():
-            values = attrs[k]
-            for v in values:
-                self._setAttribute(word, k, v)
-#                 if k == "alias":
-#                     self.setAsAlias(v)
+
+        newRows = [(k, v) for k, values in attrs.iteritems() for v in values]
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        try:
+            self.connWrap.execSqlMany("delete from wikiwordattrs "
+                    "where word = ? and key = ? and value = ?",
+                    [(word, k, v) for k, v in toDelete])
+            self.connWrap.execSqlMany("insert into wikiwordattrs(word, key, "
+                    "value) values (?, ?, ?)",
+                    [(word, k, v) for k, v in toInsert])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
 
         self.cachedGlobalAttrs = None   # reset global attributes cache
 
@@ -1903,10 +2036,32 @@ class WikiData:
 
 
     def updateTodos(self, word, todos):
-        self.deleteTodos(word)
+        """
+        Set the todos of word to the sequence todos of tuples (key, value).
+        Only the difference to the stored todos is written.
+        """
+        try:
+            oldRows = self.connWrap.execSqlQuery("select key, value "
+                    "from todos where word = ?", (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
-        for t in todos:
-            self._addTodo(word, t)
+
+        newRows = [(t[0], t[1]) for t in todos]
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        try:
+            self.connWrap.execSqlMany("delete from todos "
+                    "where word = ? and key = ? and value = ?",
+                    [(word, k, v) for k, v in toDelete])
+            self.connWrap.execSqlMany("insert into todos(word, key, value) "
+                    "values (?, ?, ?)",
+                    [(word, k, v) for k, v in toInsert])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
 
 
     def _addTodo(self, word, todo):
@@ -1928,83 +2083,153 @@ class WikiData:
 
     # ---------- Wikiword matchterm cache handling ----------
 
-    def getWikiWordMatchTermsWith(self, thisStr, orderBy=None, descend=False):
-        "get the list of match terms with thisStr in them."
-        thisStr = sqlite.escapeForGlob(thisStr.lower())   # TODO More general normcase function
+    def _getMatchTermIndex(self):
+        """
+        Return MatchTermIndex of all match terms, build it if necessary.
+        """
+        with self.matchTermIndexLock:
+            index = self.matchTermIndex
+            if index is None:
+                try:
+                    index = MatchTermIndex(self.connWrap.execSqlQuery(
+                            "select matchterm, type, word, firstcharpos, "
+                            "charlength from wikiwordmatchterms"))
+                except (IOError, OSError, sqlite.Error), e:
+                    traceback.print_exc()
+                    raise DbReadAccessError(e)
 
-        if orderBy == "visited":
-            try:
-                result1 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, wikiwordmatchterms.word, "
-                        "firstcharpos, charlength, visited "
-                        "from wikiwordmatchterms inner join wikiwords "
-                        "on wikiwordmatchterms.word = wikiwords.word where "
-                        "matchtermnormcase glob (? || '*')", (thisStr,))
-    
-                result2 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, wikiwordmatchterms.word, "
-                        "firstcharpos, charlength, visited "
-                        "from wikiwordmatchterms inner join wikiwords "
-                        "on wikiwordmatchterms.word = wikiwords.word where "
-                        "not matchtermnormcase glob (? || '*') "
-                        "and matchtermnormcase glob ('*' || ? || '*')",
-                        (thisStr, thisStr))
-            except (IOError, OSError, sqlite.Error), e:
-                traceback.print_exc()
-                raise DbReadAccessError(e)
-        else:
+                self.matchTermIndex = index
+
+            return index
+
+
+    def _dropMatchTermIndex(self):
+        """
+        Drop the match term index, it is rebuilt from the database when
+        needed next time.
+        """
+        with self.matchTermIndexLock:
+            self.matchTermIndex = None
+
+
+    def _getWikiWordVisitedDict(self):
+        """
+        Return dictionary {<wiki word>: <visited timestamp>} for all pages.
+        """
+        visited = self.cachedWikiWordVisited
+        if visited is None:
             try:
-                result1 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, word, firstcharpos, charlength "
-                        "from wikiwordmatchterms where "
-                        "matchtermnormcase glob (? || '*')", (thisStr,))
-    
-                result2 = self.connWrap.execSqlQuery(
-                        "select matchterm, type, word, firstcharpos, charlength "
-                        "from wikiwordmatchterms where "
-                        "not matchtermnormcase glob (? || '*') "
-                        "and matchtermnormcase glob ('*' || ? || '*')",
-                        (thisStr, thisStr))
+                visited = dict(self.connWrap.execSqlQuery(
+                        "select word, visited from wikiwords"))
             except (IOError, OSError, sqlite.Error), e:
                 traceback.print_exc()
                 raise DbReadAccessError(e)
 
-        coll = self.wikiDocument.getCollator()
+            self.cachedWikiWordVisited = visited
+
+        return visited
+
+
+    def getWikiWordMatchTermsWith(self, thisStr, orderBy=None, descend=False,
+            lazySort=False):
+        """
+        get the list of match terms with thisStr in them.
+        If lazySort is True, a LazySortedMatchTerms sequence is returned
+        instead of a list which sorts the terms only as far as they are
+        accessed.
+        """
+        result1, result2 = self._getMatchTermIndex().findTerms(
+                thisStr.lower())   # TODO More general normcase function
 
-        coll.sortByFirst(result1)
-        coll.sortByFirst(result2)
-        
         if orderBy == "visited":
-            result1.sort(key=lambda k: k[5], reverse=descend)
-            result2.sort(key=lambda k: k[5], reverse=descend)
-        else:
-            if descend:
-                result1.reverse()
-                result2.reverse()
+            visited = self._getWikiWordVisitedDict()
+
+            result1 = [term + (visited[term[2]],) for term in result1
+                    if term[2] in visited]
+            result2 = [term + (visited[term[2]],) for term in result2
+                    if term[2] in visited]
+
+        coll = self.wikiDocument.getCollator()
+
+        if lazySort:
+            return LazySortedMatchTerms((result1, result2), coll, orderBy,
+                    descend)
+
+        sortMatchTerms(result1, coll, orderBy, descend)
+        sortMatchTerms(result2, coll, orderBy, descend)
 
         return result1 + result2
 
 
     def updateWikiWordMatchTerms(self, word, wwmTerms, syncUpdate=False):
-        self.deleteWikiWordMatchTerms(word, syncUpdate=syncUpdate)
+        """
+        Set the match terms of word to the sequence wwmTerms of tuples
+        (matchterm, type, word, firstcharpos, charlength). Only the
+        difference to the stored match terms is written.
+        """
+        if syncUpdate:
+            addSql = " and (type & 16) != 0"
+        else:
+            addSql = " and (type & 16) == 0"
+            # Consts.WIKIWORDMATCHTERMS_TYPE_SYNCUPDATE == 16
+
+        try:
+            oldRows = self.connWrap.execSqlQuery("select matchterm, type, "
+                    "word, firstcharpos, charlength from wikiwordmatchterms "
+                    "where word = ?" + addSql, (word,))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
         self.getExistingWikiWordInfo(word)
+
+        newRows = []
         for t in wwmTerms:
             assert t[2] == word
-            self._addWikiWordMatchTerm(t)
+            newRows.append(tuple(t))
+
+        toDelete, toInsert = calcRowsDelta(oldRows, newRows)
+        if len(toDelete) == 0 and len(toInsert) == 0:
+            return
+
+        with self.matchTermIndexLock:
+            try:
+                self.connWrap.execSqlMany("delete from wikiwordmatchterms "
+                        "where matchterm = ? and type = ? and word = ? and "
+                        "firstcharpos = ? and charlength = ?", toDelete)
+                # TODO Check for name collisions
+                self.connWrap.execSqlMany("insert into wikiwordmatchterms("
+                        "matchterm, type, word, firstcharpos, charlength, "
+                        "matchtermnormcase) values (?, ?, ?, ?, ?, ?)",
+                        [t + (t[0].lower(),) for t in toInsert])
+                self.cachedWikiPageLinkTermDict = None
+                self.cachedWikiWordVisited = None
+            except (IOError, OSError, sqlite.Error), e:
+                traceback.print_exc()
+                self.matchTermIndex = None
+                raise DbWriteAccessError(e)
+
+            if self.matchTermIndex is not None:
+                self.matchTermIndex.removeTerms(toDelete)
+                self.matchTermIndex.addTerms(toInsert)
 
 
     def _addWikiWordMatchTerm(self, wwmTerm):
         matchterm, typ, word, firstcharpos, charlength = wwmTerm
-        try:
-            # TODO Check for name collisions
-            self.connWrap.execSql("insert into wikiwordmatchterms(matchterm, "
-                    "type, word, firstcharpos, charlength, matchtermnormcase) "
-                    "values (?, ?, ?, ?, ?, ?)",
-                    (matchterm, typ, word, firstcharpos, charlength,
-                    matchterm.lower()))
-        except (IOError, OSError, sqlite.Error), e:
-            traceback.print_exc()
-            raise DbWriteAccessError(e)
+        with self.matchTermIndexLock:
+            try:
+                # TODO Check for name collisions
+                self.connWrap.execSql("insert into wikiwordmatchterms("
+                        "matchterm, type, word, firstcharpos, charlength, "
+                        "matchtermnormcase) values (?, ?, ?, ?, ?, ?)",
+                        (matchterm, typ, word, firstcharpos, charlength,
+                        matchterm.lower()))
+            except (IOError, OSError, sqlite.Error), e:
+                traceback.print_exc()
+                raise DbWriteAccessError(e)
+
+            if self.matchTermIndex is not None:
+                self.matchTermIndex.addTerms((wwmTerm,))
 
 
     def deleteWikiWordMatchTerms(self, word, syncUpdate=False):
@@ -2014,13 +2239,19 @@ class WikiData:
             addSql = " and (type & 16) == 0"
             # Consts.WIKIWORDMATCHTERMS_TYPE_SYNCUPDATE == 16
 
-        try:
-            self.connWrap.execSql("delete from wikiwordmatchterms where "
-                    "word = ?" + addSql, (word,))
-            self.cachedWikiPageLinkTermDict = None
-        except (IOError, OSError, sqlite.Error), e:
-            traceback.print_exc()
-            raise DbWriteAccessError(e)
+        with self.matchTermIndexLock:
+            try:
+                self.connWrap.execSql("delete from wikiwordmatchterms where "
+                        "word = ?" + addSql, (word,))
+                self.cachedWikiPageLinkTermDict = None
+                self.cachedWikiWordVisited = None
+            except (IOError, OSError, sqlite.Error), e:
+                traceback.print_exc()
+                self.matchTermIndex = None
+                raise DbWriteAccessError(e)
+
+            if self.matchTermIndex is not None:
+                self.matchTermIndex.removeWordTerms(word, syncUpdate)
 
 
     # ---------- Data block handling ----------
@@ -2268,6 +2499,138 @@ class WikiData:
             raise DbWriteAccessError(e)
 
 
+    # Maximum number of unified names in one "in (...)" query
+    DATABLOCK_BATCH_SIZE = 500
+
+    def _iterDataBlockQueryBatches(self, sql, unifNames):
+        """
+        Execute sql containing "%s" as placeholder for an "in (...)" list
+        for batches of unifNames and yield all result rows.
+        """
+        for i in xrange(0, len(unifNames), self.DATABLOCK_BATCH_SIZE):
+            batch = tuple(unifNames[i:i + self.DATABLOCK_BATCH_SIZE])
+            for row in self.connWrap.execSqlQuery(
+                    sql % ", ".join(["?"] * len(batch)), batch):
+                yield row
+
+
+    def retrieveDataBlocks(self, unifNames, default=""):
+        """
+        Retrieve multiple data blocks as binary strings with as few queries as
+        possible. Returns dictionary {unifName: data} which doesn't contain
+        entries for non-existing data blocks.
+        If option "wikiPageFiles_gracefulOutsideAddAndRemove" is set and
+        the file of an external data block couldn't be retrieved, its value
+        is default.
+        """
+        unifNames = list(unifNames)
+        try:
+            result = dict(self._iterDataBlockQueryBatches(
+                    "select unifiedname, data from datablocks where "
+                    "unifiedname in (%s)", unifNames))
+
+            externals = list(self._iterDataBlockQueryBatches(
+                    "select unifiedname, filepath from datablocksexternal "
+                    "where unifiedname in (%s)", unifNames))
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbReadAccessError(e)
+
+        for unifName, filePath in externals:
+            if unifName in result:
+                continue
+            try:
+                result[unifName] = loadEntireFile(join(self.dataDir, filePath))
+            except (IOError, OSError), e:
+                if self.wikiDocument.getWikiConfig().getboolean("main",
+                        "wikiPageFiles_gracefulOutsideAddAndRemove", True):
+                    result[unifName] = default
+                else:
+                    traceback.print_exc()
+                    raise DbReadAccessError(e)
+
+        return result
+
+
+    def deleteDataBlocks(self, unifNames):
+        """
+        Delete all data blocks with the given unified names. Non-existing
+        names are ignored.
+        """
+        unifNames = list(unifNames)
+        try:
+            self.connWrap.execSqlMany(
+                    "delete from datablocks where unifiedname = ?",
+                    [(unifName,) for unifName in unifNames])
+
+            filePathes = [row[0] for row in self._iterDataBlockQueryBatches(
+                    "select filepath from datablocksexternal "
+                    "where unifiedname in (%s)", unifNames)]
+
+            for filePath in filePathes:
+                try:
+                    os.unlink(longPathEnc(join(self.dataDir, filePath)))
+                except (IOError, OSError):
+                    if not self.wikiDocument.getWikiConfig().getboolean("main",
+                            "wikiPageFiles_gracefulOutsideAddAndRemove", True):
+                        raise
+
+            if filePathes:
+                self.connWrap.execSqlMany(
+                        "delete from datablocksexternal where unifiedname = ?",
+                        [(unifName,) for unifName in unifNames])
+
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
+    def storeDataBlocks(self, blocks, storeHint=None):
+        """
+        Store multiple data blocks at once, existing ones are replaced.
+        blocks -- sequence of tuples (unifName, newdata)
+        storeHint -- Hint for all blocks, see storeDataBlock(). Only
+            internal data blocks are stored with a single statement.
+        """
+        if storeHint == Consts.DATABLOCK_STOREHINT_EXTERN:
+            for unifName, newdata in blocks:
+                self.storeDataBlock(unifName, newdata, storeHint)
+            return
+
+        blocks = list(blocks)
+        # Also removes blocks stored externally under the same names
+        self.deleteDataBlocks([unifName for unifName, newdata in blocks])
+        try:
+            self.connWrap.execSqlMany("insert into datablocks(unifiedname, "
+                    "data) values (?, ?)", [(unifName, sqlite.Binary(newdata))
+                    for unifName, newdata in blocks])
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
+    def renameDataBlocks(self, renames):
+        """
+        Rename data blocks without copying their content. External data
+        blocks keep their file.
+        renames -- sequence of tuples (oldUnifName, newUnifName). Existing
+            data blocks with a new name are overwritten, non-existing old
+            names are ignored. Old and new names must be disjoint.
+        """
+        renames = [(newName, oldName) for oldName, newName in renames]
+        self.deleteDataBlocks([newName for newName, oldName in renames])
+        try:
+            self.connWrap.execSqlMany(
+                    "update datablocks set unifiedname = ? "
+                    "where unifiedname = ?", renames)
+            self.connWrap.execSqlMany(
+                    "update datablocksexternal set unifiedname = ? "
+                    "where unifiedname = ?", renames)
+        except (IOError, OSError, sqlite.Error), e:
+            traceback.print_exc()
+            raise DbWriteAccessError(e)
+
+
     # ---------- Searching pages ----------
 
     def search(self, sarOp, exclusionSet):  # TODO Threadholder for all
@@ -2312,6 +2675,11 @@ class WikiData:
         "rebuild": 1,
         "compactify": 1,     # = sqlite vacuum
         "filePerPage": 1,   # Uses a single file per page
+        "datablock batch": 1,   # retrieveDataBlocks(), deleteDataBlocks(),
+                # renameDataBlocks(), storeDataBlocks()
+        "all relations": 1,   # getAllChildRelationships()
+        "bulk rename": 1,   # renameWords()
+        "commit statistics": 1,   # getCommitStatistics()
 #         "versioning": 1,     # (old versioning)
 #         "plain text import":1   # Is already plain text      
         }
@@ -2350,6 +2718,8 @@ class WikiData:
             self.connWrap.syncCommit()
 
             self.cachedWikiPageLinkTermDict = None
+            self.cachedWikiWordVisited = None
+            self._dropMatchTermIndex()
             self.cachedGlobalAttrs = None
 
             self.fullyResetMetaDataState()
@@ -2370,6 +2740,18 @@ class WikiData:
         return DbStructure.getSettingsValue(self.connWrap, key, default)
 
 
+    def getCommitStatistics(self):
+        """
+        Return tuple (<commits per second>, <average number of data
+        changing statements per commit>) or None if commits aren't
+        collected into batches (option "db_asyncCommit" off).
+        """
+        if not isinstance(self.connWrap, DbStructure.ConnectWrapAsyncCommit):
+            return None
+
+        return self.connWrap.getCommitStatistics()
+
+
     def setPresentationBlock(self, word, datablock):
         """
         Save the presentation datablock (a byte string) for a word to